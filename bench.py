@@ -0,0 +1,4 @@
+from scash_manager.benchmark import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
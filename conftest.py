@@ -0,0 +1,34 @@
+# 根目录的 conftest.py：pytest 会把仓库根目录加进 sys.path（不需要先 pip install），
+# 另外把所有会写 /data 的路径指到一个临时目录，测试不碰宿主机上的配置 / 日志 / 历史库。
+import json
+import os
+import shutil
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="scash-manager-tests-")
+
+
+def _test_config() -> dict:
+    data = _DATA_DIR
+    return {
+        "wallet": "",
+        "logging": {
+            "file": os.path.join(data, "scash-manager.log"),
+            "miner_output": {"file": os.path.join(data, "miner-output.log")},
+        },
+        "log_archive": {"dir": os.path.join(data, "logs")},
+        "downloads": {"cache_dir": os.path.join(data, "cache")},
+        "benchmark": {"results": os.path.join(data, "benchmark.json")},
+        "history": {"db": os.path.join(data, "history.db")},
+    }
+
+
+# webapp 在导入时就按 SCASH_MANAGER_CONFIG 读配置，必须在收集测试之前设好
+_config_path = os.path.join(_DATA_DIR, "config.json")
+with open(_config_path, "w", encoding="utf-8") as f:
+    json.dump(_test_config(), f)
+os.environ["SCASH_MANAGER_CONFIG"] = _config_path
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
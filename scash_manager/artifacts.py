@@ -0,0 +1,331 @@
+# scash_manager/artifacts.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+"""
+artifacts.py
+
+矿工安装包的下载 + 本地缓存：
+
+- 内容寻址缓存：/data/cache/sha256/<前两位>/<sha256>，
+  index.json 记录「URL → sha256」，容器重建后（/data 挂载卷还在）不用重新下载；
+- 服务器支持 Range 时分成多段并行下载，每段写自己的 .part 文件，
+  中途断线下次从已下载的位置续传；不支持 Range 时退回单连接整包下载；
+- SHA-256 校验：调用方传入的固定值（见 miner_downloader 的 PACKAGE_SHA256）或配置里的
+  downloads.sha256 优先；都没有时打警告，首次下载的结果记入 index，之后同一 URL
+  必须一致（只是首次信任，不算固定）；downloads.require_sha256=true 时直接拒绝下载；
+- 可选本地镜像（downloads.mirror）：先试 <mirror>/<文件名>，失败再回源；
+- downloads.cache=false 时不落盘：stream() 把下载流直接交给调用方（例如边下边解压），
+  适合存储很小的 SD 卡矿机。
+"""
+
+
+CHUNK_SIZE = 256 * 1024
+# 小于这个大小的包不分段（分段的额外请求不划算）
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+DEFAULT_OPTIONS = {
+    "cache_dir": "/data/cache",
+    "mirror": "",
+    "segments": 4,
+    "retries": 3,
+    "timeout": 60,
+    "sha256": {},        # {文件名: sha256}，补充 / 覆盖内置的固定值
+    "cache": True,       # False = 不缓存安装包，下载流直接解压
+    "require_sha256": False,  # True = 没有固定 SHA-256 的包拒绝下载
+}
+
+_options = dict(DEFAULT_OPTIONS)
+
+
+class PackageError(RuntimeError):
+    """下载到的内容本身有问题（换下一个来源，不在同一个来源上重试）。"""
+
+
+class ChecksumError(PackageError):
+    """下载内容的 SHA-256 和固定值不一致。"""
+
+
+def configure(dcfg: dict | None):
+    """用配置里的 downloads 块覆盖默认下载选项（webapp 启动时调用）。"""
+    global _options
+    _options = {**DEFAULT_OPTIONS, **(dcfg or {})}
+
+
+def cache_enabled() -> bool:
+    return bool(_options.get("cache", True))
+
+
+class HashingReader:
+    """包一层只读流：读的同时算 SHA-256（给 tarfile 的流式模式用）。"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._h = hashlib.sha256()
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.raw.read(n)
+        self._h.update(data)
+        return data
+
+    def drain(self):
+        """读完剩下的内容（只为了算完整哈希）。"""
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+class ArtifactCache:
+    """按 SHA-256 存放下载好的文件。"""
+
+    _index_lock = threading.Lock()
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "sha256", digest[:2], digest)
+
+    def partial_dir(self, url: str) -> str:
+        """某个 URL 的未完成分段（按 URL 区分，断线后续传用）。"""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, "partial", key)
+
+    def get(self, digest: str) -> str | None:
+        path = self.blob_path(digest)
+        return path if os.path.isfile(path) else None
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def recorded(self, url: str) -> str | None:
+        """之前下载同一 URL 时记录的 sha256。"""
+        with self._index_lock:
+            entry = self._load_index().get(url)
+        return entry.get("sha256") if entry else None
+
+    def store(self, tmp_path: str, digest: str, url: str) -> str:
+        """把下载好的文件移进缓存（原子 rename），并在 index 里记下 URL。"""
+        path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+        with self._index_lock:
+            index = self._load_index()
+            index[url] = {"sha256": digest, "size": os.path.getsize(path), "ts": time.time()}
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp, self.index_path)
+        return path
+
+
+def _probe(url: str, timeout: float) -> tuple[str, int | None, bool]:
+    """跟随重定向拿到最终地址、大小、是否支持 Range。"""
+    r = requests.head(url, allow_redirects=True, timeout=timeout)
+    r.raise_for_status()
+    size = r.headers.get("Content-Length")
+    ranges = r.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return r.url, (int(size) if size and size.isdigit() else None), ranges
+
+
+def _fetch_range(url: str, part: str, start: int, end: int, timeout: float):
+    """下载 [start, end] 到 part 文件，已有的部分跳过（续传）。"""
+    want = end - start + 1
+    have = os.path.getsize(part) if os.path.exists(part) else 0
+    if have > want:
+        os.remove(part)
+        have = 0
+    if have == want:
+        return
+
+    headers = {"Range": f"bytes={start + have}-{end}"}
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code != 206:
+            raise RuntimeError(f"服务器没有按 Range 返回（HTTP {r.status_code}）")
+        with open(part, "ab") as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+
+    got = os.path.getsize(part)
+    if got != want:
+        raise IOError(f"分段不完整：{got}/{want} 字节")
+
+
+def _fetch_whole(url: str, part: str, timeout: float):
+    with requests.get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        with open(part, "wb") as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+
+
+def _download(url: str, work_dir: str, segments: int, timeout: float) -> tuple[str, str]:
+    """
+    下载到 work_dir/download，返回 (路径, sha256)。
+    分段文件名带上总大小，服务器上的文件变了不会拼进旧的分段。
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    final_url, size, ranges = _probe(url, timeout)
+
+    if not ranges or not size:
+        parts = [os.path.join(work_dir, "whole.part")]
+        _fetch_whole(final_url, parts[0], timeout)
+    else:
+        n = max(1, min(int(segments), size // MIN_SEGMENT_SIZE or 1))
+        step = -(-size // n)
+        spans = [(i * step, min(size, (i + 1) * step) - 1) for i in range(n)]
+        parts = [os.path.join(work_dir, f"{size}.{i}.part") for i in range(n)]
+        if n == 1:
+            _fetch_range(final_url, parts[0], *spans[0], timeout)
+        else:
+            with ThreadPoolExecutor(max_workers=n) as pool:
+                futures = [
+                    pool.submit(_fetch_range, final_url, part, s, e, timeout)
+                    for part, (s, e) in zip(parts, spans)
+                ]
+                for fut in futures:
+                    fut.result()
+
+    # 拼接的同时算哈希，不用再读一遍
+    out = os.path.join(work_dir, "download")
+    h = hashlib.sha256()
+    with open(out, "wb") as dst:
+        for part in parts:
+            with open(part, "rb") as src:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    dst.write(chunk)
+    return out, h.hexdigest()
+
+
+def _pinned_sha256(opts: dict, name: str, sha256: str | None) -> str:
+    """
+    配置 / 调用方给出的固定 SHA-256（小写）；没有时打警告，
+    require_sha256=true 则抛 PackageError。
+    """
+    pin = ((opts.get("sha256") or {}).get(name) or sha256 or "").lower()
+    if pin:
+        return pin
+    if opts.get("require_sha256"):
+        raise PackageError(
+            f"{name} 没有固定 SHA-256，已拒绝下载（downloads.require_sha256=true）；"
+            f"请在 downloads.sha256 里填写发布页公布的值"
+        )
+    logging.warning(
+        "[下载] %s 没有固定 SHA-256：只能首次信任（TOFU），无法发现被篡改的发布包；"
+        "建议在 downloads.sha256 里填写发布页公布的值", name,
+    )
+    return ""
+
+
+def _sources(url: str, name: str, mirror: str) -> list[str]:
+    if mirror:
+        return [f"{mirror.rstrip('/')}/{name}", url]
+    return [url]
+
+
+def fetch(url: str, sha256: str | None = None, name: str | None = None) -> str:
+    """
+    取得 url 对应的文件，返回缓存里的路径（调用方只读，不要移动 / 修改它）。
+    name 为文件名（用于镜像地址和 downloads.sha256 查找），默认取 URL 最后一段。
+    """
+    opts = _options
+    name = name or url.rstrip("/").rsplit("/", 1)[-1]
+    cache = ArtifactCache(opts["cache_dir"])
+    pin = _pinned_sha256(opts, name, sha256) or (cache.recorded(url) or "").lower()
+
+    if pin:
+        hit = cache.get(pin)
+        if hit:
+            logging.info("[下载] 命中缓存 %s → %s", name, hit)
+            return hit
+
+    last_error = None
+    for src in _sources(url, name, opts.get("mirror") or ""):
+        work_dir = cache.partial_dir(src)
+        for attempt in range(1, int(opts["retries"]) + 1):
+            logging.info("[下载] %s（第 %d 次）", src, attempt)
+            try:
+                tmp, digest = _download(src, work_dir, opts["segments"], opts["timeout"])
+                if pin and digest != pin:
+                    raise ChecksumError(f"SHA-256 不匹配：期望 {pin}，实际 {digest}")
+                path = cache.store(tmp, digest, url)
+                shutil.rmtree(work_dir, ignore_errors=True)
+                if not pin:
+                    logging.info("[下载] %s 没有固定 SHA-256，本次为 %s（已记录）", name, digest)
+                return path
+            except PackageError as e:
+                # 内容不对，续传也没用：清掉分段换下一个来源
+                logging.error("[下载] %s: %s", src, e)
+                shutil.rmtree(work_dir, ignore_errors=True)
+                last_error = e
+                break
+            except Exception as e:
+                # 分段文件保留，下次从断点继续
+                logging.warning("[下载] %s 失败: %s", src, e)
+                last_error = e
+                if attempt < int(opts["retries"]):
+                    time.sleep(min(10, 2 ** attempt))
+
+    raise RuntimeError(f"下载失败 {url}: {last_error}")
+
+
+def stream(url: str, consume, sha256: str | None = None, name: str | None = None):
+    """
+    不落盘的下载：对每个来源（镜像 → 源站）重试，把响应流交给 consume(fileobj, verify)。
+    consume 在提交结果（例如 rename 到正式路径）之前调用 verify()：
+    有固定 SHA-256 时 verify 会读完剩余内容并校验，不一致抛 ChecksumError。
+    返回 consume 的返回值。
+    """
+    opts = _options
+    name = name or url.rstrip("/").rsplit("/", 1)[-1]
+    pin = _pinned_sha256(opts, name, sha256)
+
+    last_error = None
+    for src in _sources(url, name, opts.get("mirror") or ""):
+        for attempt in range(1, int(opts["retries"]) + 1):
+            logging.info("[下载] %s（流式，第 %d 次）", src, attempt)
+            try:
+                with requests.get(src, stream=True, timeout=opts["timeout"]) as r:
+                    r.raise_for_status()
+                    r.raw.decode_content = True
+                    reader = HashingReader(r.raw)
+
+                    def verify():
+                        if not pin:
+                            return
+                        reader.drain()
+                        if reader.hexdigest() != pin:
+                            raise ChecksumError(
+                                f"SHA-256 不匹配：期望 {pin}，实际 {reader.hexdigest()}"
+                            )
+
+                    return consume(reader, verify)
+            except PackageError as e:
+                logging.error("[下载] %s: %s", src, e)
+                last_error = e
+                break
+            except Exception as e:
+                logging.warning("[下载] %s 失败: %s", src, e)
+                last_error = e
+                if attempt < int(opts["retries"]):
+                    time.sleep(min(10, 2 ** attempt))
+
+    raise RuntimeError(f"下载失败 {url}: {last_error}")
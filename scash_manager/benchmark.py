@@ -0,0 +1,481 @@
+# scash_manager/benchmark.py
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional
+
+from .config import load_config, save_config, setup_logging
+from .host_tuning import miner_flags
+from .logring import ANSI_RE
+from .parsers import HASHRATE_RE, UNIT_MAP
+from .topology import affinity_mask, get_topology, recommend_layout
+
+
+"""
+benchmark.py
+
+离线跑分，自动挑选「矿工实现 + 线程数 + 绑核方式」：
+
+- 对每个已安装的矿工，用它自带的离线 benchmark 模式跑一遍
+  （cpuminer --benchmark、XMRig --bench），不连矿池；
+- 线程数在拓扑推荐值附近扫一圈，每个线程数分别试「按 L3 绑核」和「不绑核」；
+- 每轮先丢掉 warmup 秒（RandomX 初始化数据集 + 频率爬升），再取稳定段的平均算力；
+- 结果写到 /data/benchmark.json，可以一键应用最优配置。
+
+SRBMiner 没有可用的离线 benchmark 模式，暂不参与跑分。
+
+命令行用法（跑之前先在 Web 界面停掉 Miner）：
+    python bench.py --warmup 30 --duration 60 --apply
+"""
+
+
+BENCH_IMPLS = ("cpuminer", "xmrig")
+
+# 和 /api/setup 里的默认路径一致
+DEFAULT_BIN_PATHS = {
+    "cpuminer": "/usr/local/bin/minerd",
+    "xmrig": "/usr/local/bin/xmrig",
+    "srbminer": "/opt/SRBMiner-Multi/SRBMiner-MULTI",
+}
+
+DEFAULT_RESULTS_PATH = "/data/benchmark.json"
+
+# XMRig：" miner    speed 10s/60s/15m 1234.5 1230.1 n/a H/s max 1240.0 H/s"
+XMRIG_SPEED_RE = re.compile(
+    r"speed 10s/60s/15m\s+(?P<val>[\d.]+)\s+\S+\s+\S+\s+(?P<unit>[kKmMgG]?H/s)"
+)
+
+
+# ============================================================
+#                     计划 / 命令 / 解析
+# ============================================================
+
+def installed_miners(cfg: dict) -> dict:
+    """已安装的矿工 {impl: bin_path}：当前配置的路径优先，其次默认路径。"""
+    mcfg = cfg.get("miner", {}) or {}
+    found = {}
+    for impl in BENCH_IMPLS:
+        paths = []
+        if mcfg.get("impl") == impl and mcfg.get("bin_path"):
+            paths.append(mcfg["bin_path"])
+        paths.append(DEFAULT_BIN_PATHS[impl])
+        for p in paths:
+            if os.path.isfile(p) and os.access(p, os.X_OK):
+                found[impl] = p
+                break
+    return found
+
+
+def compatible_impls(cfg: dict) -> list[str]:
+    """
+    当前币种 / 矿池能用的实现（规则和 /api/setup 的防呆检查一致）：
+    SCASH 官方矿池不支持 XMRig，DERO 不能用 cpuminer。
+    """
+    coin = (cfg.get("coin") or "scash").lower()
+    pool = (cfg.get("miner", {}) or {}).get("url") or ""
+    impls = []
+    for impl in BENCH_IMPLS:
+        if impl == "xmrig" and coin == "scash" and "pool.scash.pro" in pool:
+            continue
+        if impl == "cpuminer" and coin == "dero":
+            continue
+        impls.append(impl)
+    return impls
+
+
+def thread_candidates(algorithm: str | None) -> list[int]:
+    """在拓扑推荐值附近扫：推荐值的一半、推荐值 ±1、+2，以及全部 CPU。"""
+    topo = get_topology()
+    total = len(topo["cpus"]) if topo else (os.cpu_count() or 1)
+    rec = recommend_layout(algorithm)["recommended_threads"]
+    cands = {max(1, rec // 2), rec - 1, rec, rec + 1, rec + 2, total}
+    return sorted(t for t in cands if 1 <= t <= total)
+
+
+def plan_runs(cfg: dict, impls=None, threads=None, affinities=("auto", "off")) -> list[dict]:
+    """
+    生成跑分计划：[{"impl", "bin_path", "algorithm", "threads", "affinity", "cpus"}, ...]
+    绑核方案和不绑核一样（线程数超过可用 CPU）时只跑一次。
+    """
+    mcfg = cfg.get("miner", {}) or {}
+    algo = mcfg.get("algorithm") or "randomx"
+    if algo == "randomscash":
+        # SRBMiner 的算法名，cpuminer / XMRig 用 randomx
+        algo = "randomx"
+
+    installed = installed_miners(cfg)
+    allowed = compatible_impls(cfg)
+    impls = [i for i in (impls or BENCH_IMPLS) if i in installed and i in allowed]
+    threads = threads or thread_candidates(algo)
+    hugepages = bool((cfg.get("host_tuning", {}) or {}).get("hugepages", True))
+
+    runs = []
+    for impl in impls:
+        for t in threads:
+            seen = set()
+            for aff in affinities:
+                cpus = None
+                if aff == "auto":
+                    cpus = recommend_layout(algo, threads=t, node=mcfg.get("numa_node"))["cpus"]
+                key = tuple(cpus or ())
+                if key in seen:
+                    continue
+                seen.add(key)
+                runs.append({
+                    "impl": impl,
+                    "bin_path": installed[impl],
+                    "algorithm": algo,
+                    "threads": int(t),
+                    "affinity": aff if cpus else "off",
+                    "cpus": cpus,
+                    "hugepages": hugepages,
+                })
+    return runs
+
+
+def bench_cmd(run: dict) -> list[str]:
+    """离线 benchmark 命令行。"""
+    impl = run["impl"]
+    if impl == "cpuminer":
+        return [
+            run["bin_path"],
+            "-a", run["algorithm"],
+            "--benchmark",
+            "-t", str(run["threads"]),
+        ]
+    if impl == "xmrig":
+        cmd = [
+            run["bin_path"],
+            "-a", run["algorithm"],
+            "--bench=10M",
+            "--print-time=5",
+            "-t", str(run["threads"]),
+        ]
+        if run.get("cpus"):
+            cmd += ["--cpu-affinity", affinity_mask(run["cpus"])]
+        # 大页状态和正式运行保持一致，否则跑分结果没有可比性
+        return cmd + miner_flags(impl, run.get("hugepages", True))
+    raise RuntimeError(f"{impl} 不支持离线 benchmark")
+
+
+def parse_sample(impl: str, line: str) -> Optional[float]:
+    """从一行输出里取「总」算力（H/s），每线程的算力行忽略。"""
+    line = ANSI_RE.sub("", line)
+    if impl == "xmrig":
+        m = XMRIG_SPEED_RE.search(line)
+        if not m:
+            return None
+        unit = m.group("unit")
+        return float(m.group("val")) * UNIT_MAP.get(unit.lower(), UNIT_MAP.get(unit, 1))
+
+    # cpuminer：benchmark 模式下每轮打印 "Total: 123.45 khash/s"
+    low = line.lower()
+    if "total" not in low and "benchmark" not in low:
+        return None
+    last = None
+    for last in HASHRATE_RE.finditer(line):
+        pass
+    if last is None:
+        return None
+    unit = last.group("unit")
+    return float(last.group("val")) * UNIT_MAP.get(unit.lower(), UNIT_MAP.get(unit, 1))
+
+
+# ============================================================
+#                          单轮跑分
+# ============================================================
+
+def _kill(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except Exception:
+        proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except Exception:
+            proc.kill()
+        proc.wait()
+
+
+def run_one(run: dict, warmup: float, duration: float,
+            stop_event: Optional[threading.Event] = None) -> dict:
+    """
+    跑一轮：启动 → 丢掉 warmup 秒内的采样 → 收集 duration 秒 → 杀掉进程。
+    返回 run 的副本，附加 {"hs", "stddev", "samples", "error"}。
+    """
+    result = {**run, "hs": None, "stddev": None, "samples": 0, "error": None}
+    try:
+        cmd = bench_cmd(run)
+    except RuntimeError as e:
+        result["error"] = str(e)
+        return result
+
+    cpus = run.get("cpus")
+
+    def _preexec():
+        os.setsid()
+        if cpus:
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError:
+                pass
+
+    logging.info("[Benchmark] %s", " ".join(cmd))
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            preexec_fn=_preexec,
+        )
+    except Exception as e:
+        result["error"] = f"启动失败: {e}"
+        return result
+
+    t0 = time.monotonic()
+    samples = []          # (秒, H/s)
+    tail = []             # 最后几行输出，失败时方便排查
+
+    def _reader():
+        for raw in iter(proc.stdout.readline, b""):
+            line = raw.decode("utf-8", errors="ignore").rstrip()
+            tail.append(line)
+            del tail[:-5]
+            hs = parse_sample(run["impl"], line)
+            if hs is not None:
+                samples.append((time.monotonic() - t0, hs))
+
+    reader = threading.Thread(target=_reader, daemon=True)
+    reader.start()
+
+    deadline = t0 + warmup + duration
+    stop_event = stop_event or threading.Event()
+    while time.monotonic() < deadline and proc.poll() is None:
+        if stop_event.wait(0.5):
+            break
+
+    exited_early = proc.poll() is not None
+    _kill(proc)
+    reader.join(timeout=2)
+
+    steady = [hs for t, hs in samples if t >= warmup]
+    if not steady and samples and exited_early:
+        # XMRig --bench 跑完就退出，warmup 太长时退而用最后一个采样
+        steady = [samples[-1][1]]
+
+    if steady:
+        mean = sum(steady) / len(steady)
+        var = sum((x - mean) ** 2 for x in steady) / len(steady)
+        result.update(hs=mean, stddev=math.sqrt(var), samples=len(steady))
+    elif stop_event.is_set():
+        result["error"] = "已取消"
+    else:
+        result["error"] = "没有采到稳定段的算力: " + " | ".join(tail)
+    return result
+
+
+# ============================================================
+#                        结果 / 应用
+# ============================================================
+
+def best_result(results: list[dict]) -> Optional[dict]:
+    ok = [r for r in results if r.get("hs")]
+    return max(ok, key=lambda r: r["hs"]) if ok else None
+
+
+def load_results(path: str = DEFAULT_RESULTS_PATH) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_results(payload: dict, path: str = DEFAULT_RESULTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def apply_best(cfg: dict, best: dict) -> dict:
+    """把跑分最优的实现 / 路径 / 线程数 / 绑核方式写进配置（调用方负责 save_config）。"""
+    mcfg = cfg.get("miner", {}) or {}
+    mcfg["impl"] = best["impl"]
+    mcfg["bin_path"] = best["bin_path"]
+    mcfg["threads"] = best["threads"]
+    mcfg["affinity"] = "auto" if best["affinity"] == "auto" else "off"
+    if mcfg.get("algorithm") == "randomscash" and best["impl"] != "srbminer":
+        mcfg["algorithm"] = best["algorithm"]
+    cfg["miner"] = mcfg
+    return cfg
+
+
+class BenchmarkJob:
+    """
+    后台跑分任务（同一时间只跑一个）。
+    snapshot() 给 /api/benchmark 用：state / 进度 / 当前轮 / 已完成结果 / 最优项。
+    """
+
+    def __init__(self, runs: list[dict], warmup: float = 30, duration: float = 60,
+                 results_path: str = DEFAULT_RESULTS_PATH, on_finish=None):
+        self.runs = runs
+        self.warmup = float(warmup)
+        self.duration = float(duration)
+        self.results_path = results_path
+        # on_finish(job)：跑完（含失败 / 取消）后在任务线程里调用
+        self.on_finish = on_finish
+
+        self.state = "pending"   # pending / running / done / cancelled / failed
+        self.results: list[dict] = []
+        self.current: Optional[dict] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._stop_event.set()
+
+    def is_running(self) -> bool:
+        return self.state in ("pending", "running")
+
+    def best(self) -> Optional[dict]:
+        with self._lock:
+            return best_result(self.results)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "total": len(self.runs),
+                "done": len(self.results),
+                "current": self.current,
+                "warmup": self.warmup,
+                "duration": self.duration,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "results": list(self.results),
+                "best": best_result(self.results),
+            }
+
+    def run(self):
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            for run in self.runs:
+                if self._stop_event.is_set():
+                    break
+                with self._lock:
+                    self.current = run
+                res = run_one(run, self.warmup, self.duration, self._stop_event)
+                logging.info(
+                    "[Benchmark] %s t=%s affinity=%s → %s",
+                    run["impl"], run["threads"], run["affinity"],
+                    f"{res['hs']:.2f} H/s" if res["hs"] else res["error"],
+                )
+                with self._lock:
+                    self.results.append(res)
+            self.state = "cancelled" if self._stop_event.is_set() else "done"
+        except Exception as e:
+            logging.exception("[Benchmark] 跑分异常")
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            with self._lock:
+                self.current = None
+            self.finished_at = time.time()
+
+        try:
+            save_results(self.snapshot(), self.results_path)
+        except OSError as e:
+            logging.error("[Benchmark] 保存结果失败: %s", e)
+
+        if self.on_finish is not None:
+            try:
+                self.on_finish(self)
+            except Exception:
+                logging.exception("[Benchmark] on_finish 回调异常")
+
+
+# ============================================================
+#                          命令行
+# ============================================================
+
+def _int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SCASH Manager 离线跑分（跑之前先停掉正在挖矿的 Miner）")
+    parser.add_argument("--impl", action="append", choices=BENCH_IMPLS, help="只测指定实现，可重复")
+    parser.add_argument("--threads", type=_int_list, help="线程数列表，例如 4,6,8（默认按拓扑推荐）")
+    parser.add_argument("--affinity", default="auto,off", help="绑核方式：auto,off")
+    parser.add_argument("--warmup", type=float, default=None, help="每轮预热秒数")
+    parser.add_argument("--duration", type=float, default=None, help="每轮采样秒数")
+    parser.add_argument("--output", default=None, help="结果文件（默认 /data/benchmark.json）")
+    parser.add_argument("--apply", action="store_true", help="把最优结果写入配置")
+    args = parser.parse_args(argv)
+
+    cfg = load_config(allow_missing=True)
+    setup_logging(cfg)
+    bcfg = cfg.get("benchmark", {}) or {}
+
+    runs = plan_runs(cfg, args.impl, args.threads, tuple(args.affinity.split(",")))
+    if not runs:
+        print("没有可跑分的矿工（需要已安装的 cpuminer / XMRig）。")
+        return 1
+
+    job = BenchmarkJob(
+        runs,
+        warmup=args.warmup if args.warmup is not None else bcfg.get("warmup", 30),
+        duration=args.duration if args.duration is not None else bcfg.get("duration", 60),
+        results_path=args.output or bcfg.get("results") or DEFAULT_RESULTS_PATH,
+    )
+    print(f"共 {len(runs)} 轮，每轮约 {job.warmup + job.duration:.0f} 秒")
+    # 矿工在独立进程组里，收不到 Ctrl-C，由任务线程负责杀掉
+    job.start()
+    try:
+        while job._thread.is_alive():
+            job._thread.join(timeout=1)
+    except KeyboardInterrupt:
+        job.cancel()
+        job._thread.join()
+
+    for r in job.results:
+        hs = f"{r['hs']:.2f} H/s ±{r['stddev']:.2f}" if r["hs"] else f"失败: {r['error']}"
+        print(f"{r['impl']:9s} threads={r['threads']:<3d} affinity={r['affinity']:4s} {hs}")
+
+    best = job.best()
+    if best is None:
+        print("没有成功的跑分结果。")
+        return 1
+    print(f"最优: {best['impl']} threads={best['threads']} affinity={best['affinity']} "
+          f"{best['hs']:.2f} H/s")
+    if args.apply:
+        save_config(apply_best(cfg, best))
+        print("已写入配置，重启 Miner 后生效。")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
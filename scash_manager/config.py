@@ -4,6 +4,8 @@ import logging
 import os
 from copy import deepcopy
 
+from . import logfiles
+
 
 # 默认配置（第一次运行或配置文件不存在时使用）
 DEFAULT_CONFIG = {
@@ -11,19 +13,109 @@ DEFAULT_CONFIG = {
     "miner": {
         "impl": "cpuminer",                 # cpuminer / srbminer
         "url": "",                          # 矿池地址
+        "pools": [],                        # 多个矿池（有序），按延迟选择 + 故障切换；空 = 只用 url
+        "pool_probe_interval": 300,         # 秒：矿池延迟探测间隔
         "user": "",                         # 钱包地址（用户名）
-        "threads": None,                    # 线程数（None = 自动）
+        "threads": None,                    # 线程数（None = 按 CPU 拓扑 / L3 推荐）
+        "affinity": "auto",                 # auto = 按 L3 / NUMA 绑核，off = 不绑，或 CPU 列表
+        "numa_node": None,                  # 只用某个 NUMA 节点（None = 全部）
         "bin_path": "/usr/local/bin/minerd",
         "algorithm": "randomx",
         "extra_args": "",
+        "api": {
+            "enabled": False,               # 打开矿工自带的本地 API（更准确的算力 / 份额；SRBMiner 的 API 监听所有网卡）
+            "port": None,                   # None = 按实现用默认端口
+            "poll_interval": 5,             # 秒
+        },
     },
     "watchdog": {
         "enabled": True,
-        "restart_delay": 5,                 # 秒
+        "restart_delay": 5,                 # 秒：连续崩溃时的退避基数（第一次崩溃立即重启）
+        "backoff_max": 300,                 # 秒：退避上限
+        "stable_after": 60,                 # 秒：运行超过这么久再崩溃，退避清零
+        "crash_loop_max": 5,                # crash_loop_window 秒内自动重启超过这么多次就熔断
+        "crash_loop_window": 300,
+        "crash_loop_cooldown": 600,         # 秒：熔断后暂停多久再试
+        "conn_error_threshold": 5,          # conn_error_window 秒内出现这么多次连接错误就切换矿池
+        "conn_error_window": 120,
+    },
+    # 卡死检测：进程还在但不出算力 / 不出份额（见 health.py）
+    # 每条规则的 action：restart / switch_pool / alert / off
+    "health": {
+        "enabled": True,
+        "check_interval": 10,               # 秒
+        "grace": 120,                       # 秒：Miner 启动后这么久内不检查（初始化数据集）
+        "no_hashrate": {"after": 300, "action": "restart"},
+        "low_hashrate": {"ratio": 0.5, "for": 600, "action": "alert"},
+        # 低算力的 CPU 机器半小时没份额很正常，默认只告警；重启 / 切矿池要自己打开
+        "no_share": {"factor": 10, "min": 1800, "action": "alert"},
     },
     "logging": {
         "file": "/data/scash-manager.log",
         "level": "INFO",
+        "max_bytes": 10 * 1024 * 1024,      # 按大小轮转（0 = 不按大小）
+        "rotate_interval": 86400,           # 秒：按时间轮转（0 = 不按时间）
+        "backup_count": 5,                  # 保留几个旧文件
+        "compress": True,                   # 旧文件 gzip 压缩
+        "queue_size": 10000,                # 异步写入队列长度，满了丢弃并计数
+        "ring_bytes": 512 * 1024,           # 每个实例内存日志缓冲的大小（字节，/api/logs 实时部分）
+        # 矿工输出单独一路（不经过 root logger），见 logfiles.py
+        "miner_output": {
+            "file": "/data/miner-output.log",   # 空 = 不写文件
+            "level": "INFO",                # WARNING 及以上 = 不落盘（网页日志不受影响）
+            "console": False,               # 是否同时输出到控制台
+            "max_bytes": 20 * 1024 * 1024,
+            "rotate_interval": 86400,
+            "backup_count": 3,
+            "compress": True,
+        },
+    },
+    # 矿工日志持久化归档（见 logarchive.py），/api/logs?from=&to=&grep= 查询
+    "log_archive": {
+        "enabled": True,
+        "dir": "/data/logs",                # 每个实例一个子目录
+        "segment_bytes": 8 * 1024 * 1024,   # 单个分段文件大小
+        "max_bytes": 256 * 1024 * 1024,     # 每个实例最多保留多少（超出删最旧的段）
+        "index_every": 64 * 1024,           # 稀疏时间索引：每多少字节记一个点
+        "queue_size": 1000,                 # 写入队列（按批），满了丢弃并计数
+    },
+    # 额外的 Miner 实例（default 实例之外），每项：
+    # {"name": "node1", "wallet"?: ..., "miner": {...}, "watchdog": {...}}
+    # 没写的字段沿用顶层配置。
+    "instances": [],
+    "host_tuning": {
+        "hugepages": True,                  # 给 RandomX 用大页（XMRig / SRBMiner 加对应参数）
+        "reserve": False,                   # 有权限时自动调大 nr_hugepages（约 2.3 GB，需手动打开）
+        "mem_margin_mb": 512,               # 预留后至少给系统留的 MemAvailable
+        "release_on_stop": True,            # 手动停止时把自动预留的大页还给系统
+        "gb_pages": False,                  # XMRig 额外尝试 1 GB 大页
+    },
+    # 本地 stratum 代理：多个 cpuminer 共用一条矿池连接（见 stratum_proxy.py）
+    "proxy": {
+        "enabled": False,
+        "listen": "127.0.0.1:3334",         # 本地矿工连接的地址
+        "upstreams": [],                    # 上游矿池（按顺序故障切换），空 = 用 miner.url
+        "prefix_bytes": 1,                  # 每个本地矿工占用的 extranonce2 前缀字节数
+    },
+    # 矿工安装包下载（见 artifacts.py）
+    "downloads": {
+        "cache_dir": "/data/cache",         # 内容寻址缓存，容器重建后复用
+        "mirror": "",                       # 本地镜像，例如 http://10.0.0.5:8080/miners（先试镜像再回源）
+        "segments": 4,                      # 支持 Range 时的并行分段数
+        "retries": 3,                       # 每个来源的重试次数（断点续传）
+        "timeout": 60,                      # 秒
+        "sha256": {},                       # {文件名: sha256}，补充内置的校验值
+        "require_sha256": False,            # True = 没有固定 SHA-256 的安装包拒绝下载
+    },
+    "benchmark": {
+        "results": "/data/benchmark.json",  # 离线跑分结果
+        "warmup": 30,                       # 每轮丢掉的预热秒数
+        "duration": 60,                     # 每轮采样秒数
+    },
+    "history": {
+        "enabled": True,
+        "db": "/data/history.db",          # 算力历史（SQLite）
+        "sample_interval": 10,              # 秒
     },
 }
 
@@ -36,6 +128,25 @@ def _get_config_path() -> str:
     return os.environ.get("SCASH_MANAGER_CONFIG", "/data/config.json")
 
 
+def config_ready(cfg: dict) -> bool:
+    """只看钱包 + 矿池是否填了，用来决定是否进入向导。"""
+    wallet = (cfg.get("wallet") or "").strip()
+    mcfg = cfg.get("miner", {}) or {}
+    url = (mcfg.get("url") or "").strip()
+    return bool(wallet and url)
+
+
+def _merge_block(defaults: dict, override: dict) -> dict:
+    """默认值 + 用户配置；两边都是 dict 的子项逐层合并，而不是整块替换。"""
+    merged = deepcopy(defaults)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_block(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
 def load_config(allow_missing: bool = False) -> dict:
     """
     从 JSON 文件加载配置。
@@ -76,9 +187,37 @@ def load_config(allow_missing: bool = False) -> dict:
         if "watchdog" in data and isinstance(data["watchdog"], dict):
             cfg["watchdog"].update(data["watchdog"])
 
-        # logging 子项
+        # health 子项（规则内部缺的字段由 health.rule_config 用默认值补）
+        if "health" in data and isinstance(data["health"], dict):
+            cfg["health"].update(data["health"])
+
+        # logging 子项（含嵌套的 miner_output，用户只写一部分时其余沿用默认值）
         if "logging" in data and isinstance(data["logging"], dict):
-            cfg["logging"].update(data["logging"])
+            cfg["logging"] = _merge_block(DEFAULT_CONFIG["logging"], data["logging"])
+
+        # log_archive 子项
+        if "log_archive" in data and isinstance(data["log_archive"], dict):
+            cfg["log_archive"].update(data["log_archive"])
+
+        # host_tuning 子项
+        if "host_tuning" in data and isinstance(data["host_tuning"], dict):
+            cfg["host_tuning"].update(data["host_tuning"])
+
+        # proxy 子项
+        if "proxy" in data and isinstance(data["proxy"], dict):
+            cfg["proxy"].update(data["proxy"])
+
+        # downloads 子项
+        if "downloads" in data and isinstance(data["downloads"], dict):
+            cfg["downloads"].update(data["downloads"])
+
+        # benchmark 子项
+        if "benchmark" in data and isinstance(data["benchmark"], dict):
+            cfg["benchmark"].update(data["benchmark"])
+
+        # history 子项
+        if "history" in data and isinstance(data["history"], dict):
+            cfg["history"].update(data["history"])
     except Exception as e:
         logging.warning("合并配置时出现异常，部分字段可能丢失: %s", e)
 
@@ -103,39 +242,9 @@ def save_config(cfg: dict) -> None:
 
 def setup_logging(cfg: dict) -> None:
     """
-    根据配置初始化 logging：同时输出到控制台和日志文件。
+    根据配置初始化 logging：控制台 + 轮转日志文件，矿工输出单独一个文件（见 logfiles.py）。
+    写盘在后台线程里做，调用 logging 的线程不会被慢磁盘卡住。
     只在程序启动时调用一次。
     """
-    log_cfg = (cfg or {}).get("logging", {}) or {}
-    log_file = log_cfg.get("file", "/data/scash-manager.log")
-    level_str = (log_cfg.get("level") or "INFO").upper()
-
-    level = getattr(logging, level_str, logging.INFO)
-
-    # 确保日志目录存在
-    try:
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-    except Exception:
-        pass
-
-    # 避免重复添加 Handler
-    root = logging.getLogger()
-    if root.handlers:
-        return
-
-    fmt = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
-
-    handlers = [
-        logging.StreamHandler(),
-    ]
-    try:
-        file_handler = logging.FileHandler(log_file, encoding="utf-8")
-        handlers.append(file_handler)
-    except Exception as e:
-        # 文件打不开时，至少保证控制台有日志
-        logging.basicConfig(level=level, format=fmt)
-        logging.error("创建日志文件失败 %s: %s", log_file, e)
-        return
-
-    logging.basicConfig(level=level, format=fmt, handlers=handlers)
-    logging.info("Logging 已初始化，level=%s, file=%s", level_str, log_file)
+    log_cfg = {**DEFAULT_CONFIG["logging"], **((cfg or {}).get("logging", {}) or {})}
+    logfiles.setup(log_cfg)
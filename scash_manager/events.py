@@ -0,0 +1,91 @@
+# scash_manager/events.py
+import json
+import logging
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """
+    简单的一对多事件广播（给 /api/stream 的 SSE 用）：
+
+    - 每个订阅者一个有界队列，发布时 put_nowait，不会阻塞 push_log；
+    - 慢客户端队列满了就丢掉它最旧的事件，并标记 overflow，
+      让它在下一次读取时收到一个 "resync" 事件（前端重新全量拉取）。
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers: set["Subscription"] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> "Subscription":
+        sub = Subscription(self, self.max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+        logging.debug("[events] 新订阅者，当前 %d 个", len(self._subscribers))
+        return sub
+
+    def unsubscribe(self, sub: "Subscription"):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: str, data):
+        """发布事件；没有订阅者时几乎零开销。"""
+        with self._lock:
+            if not self._subscribers:
+                return
+            subs = list(self._subscribers)
+
+        payload = json.dumps(data, ensure_ascii=False)
+        for sub in subs:
+            sub._offer(event, payload)
+
+
+class Subscription:
+    """单个订阅者的有界队列。"""
+
+    def __init__(self, broadcaster: EventBroadcaster, max_queue: int):
+        self._broadcaster = broadcaster
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.overflow = False
+
+    def _offer(self, event: str, payload: str):
+        try:
+            self._queue.put_nowait((event, payload))
+        except queue.Full:
+            # 丢掉最旧的一条，保证最新状态能送达
+            self.overflow = True
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait((event, payload))
+            except (queue.Empty, queue.Full):
+                pass
+
+    def get(self, timeout: float):
+        """取一条事件 (event, payload_json)，超时返回 None。"""
+        if self.overflow:
+            self.overflow = False
+            return "resync", "{}"
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+
+def format_sse(event: str, payload: str, event_id=None) -> str:
+    """按 text/event-stream 格式拼一条消息。"""
+    parts = []
+    if event_id is not None:
+        parts.append(f"id: {event_id}")
+    parts.append(f"event: {event}")
+    for line in payload.split("\n"):
+        parts.append(f"data: {line}")
+    return "\n".join(parts) + "\n\n"
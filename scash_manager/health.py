@@ -0,0 +1,220 @@
+# scash_manager/health.py
+import logging
+import threading
+import time
+
+
+"""
+health.py
+
+进程还活着、但已经不干活的「卡死」检测。
+
+矿工经常不是崩溃退出，而是挂在那里：矿池断线重连死循环、线程卡住……
+这时 Watchdog 看到的是进程还在，算力却是 0，也没有 accepted 行。
+HealthMonitor 根据 LogRing 写入时解析出的算力 / 份额时间戳定期检查三条规则：
+
+- no_hashrate：超过 after 秒没有新的算力输出；
+- low_hashrate：算力持续 for 秒低于 EWMA 的 ratio 倍；
+- no_share：超过 factor × 平均出块间隔（至少 min 秒）没有新的 accepted。
+
+每条规则的 action 可以是 restart / switch_pool / alert / off，
+触发后交给 on_trigger(rule, action, detail)（MinerInstance 转给 Watchdog 执行）。
+"""
+
+
+ACTIONS = ("restart", "switch_pool", "alert", "off")
+
+RULE_DEFAULTS = {
+    "no_hashrate": {"after": 300, "action": "restart"},
+    "low_hashrate": {"ratio": 0.5, "for": 600, "action": "alert"},
+    "no_share": {"factor": 10, "min": 1800, "action": "alert"},
+}
+
+# 算力 EWMA 的平滑系数（按每条算力输出更新一次）
+EWMA_ALPHA = 0.05
+# 平均份额间隔的平滑系数
+SHARE_ALPHA = 0.2
+
+
+def rule_config(hcfg: dict, name: str) -> dict:
+    """单条规则的配置：用默认值兜底（配置文件里可以只写部分字段）。"""
+    rule = {**RULE_DEFAULTS[name], **((hcfg or {}).get(name) or {})}
+    if rule.get("action") not in ACTIONS:
+        logging.warning("[Health] 规则 %s 的 action=%r 无效，改为 alert", name, rule.get("action"))
+        rule["action"] = "alert"
+    return rule
+
+
+class HealthMonitor:
+    """
+    定期检查单个 Miner 实例的健康规则：
+
+    - 只在 Miner 运行、且启动超过 grace 秒后检查（RandomX 初始化数据集要几十秒）；
+    - 每条规则触发一次后进入 firing 状态，条件恢复或 Miner 重启后才会再次触发；
+    - status() 给 /api/status 展示每条规则的当前状态。
+    """
+
+    def __init__(self, ring, miner, cfg, on_trigger=None):
+        self.ring = ring
+        self.miner = miner
+        hcfg = cfg.get("health", {}) or {}
+        self.enabled = bool(hcfg.get("enabled", True))
+        self.check_interval = max(1.0, float(hcfg.get("check_interval", 10)))
+        self.grace = float(hcfg.get("grace", 120))
+        self.rules = {name: rule_config(hcfg, name) for name in RULE_DEFAULTS}
+        self.on_trigger = on_trigger
+
+        self._lock = threading.Lock()
+        self.ewma_hs: float | None = None
+        self.share_interval: float | None = None   # 平均份额间隔（秒）
+        self._seen_hashrate_at = None
+        self._seen_accepted_at = None
+        self._low_since: float | None = None
+        self._run_started_at = None                 # 当前这次运行的 started_at
+        self._state = {
+            name: {"state": "ok", "fired_at": None, "fired_count": 0, "detail": None}
+            for name in RULE_DEFAULTS
+        }
+
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # =========================================================
+    # 外部接口
+    # =========================================================
+
+    def start(self):
+        """启动检查线程（只允许启动一次）"""
+        if not self.enabled:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        logging.info("[Health] 已启动，检查间隔=%ss", self.check_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "ewma_hs": self.ewma_hs,
+                "share_interval": self.share_interval,
+                "rules": {
+                    name: {**self._state[name], "action": self.rules[name]["action"]}
+                    for name in RULE_DEFAULTS
+                },
+            }
+
+    # =========================================================
+    # 检查
+    # =========================================================
+
+    def run(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error("[Health] 检查失败: %s", e)
+        logging.info("[Health] run() 线程已退出")
+
+    def _observe(self, act: dict, started_at: float):
+        """把上次检查之后的新算力 / 新份额并进 EWMA（调用方持有 _lock）。"""
+        if started_at != self._run_started_at:
+            # Miner 重启过：规则状态清零，EWMA / 份额间隔保留（同一台机器同一个矿池）
+            self._run_started_at = started_at
+            self._low_since = None
+            for st in self._state.values():
+                st["state"], st["detail"] = "ok", None
+
+        hs = act["hs"]
+        if act["hashrate_at"] != self._seen_hashrate_at and hs is not None:
+            self._seen_hashrate_at = act["hashrate_at"]
+            ratio = self.rules["low_hashrate"]["ratio"]
+            # 低于阈值的点不进 EWMA，否则持续掉速时基准会跟着一起掉下去
+            if self.ewma_hs is None:
+                self.ewma_hs = hs if hs > 0 else None
+            elif hs >= self.ewma_hs * ratio:
+                self.ewma_hs = EWMA_ALPHA * hs + (1 - EWMA_ALPHA) * self.ewma_hs
+
+        if act["accepted_at"] != self._seen_accepted_at and act["accepted_at"] is not None:
+            prev = self._seen_accepted_at
+            self._seen_accepted_at = act["accepted_at"]
+            # 只用同一次运行内的两次份额算间隔
+            if prev is not None and prev >= started_at:
+                gap = act["accepted_at"] - prev
+                if self.share_interval is None:
+                    self.share_interval = gap
+                else:
+                    self.share_interval = SHARE_ALPHA * gap + (1 - SHARE_ALPHA) * self.share_interval
+
+    def _evaluate(self, act: dict, started_at: float, now: float) -> dict:
+        """每条规则当前是否满足触发条件：{rule: detail 或 None}（调用方持有 _lock）。"""
+        hits = {}
+
+        rule = self.rules["no_hashrate"]
+        last = max(act["hashrate_at"] or 0, started_at)
+        idle = now - last
+        hits["no_hashrate"] = (
+            f"{idle:.0f} 秒没有算力输出" if idle >= rule["after"] else None
+        )
+
+        rule = self.rules["low_hashrate"]
+        hs = act["hs"]
+        fresh = act["hashrate_at"] is not None and act["hashrate_at"] >= started_at
+        if fresh and self.ewma_hs and hs is not None and hs < self.ewma_hs * rule["ratio"]:
+            if self._low_since is None:
+                self._low_since = now
+        else:
+            self._low_since = None
+        hits["low_hashrate"] = (
+            f"算力 {hs:.2f} H/s 低于 EWMA {self.ewma_hs:.2f} H/s 的 {rule['ratio']:.0%} "
+            f"已 {now - self._low_since:.0f} 秒"
+            if self._low_since is not None and now - self._low_since >= rule["for"]
+            else None
+        )
+
+        rule = self.rules["no_share"]
+        limit = max(float(rule["min"]), rule["factor"] * (self.share_interval or 0))
+        last = max(act["accepted_at"] or 0, started_at)
+        idle = now - last
+        hits["no_share"] = (
+            f"{idle:.0f} 秒没有新的 accepted（阈值 {limit:.0f} 秒）" if idle >= limit else None
+        )
+        return hits
+
+    def check(self, now: float | None = None):
+        """检查一次；条件刚满足的规则调用 on_trigger。"""
+        miner = self.miner
+        if not miner.is_running() or miner.started_at is None:
+            return
+        if now is None:
+            now = time.time()
+        started_at = miner.started_at
+        act = self.ring.activity()
+
+        fired = []
+        with self._lock:
+            self._observe(act, started_at)
+            if now - started_at < self.grace:
+                return
+            for name, detail in self._evaluate(act, started_at, now).items():
+                st = self._state[name]
+                if detail is None:
+                    st["state"], st["detail"] = "ok", None
+                    continue
+                st["detail"] = detail
+                if st["state"] == "firing" or self.rules[name]["action"] == "off":
+                    continue
+                st["state"] = "firing"
+                st["fired_at"] = now
+                st["fired_count"] += 1
+                fired.append((name, self.rules[name]["action"], detail))
+
+        for name, action, detail in fired:
+            logging.warning("[Health] 规则 %s 触发（%s），动作=%s", name, detail, action)
+            if self.on_trigger is not None:
+                self.on_trigger(name, action, detail)
@@ -0,0 +1,175 @@
+# scash_manager/history_store.py
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+"""
+history_store.py
+
+算力时间序列的持久化存储（SQLite，WAL 模式）：
+
+- 每次采样同时写入 3 个降采样层级：1 分钟 / 15 分钟 / 1 小时；
+- 每层一张表，主键是对齐后的桶时间戳，同一个桶内用 UPSERT 聚合
+  （算力求和 / 计数 / 最小 / 最大，份额与重启次数取最新值）；
+- 每层有各自的保留时长，定期清理；
+- 查询时按时间范围自动选层，不需要把几周的数据都读进内存。
+"""
+
+
+# (名字, 桶宽度秒, 保留时长秒)
+TIERS = (
+    ("1m", 60, 2 * 86400),
+    ("15m", 900, 45 * 86400),
+    ("1h", 3600, 400 * 86400),
+)
+
+# 自动选层时，单次查询最多返回的点数
+MAX_AUTO_POINTS = 1500
+
+_RANGE_RE = re.compile(r"^\s*(\d+)\s*([smhdw]?)\s*$", re.IGNORECASE)
+_RANGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_range(value: str) -> int:
+    """把 '90m' / '6h' / '7d' / '2w' / '3600' 转成秒数，格式不对抛 ValueError。"""
+    m = _RANGE_RE.match(value or "")
+    if not m:
+        raise ValueError(f"无法识别的时间范围: {value!r}")
+    seconds = int(m.group(1)) * _RANGE_UNITS[m.group(2).lower()]
+    if seconds <= 0:
+        raise ValueError(f"时间范围必须大于 0: {value!r}")
+    return seconds
+
+
+class HistoryStore:
+    """算力历史的磁盘存储，线程安全（内部一把锁 + 一个连接）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        for name, _, _ in TIERS:
+            self._conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS hr_{name} (
+                    ts       INTEGER PRIMARY KEY,
+                    hs_sum   REAL    NOT NULL,
+                    hs_min   REAL    NOT NULL,
+                    hs_max   REAL    NOT NULL,
+                    n        INTEGER NOT NULL,
+                    accepted INTEGER NOT NULL,
+                    rejected INTEGER NOT NULL,
+                    restarts INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+        logging.info("[history] 已打开算力历史库: %s", path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # =========================================================
+    # 写入 / 清理
+    # =========================================================
+
+    def record(self, ts: int, hs: float, accepted: int, rejected: int, restarts: int):
+        """写入一次采样，三个层级在同一个事务里更新。"""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for name, width, _ in TIERS:
+                    bucket = ts - ts % width
+                    cur.execute(
+                        f"""
+                        INSERT INTO hr_{name}
+                            (ts, hs_sum, hs_min, hs_max, n, accepted, rejected, restarts)
+                        VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                        ON CONFLICT(ts) DO UPDATE SET
+                            hs_sum   = hs_sum + excluded.hs_sum,
+                            hs_min   = MIN(hs_min, excluded.hs_min),
+                            hs_max   = MAX(hs_max, excluded.hs_max),
+                            n        = n + 1,
+                            accepted = excluded.accepted,
+                            rejected = excluded.rejected,
+                            restarts = excluded.restarts
+                        """,
+                        (bucket, hs, hs, hs, accepted, rejected, restarts),
+                    )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def prune(self, now: int | None = None):
+        """按各层保留时长删除过期数据。"""
+        if now is None:
+            now = int(time.time())
+        with self._lock:
+            for name, _, retention in TIERS:
+                self._conn.execute(f"DELETE FROM hr_{name} WHERE ts < ?", (now - retention,))
+
+    # =========================================================
+    # 查询
+    # =========================================================
+
+    @staticmethod
+    def pick_tier(range_sec: int, resolution: str | None = None) -> str:
+        """
+        选层：
+        - 指定了 resolution（1m / 15m / 1h）就用它；
+        - 否则选保留时长覆盖 range、且点数不超过 MAX_AUTO_POINTS 的最细层。
+        """
+        names = [name for name, _, _ in TIERS]
+        if resolution and resolution != "auto":
+            if resolution not in names:
+                raise ValueError(f"resolution 只能是 {', '.join(names)} 或 auto")
+            return resolution
+
+        for name, width, retention in TIERS:
+            if range_sec <= retention and range_sec / width <= MAX_AUTO_POINTS:
+                return name
+        return TIERS[-1][0]
+
+    def query(self, range_sec: int, resolution: str | None = None, now: int | None = None):
+        """
+        返回 (tier, points)，points: [{ts, hs, min_hs, max_hs, accepted, rejected, restarts}]
+        """
+        tier = self.pick_tier(range_sec, resolution)
+        if now is None:
+            now = int(time.time())
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT ts, hs_sum / n, hs_min, hs_max, accepted, rejected, restarts
+                FROM hr_{tier}
+                WHERE ts >= ?
+                ORDER BY ts
+                """,
+                (now - range_sec,),
+            ).fetchall()
+
+        points = [
+            {
+                "ts": ts,
+                "hs": hs,
+                "min_hs": lo,
+                "max_hs": hi,
+                "accepted": acc,
+                "rejected": rej,
+                "restarts": rs,
+            }
+            for ts, hs, lo, hi, acc, rej, rs in rows
+        ]
+        return tier, points
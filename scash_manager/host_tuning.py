@@ -0,0 +1,349 @@
+# scash_manager/host_tuning.py
+import logging
+import os
+import threading
+
+from .topology import l3_per_thread
+
+
+"""
+host_tuning.py
+
+RandomX 的宿主机调优（大页内存 / MSR）：
+
+- 读 /proc/meminfo 和 /sys/kernel/mm/hugepages，看当前有多少 2 MB / 1 GB 大页；
+- 按「数据集 + 每线程 scratchpad」算出需要多少页；
+- 开了 reserve 且有权限时（root / 特权容器）把 nr_hugepages 调到够用，
+  但不超过 MemAvailable 减去安全余量；没权限只报告、不报错；
+- 矿工实现没有大页参数（cpuminer）时不预留；
+- 手动停止矿工时（release_on_stop）把自己加上去的页还给系统；
+- 按矿工实现给出对应的命令行参数；
+- 统计开 / 不开大页时的平均算力，给出实际收益。
+
+普通容器里 /proc/sys 是只读的，这时所有写操作都会失败，矿工照常启动，
+只是 /api/host-tuning 里会标明 reserved=false 和原因。
+"""
+
+
+PROC_MEMINFO = "/proc/meminfo"
+SYSFS_HUGEPAGES = "/sys/kernel/mm/hugepages"
+
+PAGE_2M = 2 * 1024 * 1024
+PAGE_1G = 1024 * 1024 * 1024
+
+# RandomX 数据集 2080 MB + cache 256 MB（XMRig 提示的 1168 个 2 MB 页就是这么来的）
+RANDOMX_DATASET_BYTES = 2080 * 1024 * 1024
+RANDOMX_CACHE_BYTES = 256 * 1024 * 1024
+
+# 预留大页后至少还给系统留这么多可用内存
+DEFAULT_MEM_MARGIN = 512 * 1024 * 1024
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_meminfo(path: str = PROC_MEMINFO) -> dict:
+    """/proc/meminfo 里和大页相关的字段（kB 字段换算成字节）。"""
+    out = {}
+    text = _read(path) or ""
+    for line in text.splitlines():
+        if ":" not in line:
+            continue
+        key, val = line.split(":", 1)
+        parts = val.split()
+        if not parts or not parts[0].isdigit():
+            continue
+        num = int(parts[0])
+        if len(parts) > 1 and parts[1] == "kB":
+            num *= 1024
+        out[key.strip()] = num
+    return {
+        "hugepages_total": out.get("HugePages_Total"),
+        "hugepages_free": out.get("HugePages_Free"),
+        "hugepage_size": out.get("Hugepagesize"),
+        "mem_available": out.get("MemAvailable"),
+    }
+
+
+def read_pools(root: str = SYSFS_HUGEPAGES) -> dict:
+    """各种页大小的大页池：{2097152: {"total", "free", "writable"}, ...}"""
+    pools = {}
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return pools
+    for name in names:
+        # hugepages-2048kB
+        if not name.startswith("hugepages-") or not name.endswith("kB"):
+            continue
+        try:
+            size = int(name[len("hugepages-"):-2]) * 1024
+        except ValueError:
+            continue
+        base = os.path.join(root, name)
+        total = _read(os.path.join(base, "nr_hugepages"))
+        free = _read(os.path.join(base, "free_hugepages"))
+        pools[size] = {
+            "total": int(total) if total and total.isdigit() else 0,
+            "free": int(free) if free and free.isdigit() else 0,
+            "writable": os.access(os.path.join(base, "nr_hugepages"), os.W_OK),
+        }
+    return pools
+
+
+def msr_state() -> dict:
+    """
+    MSR（XMRig 的 RandomX wrmsr 优化）是否可用：
+    需要 msr 内核模块 + 可写的 /dev/cpu/*/msr（一般只有 root / 特权容器）。
+    """
+    module = os.path.isdir("/sys/module/msr")
+    dev = "/dev/cpu/0/msr"
+    exists = os.path.exists(dev)
+    return {
+        "module_loaded": module,
+        "device": exists,
+        "writable": exists and os.access(dev, os.W_OK),
+    }
+
+
+def pages_needed(threads: int, algorithm: str | None = None, page_size: int = PAGE_2M) -> int:
+    """
+    数据集 + cache + 每线程 scratchpad 需要的大页数。
+    非 RandomX 系算法返回 0（不需要大页）。
+    """
+    per_thread = l3_per_thread(algorithm)
+    if not per_thread:
+        return 0
+    if page_size >= PAGE_1G:
+        # XMRig 只把数据集放在 1 GB 页上
+        return -(-RANDOMX_DATASET_BYTES // page_size)
+    dataset = -(-(RANDOMX_DATASET_BYTES + RANDOMX_CACHE_BYTES) // page_size)
+    scratch = -(-(max(1, int(threads)) * per_thread) // page_size)
+    return dataset + scratch
+
+
+def _nr_hugepages_path(root: str, page_size: int) -> str:
+    return os.path.join(root, f"hugepages-{page_size // 1024}kB", "nr_hugepages")
+
+
+def reserve_pages(count: int, page_size: int = PAGE_2M, root: str = SYSFS_HUGEPAGES,
+                  mem_margin: int = DEFAULT_MEM_MARGIN, meminfo_path: str = PROC_MEMINFO) -> dict:
+    """
+    保证至少有 count 页空闲大页（只增不减，不会动别的进程已经在用的页）。
+    要新增的页超过 MemAvailable - mem_margin 时不预留（大页从普通内存里划走，
+    划多了会把宿主机上别的进程挤进 swap / OOM）。
+    返回 {"ok", "requested", "added", "total", "free", "error"}，added 是这次新加的页数；
+    没权限 / 内存不够时 ok=False，不抛异常。
+    """
+    pools = read_pools(root)
+    pool = pools.get(page_size)
+    result = {"ok": False, "requested": count, "added": 0, "total": None, "free": None, "error": None}
+    if pool is None:
+        result["error"] = "内核不支持该大小的大页"
+        return result
+
+    result["total"], result["free"] = pool["total"], pool["free"]
+    if pool["free"] >= count:
+        result["ok"] = True
+        return result
+
+    missing = count - pool["free"]
+    available = read_meminfo(meminfo_path).get("mem_available")
+    if available is not None and missing * page_size > available - mem_margin:
+        mb = 1024 * 1024
+        result["error"] = (
+            f"可用内存不足，不预留大页：还需 {missing * page_size // mb} MB，"
+            f"MemAvailable {available // mb} MB（保留 {mem_margin // mb} MB 余量）"
+        )
+        return result
+
+    try:
+        with open(_nr_hugepages_path(root, page_size), "w", encoding="utf-8") as f:
+            f.write(str(pool["total"] + missing))
+    except OSError as e:
+        # 非特权容器：/sys 只读，这里是预期内的
+        result["error"] = f"无权限预留大页: {e.strerror or e}"
+        return result
+
+    # 内存碎片化时内核可能只分到一部分
+    before = pool["total"]
+    pool = read_pools(root).get(page_size) or pool
+    result["total"], result["free"] = pool["total"], pool["free"]
+    result["added"] = max(0, pool["total"] - before)
+    result["ok"] = pool["free"] >= count
+    if not result["ok"]:
+        result["error"] = f"只分配到 {pool['free']}/{count} 页（内存不足或碎片化）"
+    return result
+
+
+def release_pages(count: int, page_size: int = PAGE_2M, root: str = SYSFS_HUGEPAGES) -> dict:
+    """
+    把 nr_hugepages 调小 count 页（最多释放当前空闲的页，不影响正在用的）。
+    返回 {"ok", "released", "total", "free", "error"}。
+    """
+    result = {"ok": False, "released": 0, "total": None, "free": None, "error": None}
+    pool = read_pools(root).get(page_size)
+    if pool is None:
+        result["error"] = "内核不支持该大小的大页"
+        return result
+    n = min(max(0, int(count)), pool["free"])
+    if n:
+        try:
+            with open(_nr_hugepages_path(root, page_size), "w", encoding="utf-8") as f:
+                f.write(str(pool["total"] - n))
+        except OSError as e:
+            result["error"] = f"无权限释放大页: {e.strerror or e}"
+            return result
+        pool = read_pools(root).get(page_size) or pool
+    result["released"] = n
+    result["total"], result["free"] = pool["total"], pool["free"]
+    result["ok"] = True
+    return result
+
+
+def miner_flags(impl: str, use_hugepages: bool, use_1gb: bool = False) -> list[str]:
+    """
+    各矿工实现的大页参数：
+    - XMRig 默认就会尝试大页；没有大页时显式关掉，省得每个线程都报一遍失败；
+      有 1 GB 页时额外打开 --randomx-1gb-pages；
+    - SRBMiner 用 --enable-large-pages（和原来 extra_args 里的一致）；
+    - cpuminer 没有对应参数，能分到大页时自己会用。
+    """
+    if impl == "xmrig":
+        if not use_hugepages:
+            return ["--no-huge-pages"]
+        return ["--randomx-1gb-pages"] if use_1gb else []
+    if impl == "srbminer":
+        return ["--enable-large-pages"] if use_hugepages else []
+    return []
+
+
+def mem_margin(tcfg: dict | None) -> int:
+    """host_tuning.mem_margin_mb 换算成字节。"""
+    mb = (tcfg or {}).get("mem_margin_mb")
+    return DEFAULT_MEM_MARGIN if mb is None else max(0, int(mb)) * 1024 * 1024
+
+
+def hugepage_aware(impl: str) -> bool:
+    """矿工实现有没有大页相关参数；没有的（cpuminer）不值得为它预留。"""
+    return miner_flags(impl, True) != miner_flags(impl, False)
+
+
+def prepare(mcfg: dict, threads: int, tcfg: dict | None = None,
+            previous: dict | None = None) -> dict:
+    """
+    启动矿工前调用：算需要的页数 → 尽量预留 → 给出参数。
+    返回的 plan 会挂在 Miner.tuning 上，供 /api/host-tuning 展示。
+    previous 是上一次启动的 plan：崩溃重启时上次加的页还在，这次 added=0，
+    所以 plan["added"] 把还没释放的页数累加下来，手动停止时一起还。
+    """
+    tcfg = tcfg or {}
+    impl = mcfg.get("impl", "cpuminer")
+    algo = mcfg.get("algorithm")
+    need = pages_needed(threads, algo)
+
+    plan = {
+        "enabled": bool(tcfg.get("hugepages", True)),
+        "pages_needed": need,
+        "page_size": PAGE_2M,
+        "reserve": None,
+        "reserve_1gb": None,
+        "use_hugepages": False,
+        "use_1gb_pages": False,
+        "flags": [],
+        # 这个 Miner 累计新加、还没释放的页数：{page_size: 页数}
+        "added": dict((previous or {}).get("added") or {}),
+    }
+    if not plan["enabled"] or need == 0:
+        plan["flags"] = miner_flags(impl, False) if plan["enabled"] else []
+        return plan
+
+    margin = mem_margin(tcfg)
+    if tcfg.get("reserve", False) and hugepage_aware(impl):
+        plan["reserve"] = reserve_pages(need, PAGE_2M, mem_margin=margin)
+        plan["use_hugepages"] = plan["reserve"]["ok"]
+        if plan["reserve"]["error"]:
+            logging.info("[HostTuning] %s", plan["reserve"]["error"])
+    else:
+        pool = read_pools().get(PAGE_2M) or {}
+        plan["use_hugepages"] = pool.get("free", 0) >= need
+
+    if tcfg.get("gb_pages") and impl == "xmrig":
+        gb = plan["reserve_1gb"] = reserve_pages(
+            pages_needed(threads, algo, PAGE_1G), PAGE_1G, mem_margin=margin
+        )
+        plan["use_1gb_pages"] = gb["ok"]
+
+    for key, page_size in (("reserve", PAGE_2M), ("reserve_1gb", PAGE_1G)):
+        if plan[key] and plan[key]["added"]:
+            plan["added"][page_size] = plan["added"].get(page_size, 0) + plan[key]["added"]
+
+    plan["flags"] = miner_flags(impl, plan["use_hugepages"], plan["use_1gb_pages"])
+    return plan
+
+
+def release(plan: dict | None, tcfg: dict | None = None):
+    """矿工手动停止后调用：release_on_stop 时把 prepare() 累计新加的大页还给系统。"""
+    tcfg = tcfg or {}
+    if not plan or not tcfg.get("release_on_stop", True):
+        return
+    added = plan.get("added") or {}
+    for page_size, count in list(added.items()):
+        if not count:
+            continue
+        result = release_pages(count, page_size)
+        if result["error"]:
+            logging.info("[HostTuning] %s", result["error"])
+            continue
+        logging.info("[HostTuning] 已释放 %d 个 %d kB 大页", result["released"], page_size // 1024)
+        # 还在被占用、这次没放掉的留到下次
+        added[page_size] = count - result["released"]
+
+
+def host_state() -> dict:
+    """宿主机当前的大页 / MSR 状态（给 /api/host-tuning 用）。"""
+    pools = read_pools()
+    return {
+        "meminfo": read_meminfo(),
+        "pools": [
+            {"page_size": size, **info} for size, info in sorted(pools.items())
+        ],
+        "msr": msr_state(),
+        "privileged": any(p["writable"] for p in pools.values()),
+    }
+
+
+class HugePagesImpact:
+    """
+    按「矿工是否真的用上了大页」分组累计平均算力，算出大页带来的收益：
+    impact_pct = (avg_on / avg_off - 1) * 100，两组都有数据时才给出。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acc = {True: [0.0, 0], False: [0.0, 0]}
+
+    def observe(self, hs: float | None, active: bool | None):
+        if hs is None or active is None or hs <= 0:
+            return
+        with self._lock:
+            acc = self._acc[bool(active)]
+            acc[0] += hs
+            acc[1] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            on = self._acc[True][0] / self._acc[True][1] if self._acc[True][1] else None
+            off = self._acc[False][0] / self._acc[False][1] if self._acc[False][1] else None
+            samples = {"on": self._acc[True][1], "off": self._acc[False][1]}
+        return {
+            "avg_hs_hugepages": on,
+            "avg_hs_no_hugepages": off,
+            "impact_pct": (on / off - 1) * 100 if on and off else None,
+            "samples": samples,
+        }
@@ -0,0 +1,155 @@
+# scash_manager/jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+"""
+jobs.py
+
+后台任务（启动 / 停止 / 重新配置 Miner 这类可能要等好几秒的操作）：
+
+- HTTP 接口只负责提交任务，立刻返回任务 ID，前端轮询 /api/jobs/<id> 看进度；
+- 同一个 key（例如同一个实例）的任务进同一个 FIFO 队列，由该 key 唯一的
+  工作线程按提交顺序逐个执行，避免「停止还没做完又来了启动」这种交错；
+  队列空了工作线程就退出，不会为排队的任务各开一个阻塞线程；
+- 只保留最近 max_jobs 个任务的记录。
+"""
+
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+
+class Job:
+    """单个后台任务；fn(job) 的返回值作为 result，抛异常则任务失败。"""
+
+    def __init__(self, kind: str, fn, key: str | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.fn = fn
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.progress: list[dict] = []
+        self.result = None
+        self.error: str | None = None
+        self._manager = None
+        self._finished = threading.Event()
+
+    def step(self, message: str):
+        """记录一条进度，同时通知订阅者。"""
+        self.progress.append({"ts": time.time(), "message": message})
+        if self._manager is not None:
+            self._manager._notify(self)
+
+    def done(self) -> bool:
+        return self.state in ("succeeded", "failed")
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """等任务结束（成功或失败）；超时返回 False。"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": list(self.progress),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    提交 / 查询后台任务。
+
+    on_update(job_dict)：任务状态或进度变化时调用（webapp 转成 SSE 的 job 事件）。
+    """
+
+    def __init__(self, max_jobs: int = 100, on_update=None):
+        self.max_jobs = max_jobs
+        self.on_update = on_update
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> 待执行任务；key 在字典里 == 该 key 有工作线程在跑
+        self._queues: dict[str, deque[Job]] = {}
+
+    def submit(self, kind: str, fn, key: str | None = None) -> Job:
+        job = Job(kind, fn, key)
+        job._manager = self
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                # 优先丢掉最旧的已完成任务
+                old = next((j for j in self._jobs.values() if j.done()), None)
+                if old is None:
+                    break
+                del self._jobs[old.id]
+            start_worker = True
+            if key:
+                pending = self._queues.get(key)
+                if pending is None:
+                    self._queues[key] = deque([job])
+                else:
+                    pending.append(job)
+                    start_worker = False
+
+        self._notify(job)
+        if start_worker:
+            target = self._drain if key else self._run
+            threading.Thread(target=target, args=(key if key else job,), daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.to_dict() for j in reversed(jobs)]
+
+    def _drain(self, key: str):
+        """某个 key 的工作线程：按 FIFO 逐个执行，队列空了就退出。"""
+        while True:
+            with self._lock:
+                pending = self._queues[key]
+                job = pending[0]
+            self._run(job)
+            with self._lock:
+                pending.popleft()
+                if not pending:
+                    del self._queues[key]
+                    return
+
+    def _run(self, job: Job):
+        job.state = "running"
+        job.started_at = time.time()
+        self._notify(job)
+        try:
+            job.result = job.fn(job)
+            job.state = "succeeded"
+        except Exception as e:
+            logging.error("[Jobs] 任务 %s (%s) 失败: %s", job.id, job.kind, e)
+            job.error = str(e)
+            job.state = "failed"
+        job.finished_at = time.time()
+        job._finished.set()
+        self._notify(job)
+
+    def _notify(self, job: Job):
+        if self.on_update is None:
+            return
+        try:
+            self.on_update(job.to_dict())
+        except Exception as e:
+            logging.error("[Jobs] 推送任务状态失败: %s", e)
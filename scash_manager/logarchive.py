@@ -0,0 +1,411 @@
+# scash_manager/logarchive.py
+import bisect
+import logging
+import mmap
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+from .history_store import parse_range
+from .logring import TS_PREFIX_RE
+
+
+"""
+logarchive.py
+
+矿工日志的持久化归档（每个实例一个目录），可以按时间范围 / 关键字查询：
+
+- 分段文件 <dir>/<实例名>/<首行毫秒时间戳>.log，每行 "<unix 时间>\\t<日志行>"；
+  写满 segment_bytes 换新段，总大小超过 max_bytes 删最旧的段；
+- 稀疏时间索引 <同名>.idx：每写 index_every 字节记一条 "时间 偏移"，
+  查询时二分找到起点直接 seek（mmap），不用从头扫整个文件；
+- 写入时折叠连续重复的行（只比较去掉时间戳后的内容），
+  重复结束时补一行 "(上一行重复 N 次)"；
+- 写盘在后台线程里做，LogRing 只是把新行放进有界队列（满了丢弃并计数）。
+"""
+
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "dir": "/data/logs",
+    "segment_bytes": 8 * 1024 * 1024,
+    "max_bytes": 256 * 1024 * 1024,
+    "index_every": 64 * 1024,
+    "queue_size": 1000,
+}
+
+# 没有指定 limit 时最多返回多少行
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 20000
+
+
+def parse_time(value: str, now: float | None = None) -> float:
+    """
+    查询参数里的时间：unix 秒数、本地时间 "YYYY-MM-DD HH:MM[:SS]" / ISO 格式，
+    或相对时间 "90m" / "6h" / "2d"（表示多久以前）。格式不对抛 ValueError。
+    """
+    value = (value or "").strip()
+    if not value:
+        raise ValueError("时间不能为空")
+    try:
+        ts = float(value)
+        # 纯数字：像 unix 时间的直接用，较小的数按「多少秒以前」处理（见下面的 parse_range）
+        if ts > 1e9:
+            return ts
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        pass
+    return (now if now is not None else time.time()) - parse_range(value)
+
+
+class _Segment:
+    """一个分段文件及其内存中的稀疏索引 [(ts, offset)]。"""
+
+    def __init__(self, path: str, start: float):
+        self.path = path
+        self.idx_path = path[:-4] + ".idx"
+        self.start = start
+        self.index: list[tuple[float, int]] = []
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def load_index(self):
+        try:
+            with open(self.idx_path, "r", encoding="ascii") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        self.index.append((float(parts[0]), int(parts[1])))
+        except (OSError, ValueError):
+            self.index = []
+
+    def offset_for(self, ts: float) -> int:
+        """索引里最后一个时间 <= ts 的偏移（从这里往后扫一定不会漏行）。"""
+        i = bisect.bisect_right(self.index, (ts, float("inf"))) - 1
+        return self.index[i][1] if i >= 0 else 0
+
+
+class LogArchive:
+    """
+    单个实例的日志归档：submit() 由 LogRing 调用（非阻塞），query() 给 /api/logs 用。
+    start() / stop() 管理后台写入线程。
+    """
+
+    def __init__(self, root: str, segment_bytes: int, max_bytes: int, index_every: int,
+                 queue_size: int = 1000, name: str = ""):
+        self.root = root
+        self.name = name
+        self.segment_bytes = max(64 * 1024, int(segment_bytes))
+        self.max_bytes = max(self.segment_bytes, int(max_bytes))
+        self.index_every = max(4096, int(index_every))
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.dropped = 0
+        self._lock = threading.Lock()            # 保护 _segments / 当前段的索引
+        self._segments: list[_Segment] = []
+        self._file = None
+        self._idx_file = None
+        self._last_indexed = -1
+
+        # 重复行折叠
+        self._last_key: str | None = None
+        self._repeat = 0
+        self._repeat_ts = 0.0
+
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        os.makedirs(root, exist_ok=True)
+        self._load_segments()
+
+    @classmethod
+    def from_config(cls, acfg: dict | None, name: str) -> "LogArchive | None":
+        """按 log_archive 配置块创建（未启用或目录不可写返回 None）。"""
+        opts = {**DEFAULT_OPTIONS, **(acfg or {})}
+        if not opts.get("enabled"):
+            return None
+        try:
+            return cls(
+                os.path.join(opts["dir"], name),
+                opts["segment_bytes"],
+                opts["max_bytes"],
+                opts["index_every"],
+                opts["queue_size"],
+                name=name,
+            )
+        except OSError as e:
+            logging.error("[LogArchive] %s: 无法创建归档目录 %s: %s", name, opts["dir"], e)
+            return None
+
+    def _load_segments(self):
+        for fn in sorted(os.listdir(self.root)):
+            if not fn.endswith(".log"):
+                continue
+            try:
+                start = int(fn[:-4]) / 1000.0
+            except ValueError:
+                continue
+            seg = _Segment(os.path.join(self.root, fn), start)
+            seg.load_index()
+            self._segments.append(seg)
+
+    # =========================================================
+    # 写入
+    # =========================================================
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, ts: float, entries: list):
+        """
+        LogRing 写入后调用：放进队列就返回，队列满了丢弃并计数。
+        entries 为 LogRecord（在写入线程里才格式化）或现成的字符串。
+        """
+        try:
+            self._queue.put_nowait((ts, entries))
+        except queue.Full:
+            self.dropped += len(entries)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                # 空闲时把正在折叠的重复行计数写出去
+                self._safe_write([])
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._safe_write(batch)
+
+        # 退出前把队列里剩下的写完
+        rest = []
+        while True:
+            try:
+                rest.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._safe_write(rest, final=True)
+        self._close_files()
+
+    def _safe_write(self, batch: list, final: bool = False):
+        try:
+            self._write_batch(batch, final)
+        except Exception as e:
+            logging.error("[LogArchive] %s 写入失败: %s", self.name, e)
+
+    def _write_batch(self, batch: list, final: bool = False):
+        out = []
+        for ts, entries in batch:
+            for rec in entries:
+                entry = rec if isinstance(rec, str) else rec.format()
+                m = TS_PREFIX_RE.match(entry)
+                key = entry[m.end():].strip() if m else entry
+                if key == self._last_key:
+                    self._repeat += 1
+                    self._repeat_ts = ts
+                    continue
+                self._flush_repeat(out)
+                self._last_key = key
+                out.append((ts, entry))
+        if not batch or final:
+            self._flush_repeat(out)
+        for ts, entry in out:
+            self._append(ts, entry)
+        if out and self._file is not None:
+            self._file.flush()
+            self._idx_file.flush()
+
+    def _flush_repeat(self, out: list):
+        if self._repeat:
+            ts_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._repeat_ts))
+            out.append((self._repeat_ts, f"[{ts_str}] (上一行重复 {self._repeat} 次)"))
+            self._repeat = 0
+
+    def _append(self, ts: float, entry: str):
+        data = f"{ts:.3f}\t{entry}\n".encode("utf-8", errors="replace")
+        with self._lock:
+            seg = self._segments[-1] if self._segments else None
+            if self._file is None or seg is None or seg.size >= self.segment_bytes:
+                seg = self._open_segment(ts)
+            offset = seg.size
+            if self._last_indexed < 0 or offset - self._last_indexed >= self.index_every:
+                seg.index.append((ts, offset))
+                self._idx_file.write(f"{ts:.3f} {offset}\n")
+                self._last_indexed = offset
+            self._file.write(data)
+            seg.size += len(data)
+
+    def _open_segment(self, ts: float) -> _Segment:
+        """换一个新段（调用方持有 _lock），顺便删掉超出 max_bytes 的旧段。"""
+        self._close_files()
+        path = os.path.join(self.root, f"{int(ts * 1000):015d}.log")
+        seg = _Segment(path, ts)
+        if self._segments and self._segments[-1].path == path:
+            self._segments[-1] = seg
+        else:
+            self._segments.append(seg)
+        self._file = open(path, "ab")
+        self._idx_file = open(seg.idx_path, "a", encoding="ascii")
+        seg.size = self._file.tell()
+        self._last_indexed = -1
+
+        total = sum(s.size for s in self._segments)
+        while total > self.max_bytes and len(self._segments) > 1:
+            old = self._segments.pop(0)
+            total -= old.size
+            for p in (old.path, old.idx_path):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+        return seg
+
+    def _close_files(self):
+        for f in (self._file, self._idx_file):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._file = None
+        self._idx_file = None
+
+    # =========================================================
+    # 查询
+    # =========================================================
+
+    def query(self, start: float | None = None, end: float | None = None,
+              grep: str | None = None, limit: int = DEFAULT_LIMIT) -> dict:
+        """
+        查询归档：
+        - 给了 start：从 start 往后取前 limit 条；
+        - 没给 start：取 end（默认现在）之前最近的 limit 条；
+        - grep 为正则（不区分大小写），直接在原始字节上匹配，只解码命中的行。
+        返回 {"lines": [...], "limit_reached": bool}，按时间先后排列。
+        grep 不是合法正则时抛 ValueError。
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        try:
+            pattern = re.compile(grep.encode("utf-8"), re.IGNORECASE) if grep else None
+        except re.error as e:
+            raise ValueError(f"grep 不是合法的正则: {e}")
+        lo = start if start is not None else float("-inf")
+        hi = end if end is not None else float("inf")
+
+        with self._lock:
+            segs = [(s.path, s.start, list(s.index), s.size) for s in self._segments]
+        # 每段的时间范围：[自己的起点, 下一段的起点]
+        spans = []
+        for i, (path, seg_start, index, size) in enumerate(segs):
+            seg_end = segs[i + 1][1] if i + 1 < len(segs) else float("inf")
+            if seg_start <= hi and seg_end >= lo and size > 0:
+                spans.append((path, index, size))
+
+        if start is not None:
+            lines = []
+            for path, index, size in spans:
+                need = limit + 1 - len(lines)
+                lines += self._scan(path, index, size, lo, hi, pattern, need)
+                if len(lines) > limit:
+                    return {"lines": lines[:limit], "limit_reached": True}
+            return {"lines": lines, "limit_reached": False}
+
+        # 从最新的段往前找（段内按索引从后往前），凑够 limit 条就停
+        lines = []
+        for path, index, size in reversed(spans):
+            lines = self._scan_tail(path, index, size, lo, hi, pattern, limit + 1 - len(lines)) + lines
+            if len(lines) > limit:
+                return {"lines": lines[-limit:], "limit_reached": True}
+        return {"lines": lines, "limit_reached": False}
+
+    @staticmethod
+    def _scan(path, index, size, lo, hi, pattern, max_lines) -> list[str]:
+        """mmap 一个段，从索引给出的偏移开始往后扫描 [lo, hi] 内的行。"""
+        i = bisect.bisect_right(index, (lo, float("inf"))) - 1
+        pos = index[i][1] if i >= 0 else 0
+        out = []
+        try:
+            with open(path, "rb") as f:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                    _scan_window(mm, pos, size, lo, hi, pattern, max_lines, out)
+        except (OSError, ValueError) as e:
+            logging.warning("[LogArchive] 读取 %s 失败: %s", path, e)
+        return out
+
+    @staticmethod
+    def _scan_tail(path, index, size, lo, hi, pattern, need) -> list[str]:
+        """
+        取一个段里 [lo, hi] 内最后 need 条：按稀疏索引把段切成窗口，从最后一个窗口
+        往前逐个扫，凑够 need 条（或窗口起点已经早于 lo）就停，不用从段头扫起。
+        """
+        # 窗口起点：(偏移, 该处第一行的时间)；段头没有索引点时时间未知
+        starts = [(off, ts) for ts, off in index if 0 <= off < size]
+        if not starts or starts[0][0] > 0:
+            starts.insert(0, (0, float("-inf")))
+        out: list[str] = []
+        try:
+            with open(path, "rb") as f:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                    stop = size
+                    for pos, first_ts in reversed(starts):
+                        if first_ts <= hi:
+                            window: list[str] = []
+                            _scan_window(mm, pos, stop, lo, hi, pattern, None, window)
+                            out = window + out
+                            if len(out) >= need or first_ts < lo:
+                                break
+                        stop = pos
+        except (OSError, ValueError) as e:
+            logging.warning("[LogArchive] 读取 %s 失败: %s", path, e)
+        return out[-need:] if need > 0 else []
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "bytes": sum(s.size for s in self._segments),
+                "dropped": self.dropped,
+            }
+
+
+def _scan_window(mm, pos: int, stop: int, lo: float, hi: float, pattern, max_lines, out: list):
+    """顺序扫描 mm[pos:stop] 里的完整行，[lo, hi] 内且匹配 pattern 的追加到 out。"""
+    while pos < stop:
+        nl = mm.find(b"\n", pos, stop)
+        if nl < 0:
+            break          # 还没写完的半行
+        tab = mm.find(b"\t", pos, nl)
+        line_start, pos = pos, nl + 1
+        if tab < 0:
+            continue
+        try:
+            ts = float(mm[line_start:tab])
+        except ValueError:
+            continue
+        if ts < lo:
+            continue
+        if ts > hi:
+            break
+        if pattern is not None and not pattern.search(mm, tab + 1, nl):
+            continue
+        out.append(mm[tab + 1:nl].decode("utf-8", errors="replace"))
+        if max_lines is not None and len(out) >= max_lines:
+            break
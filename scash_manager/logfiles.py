@@ -0,0 +1,188 @@
+# scash_manager/logfiles.py
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+
+"""
+logfiles.py
+
+异步日志文件：
+
+- 调用 logging.info 的线程（包括 Miner stdout 读线程）只把记录放进有界队列，
+  真正的磁盘写入在 QueueListener 的后台线程里做；SD 卡 / 网络卷写得慢时
+  也不会卡住读线程、进而塞满 Miner 的 stdout 管道；
+- 队列满了直接丢弃并计数（dropped()，/metrics 里的 scash_manager_log_dropped_total）；
+- 日志文件按大小（max_bytes）和时间（rotate_interval 秒）轮转，
+  旧文件可选 gzip 压缩（压缩也在后台线程里做）；
+- 矿工输出单独一路（MINER_LOGGER，不经过 root logger）：
+  有自己的文件、级别、队列，矿工刷屏不会挤掉管理器自己的日志。
+"""
+
+
+MINER_LOGGER = "scash_manager.miner_output"
+FORMAT = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
+# 矿工输出行本身已经带时间戳
+MINER_FORMAT = "%(message)s"
+
+_listeners: list[logging.handlers.QueueListener] = []
+_queue_handlers: dict[str, "DroppingQueueHandler"] = {}
+_atexit_registered = False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """放进有界队列，满了不等待，直接丢弃并计数。"""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+
+class RotatingHandler(logging.handlers.RotatingFileHandler):
+    """
+    按大小或时间轮转（哪个先到就轮转）：
+    - max_bytes <= 0 不按大小轮转，interval <= 0 不按时间轮转；
+    - compress=True 时旧文件压缩成 <file>.N.gz。
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 5,
+                 interval: float = 0, compress: bool = False):
+        super().__init__(filename, maxBytes=max(0, int(max_bytes)),
+                         backupCount=max(1, int(backup_count)), encoding="utf-8")
+        self.interval = float(interval or 0)
+        self.rollover_at = self._next_rollover(self._file_mtime())
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = _gzip_rotator
+
+    def _file_mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.baseFilename)
+        except OSError:
+            return time.time()
+
+    def _next_rollover(self, since: float) -> float | None:
+        return since + self.interval if self.interval > 0 else None
+
+    def shouldRollover(self, record) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(opts: dict, fmt: str) -> logging.Handler | None:
+    path = opts.get("file")
+    if not path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = RotatingHandler(
+            path,
+            max_bytes=opts.get("max_bytes", 0),
+            backup_count=opts.get("backup_count", 5),
+            interval=opts.get("rotate_interval", 0),
+            compress=bool(opts.get("compress", False)),
+        )
+    except Exception as e:
+        logging.getLogger(__name__).error("创建日志文件失败 %s: %s", path, e)
+        return None
+    handler.setFormatter(logging.Formatter(fmt))
+    return handler
+
+
+def _start_stream(name: str, logger: logging.Logger, handlers: list, queue_size: int):
+    """logger → 有界队列 → 后台线程写 handlers。"""
+    qh = DroppingQueueHandler(queue.Queue(maxsize=max(1, int(queue_size))))
+    listener = logging.handlers.QueueListener(qh.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(qh)
+    _listeners.append(listener)
+    _queue_handlers[name] = qh
+
+
+def setup(log_cfg: dict):
+    """按 logging 配置块初始化两路日志（见 DEFAULT_CONFIG["logging"]）。只在启动时调用一次。"""
+    global _atexit_registered
+    root = logging.getLogger()
+    # 避免重复添加 Handler
+    if root.handlers:
+        return
+
+    level_str = (log_cfg.get("level") or "INFO").upper()
+    root.setLevel(getattr(logging, level_str, logging.INFO))
+    queue_size = log_cfg.get("queue_size", 10000)
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(FORMAT))
+    handlers = [console]
+    app_file = _file_handler(log_cfg, FORMAT)
+    if app_file is not None:
+        handlers.append(app_file)
+    _start_stream("app", root, handlers, queue_size)
+
+    mo_cfg = log_cfg.get("miner_output") or {}
+    miner_logger = logging.getLogger(MINER_LOGGER)
+    miner_logger.propagate = False
+    mo_level = (mo_cfg.get("level") or "INFO").upper()
+    miner_logger.setLevel(getattr(logging, mo_level, logging.INFO))
+    mo_handlers = []
+    mo_file = _file_handler(mo_cfg, MINER_FORMAT)
+    if mo_file is not None:
+        mo_handlers.append(mo_file)
+    if mo_cfg.get("console", False):
+        mo_console = logging.StreamHandler()
+        mo_console.setFormatter(logging.Formatter(MINER_FORMAT))
+        mo_handlers.append(mo_console)
+    if mo_handlers:
+        _start_stream("miner_output", miner_logger, mo_handlers,
+                      mo_cfg.get("queue_size", queue_size))
+    else:
+        miner_logger.addHandler(logging.NullHandler())
+
+    if not _atexit_registered:
+        atexit.register(shutdown)
+        _atexit_registered = True
+
+    logging.info(
+        "Logging 已初始化，level=%s, file=%s, miner_output=%s（level=%s）",
+        level_str, log_cfg.get("file"), mo_cfg.get("file") or "-", mo_level,
+    )
+
+
+def shutdown():
+    """把队列里剩下的记录写完（进程退出时调用）。"""
+    while _listeners:
+        listener = _listeners.pop()
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+
+def dropped() -> dict:
+    """每一路因为队列满被丢弃的记录数：{"app": n, "miner_output": n}。"""
+    return {name: qh.dropped for name, qh in _queue_handlers.items()}
@@ -0,0 +1,379 @@
+# scash_manager/logring.py
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+
+from .logfiles import MINER_LOGGER
+from .parsers import get_parser
+from .stats import humanize_hs
+
+
+"""
+logring.py
+
+矿工日志的内存环形缓冲 + 入库时的增量解析：
+
+- 每行日志带单调递增的 seq，/api/logs?since= 用它做增量游标；
+- 缓冲里存的是 LogRecord（写入时间 + 原始内容），按占用的字节数而不是行数限制大小，
+  时间戳前缀只在输出时才格式化；
+- 每行只在写入时解析一次（按 miner.impl 选的解析器，见 parsers.py），
+  状态接口读取是 O(1)；
+- 每个 Miner 实例各有一个 LogRing（见 supervisor.py）。
+"""
+
+
+# 检测「已经带时间戳」的行，例如：[2025-12-01 11:36:55] ...（XMRig 带毫秒）
+TS_PREFIX_RE = re.compile(r"^\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?\]")
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+# 解析份额行中的时间戳
+TIME_RE = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)?\]")
+
+# 矿工输出写自己的 logger（单独的文件 / 级别，不经过 root logger，见 logfiles.py）
+_miner_log = logging.getLogger(MINER_LOGGER)
+
+# 每线程算力超过这个时间没更新就不再计入总和（线程数改小之后的残留）
+THREAD_STALE = 300
+
+# 每个实例内存日志缓冲的默认大小（字节，按 LogRecord 实际占用估算）
+DEFAULT_MAX_BYTES = 512 * 1024
+
+
+@lru_cache(maxsize=4096)
+def format_ts(sec: int) -> str:
+    """unix 秒 → "YYYY-MM-DD HH:MM:SS"（本地时间），同一秒的行共用结果。"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+
+
+class LogRecord:
+    """
+    缓冲里的一行日志：
+    - ts：写入时的 time.time()；source："miner"（矿工输出）/ "manager"（管理器自己的提示）；
+    - level："info" / "warning"（连接错误、被拒份额）；
+    - message：原始内容（不带我们加的时间戳）；stamped=True 表示 message 自己带时间戳。
+    format() 才拼出 "[时间] 内容"。
+    """
+
+    __slots__ = ("ts", "source", "level", "message", "stamped")
+
+    def __init__(self, ts: float, source: str, level: str, message: str, stamped: bool):
+        self.ts = ts
+        self.source = source
+        self.level = level
+        self.message = message
+        self.stamped = stamped
+
+    def format(self) -> str:
+        if self.stamped:
+            return self.message
+        return f"[{format_ts(int(self.ts))}] {self.message}"
+
+    __str__ = format
+
+    def size(self) -> int:
+        """这条记录大致占用的内存（记录对象 + float + 字符串）。"""
+        return _RECORD_OVERHEAD + sys.getsizeof(self.message)
+
+
+_RECORD_OVERHEAD = sys.getsizeof(LogRecord(0.0, "", "", "", False)) + sys.getsizeof(0.0)
+
+
+class LogRing:
+    """
+    带序号的日志环形缓冲。
+
+    - buffer 里每个元素是 LogRecord，seq 连续，最旧一条的 seq = self.seq - len(buffer) + 1；
+    - 总占用超过 max_bytes（或行数超过 maxlen，None = 不限）时从最旧的开始丢；
+    - stats 是写入时增量解析出的统计（受 lock 保护）；
+    - prefix 非空时写 Python 日志会带上 [prefix]，方便区分多个实例。
+    """
+
+    def __init__(self, maxlen: int | None = None, prefix: str = "", lock_observer=None,
+                 lines_observer=None, impl: str | None = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.buffer: deque[LogRecord] = deque()
+        self.lock = threading.Lock()
+        self.seq = 0  # 最近一条日志的序号
+        self.maxlen = maxlen
+        self.max_bytes = max_bytes
+        self.bytes = 0  # buffer 当前估算占用
+        self.prefix = prefix
+        # lock_observer(seconds)：每次写入持锁时长（给 /metrics 用）
+        self.lock_observer = lock_observer
+        # lines_observer(n)：每次写入的行数（给 /metrics 用）
+        self.lines_observer = lines_observer
+        # conn_error_observer()：每解析到一行矿池连接错误调用一次（Watchdog 用）
+        self.conn_error_observer = None
+        # archive：LogArchive，新行写进持久化归档（见 logarchive.py）
+        self.archive = None
+        self.impl = impl
+        self.parser = get_parser(impl)
+        self.stats = {
+            "hashrate": None,       # {"raw": "0.11 khash/s", "hs": 110.0}
+            "last_submit": None,    # {"line": ..., "time_str": ...}
+            "accepted": 0,          # 矿工自己统计的累计 accepted
+            "rejected": 0,          # total - accepted
+            "huge_pages": {},       # {"dataset"|"threads": {"percent", "allocated", "total"}}
+            "conn_errors": 0,       # 累计矿池连接错误行数（Watchdog 用来判断是否切换矿池）
+            "hashrate_at": None,    # 最近一次解析到算力的 time.time()（卡死检测用）
+            "accepted_at": None,    # 最近一次新 accepted 份额的 time.time()
+            "stale": 0,             # 过期份额（SRBMiner / XMRig 会单独报）
+            "share_latency_ms": None,   # 最近一次份额的提交延迟
+            "hashrate_windows": {}, # 矿工自己报的多窗口算力 {"10s": hs, "60s": hs, ...}
+            "threads": {},          # 每线程算力 {线程号: (hs, time.time())}
+            "total_at": None,       # 最近一次矿工自己报整机算力的 time.time()
+            "last_job": None,       # {"pool", "diff", "height", "ts"}
+        }
+
+    # =========================================================
+    # 写入
+    # =========================================================
+
+    def set_parser(self, impl: str | None):
+        """切换解析器（实例的 miner.impl 变了之后调用）。"""
+        with self.lock:
+            if impl == self.impl:
+                return
+            self.impl = impl
+            self.parser = get_parser(impl)
+            self.stats["threads"] = {}
+            self.stats["total_at"] = None
+            self.stats["hashrate_windows"] = {}
+
+    def _ingest_line(self, rec: LogRecord):
+        """
+        解析单行日志，把解析器给出的事件并进 stats。调用方需持有 lock。
+        同一行有多个窗口的算力时（XMRig 的 10s/60s/15m），当前算力取第一个（最短窗口）。
+        连接错误 / 被拒份额的行把 rec.level 记为 warning。
+        """
+        events = self.parser.parse(rec.message)
+        if not events:
+            return
+        stats = self.stats
+        now = time.time()
+        total_seen = False
+        for ev in events:
+            kind = ev["type"]
+            if kind == "hashrate":
+                stats["hashrate_at"] = now
+                if ev["scope"] == "thread":
+                    threads = stats["threads"]
+                    threads[ev["thread"]] = (ev["hs"], now)
+                    # 矿工最近报过整机算力时以它为准，否则用各线程之和
+                    if stats["total_at"] is None or now - stats["total_at"] >= THREAD_STALE:
+                        hs = sum(v for v, at in threads.values() if now - at < THREAD_STALE)
+                        stats["hashrate"] = {"raw": humanize_hs(hs), "hs": hs}
+                    continue
+                if ev["window"]:
+                    stats["hashrate_windows"] = {**stats["hashrate_windows"], ev["window"]: ev["hs"]}
+                if not total_seen:
+                    total_seen = True
+                    stats["hashrate"] = {"raw": ev["raw"], "hs": ev["hs"]}
+                    stats["total_at"] = now
+
+            elif kind == "share":
+                entry = rec.format()
+                times = TIME_RE.findall(entry)
+                stats["last_submit"] = {"line": entry, "time_str": times[-1] if times else None}
+                if not ev["accepted"]:
+                    rec.level = "warning"
+                prev = stats["accepted"]
+                if ev["accepted_total"] is not None:
+                    # 矿工报了累计值就直接用（变小是矿工重启后重新计数）
+                    stats["accepted"] = ev["accepted_total"]
+                    stats["rejected"] = ev["rejected_total"] or 0
+                elif ev["accepted"]:
+                    stats["accepted"] += 1
+                else:
+                    stats["rejected"] += 1
+                if ev["accepted"] and stats["accepted"] != prev:
+                    stats["accepted_at"] = now
+                if ev["stale"]:
+                    stats["stale"] += 1
+                if ev["latency_ms"] is not None:
+                    stats["share_latency_ms"] = ev["latency_ms"]
+
+            elif kind == "job":
+                stats["last_job"] = {
+                    "pool": ev["pool"], "diff": ev["diff"], "height": ev["height"], "ts": now,
+                }
+
+            elif kind == "conn_lost":
+                stats["conn_errors"] += 1
+                rec.level = "warning"
+
+            elif kind == "huge_pages":
+                stats["huge_pages"] = {
+                    **stats["huge_pages"],
+                    ev["kind"]: {
+                        "percent": ev["percent"],
+                        "allocated": ev["allocated"],
+                        "total": ev["total"],
+                    },
+                }
+
+    def push(self, raw_msg, source: str = "manager") -> tuple[list[LogRecord], int]:
+        """
+        写入内存缓冲（raw_msg 可以是一整批多行输出，见 Miner._reader）：
+        - 支持 msg 里自带的 \\n / \\r\\n；
+        - 每一行记下写入时间，输出时才拼成 [YYYY-MM-DD HH:MM:SS] 前缀；
+        - 如果 Miner 输出本身已经是 [YYYY-MM-DD HH:MM:SS] 前缀，就不再重复加第二个时间戳。
+        - 同时去掉 ANSI 颜色控制码（整批一次替换），避免影响正则匹配算力 / accepted。
+        - 顺便增量更新算力 / accepted 统计（见 _ingest_line）。
+        一批只加一次锁；矿工输出日志（MINER_LOGGER）在锁外写。
+        返回 (新写入的 LogRecord, 最新 seq)，需要文本时调用 record.format()。
+        """
+        if raw_msg is None:
+            return [], self.seq
+
+        msg = str(raw_msg)
+        if "\r" in msg:
+            msg = msg.replace("\r\n", "\n").replace("\r", "\n")
+        if "\\n" in msg:
+            msg = msg.replace("\\n", "\n")
+        if "\x1b" in msg:
+            msg = ANSI_RE.sub("", msg)
+        lines = [line.strip() for line in msg.split("\n")]
+
+        new_records = []
+        now = time.time()
+        with self.lock:
+            conn_errors_before = self.stats["conn_errors"]
+            t_acquired = time.perf_counter()
+            buffer = self.buffer
+            added = 0
+            for line in lines:
+                if not line:
+                    continue
+                stamped = line[0] == "[" and TS_PREFIX_RE.match(line) is not None
+                rec = LogRecord(now, source, "info", line, stamped)
+                self._ingest_line(rec)
+                buffer.append(rec)
+                added += rec.size()
+                new_records.append(rec)
+            self.seq += len(new_records)
+            self.bytes += added
+            self._evict()
+            last_seq = self.seq
+            conn_errors = self.stats["conn_errors"] - conn_errors_before
+            held = time.perf_counter() - t_acquired
+
+        # 只有矿工输出走 miner_output 这一路；管理器消息已经由 Miner._log 写进主日志
+        if new_records and source == "miner" and _miner_log.isEnabledFor(logging.INFO):
+            for rec in new_records:
+                if self.prefix:
+                    _miner_log.info("[%s] %s", self.prefix, rec)
+                else:
+                    _miner_log.info("%s", rec)
+        if new_records and self.archive is not None:
+            self.archive.submit(now, new_records)
+        if conn_errors and self.conn_error_observer is not None:
+            for _ in range(conn_errors):
+                self.conn_error_observer()
+        if self.lock_observer is not None:
+            self.lock_observer(held)
+        if new_records and self.lines_observer is not None:
+            self.lines_observer(len(new_records))
+        return new_records, last_seq
+
+    def _evict(self):
+        """超出 max_bytes / maxlen 时丢掉最旧的记录（至少保留一条）。调用方需持有 lock。"""
+        buffer = self.buffer
+        while len(buffer) > 1 and (
+            self.bytes > self.max_bytes or (self.maxlen is not None and len(buffer) > self.maxlen)
+        ):
+            self.bytes -= buffer.popleft().size()
+
+    def set_max_bytes(self, max_bytes: int):
+        with self.lock:
+            self.max_bytes = max(1, int(max_bytes))
+            self._evict()
+
+    # =========================================================
+    # 读取
+    # =========================================================
+
+    def read_since(self, since: int | None):
+        """
+        取出序号 > since 的日志行（格式化后的文本）。
+        返回 (lines, next_seq, truncated)：
+        - next_seq：前端下次请求带上的游标；
+        - truncated：since 之后的部分日志已经被环形缓冲挤掉（前端需要整屏重绘）。
+        since 为 None 时返回整个缓冲。
+        """
+        with self.lock:
+            next_seq = self.seq
+            if not self.buffer:
+                return [], next_seq, False
+
+            first_seq = next_seq - len(self.buffer) + 1
+            if since is None or since < first_seq - 1:
+                # 首次请求，或者客户端落后太多：返回全部
+                truncated = since is not None
+                return [r.format() for r in self.buffer], next_seq, truncated
+
+            if since > next_seq:
+                # 游标比服务端还新（例如服务重启过），视为落环，返回全部
+                return [r.format() for r in self.buffer], next_seq, True
+
+            # seq 连续，新行数 = next_seq - since，从右侧取，开销只和新行数有关
+            new = [r.format() for r in islice(reversed(self.buffer), next_seq - since)]
+            new.reverse()
+            return new, next_seq, False
+
+    def hashrate(self):
+        """最近一次算力 {"raw", "hs"}，没有返回 None。"""
+        with self.lock:
+            return self.stats["hashrate"]
+
+    def last_submit(self):
+        """最近一条份额行（接受或拒绝）及其时间戳 {"line", "time_str"}，没有返回 None。"""
+        with self.lock:
+            return self.stats["last_submit"]
+
+    def shares(self) -> tuple[int, int]:
+        """(accepted, rejected)：矿工报的累计值，没有累计值的实现（SRBMiner）按份额行计数。"""
+        with self.lock:
+            return self.stats["accepted"], self.stats["rejected"]
+
+    def huge_pages(self) -> dict:
+        """矿工输出里报告的大页分配情况（目前只有 XMRig 会打印），没有返回 {}。"""
+        with self.lock:
+            return self.stats["huge_pages"]
+
+    def activity(self) -> dict:
+        """最近一次算力 / 新份额的时间和数值（HealthMonitor 用）。"""
+        with self.lock:
+            hr = self.stats["hashrate"]
+            return {
+                "hs": hr["hs"] if hr else None,
+                "hashrate_at": self.stats["hashrate_at"],
+                "accepted": self.stats["accepted"],
+                "accepted_at": self.stats["accepted_at"],
+            }
+
+    def share_stats(self) -> dict:
+        """解析器给出的份额 / 任务细节：过期份额数、提交延迟、最近任务、多窗口算力。"""
+        with self.lock:
+            return {
+                "stale": self.stats["stale"],
+                "latency_ms": self.stats["share_latency_ms"],
+                "last_job": self.stats["last_job"],
+                "hashrate_windows": self.stats["hashrate_windows"],
+            }
+
+    def conn_errors(self) -> int:
+        """累计的矿池连接错误行数（只增不减）。"""
+        with self.lock:
+            return self.stats["conn_errors"]
+
+    def memory_bytes(self) -> int:
+        """缓冲当前估算占用的字节数。"""
+        return self.bytes
+
+    def __len__(self) -> int:
+        return len(self.buffer)
@@ -0,0 +1,170 @@
+# scash_manager/metrics.py
+import math
+import threading
+
+
+"""
+metrics.py
+
+极简的 Prometheus 文本格式导出（不依赖 prometheus_client）：
+
+- Counter / Gauge / Histogram 三种类型，支持固定的 label 名；
+- 热路径上的操作只是一次加锁 + 加法，树莓派这类小机器上也可以忽略不计；
+- 抓取时才需要现算的指标（算力、进程 RSS 等）用 register_collector 注册回调。
+"""
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v) -> str:
+    if v is None:
+        return "NaN"
+    v = float(v)
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if v == int(v) and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self.header()
+        for lv, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, lv)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label_values -> [每个桶的计数..., sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = [0] * len(self.buckets) + [0.0, 0]
+                self._values[label_values] = row
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(lv, list(row)) for lv, row in self._values.items()]
+        lines = self.header()
+        for lv, row in items:
+            cum = 0
+            for b, c in zip(self.buckets, row):
+                cum += c
+                labels = _fmt_labels(self.label_names, lv, [("le", _fmt_value(b))])
+                lines.append(f"{self.name}_bucket{labels} {cum}")
+            labels = _fmt_labels(self.label_names, lv, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {row[-1]}")
+            base = _fmt_labels(self.label_names, lv)
+            lines.append(f"{self.name}_sum{base} {_fmt_value(row[-2])}")
+            lines.append(f"{self.name}_count{base} {row[-1]}")
+        return lines
+
+
+class Registry:
+    """指标注册表。collector 回调在每次抓取时调用，返回 [(name, help, type, value, labels_dict)]。"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        m = Counter(name, help_text, labels)
+        self._metrics.append(m)
+        return m
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        m = Gauge(name, help_text, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name, help_text, labels=(), buckets=Histogram.DEFAULT_BUCKETS) -> Histogram:
+        m = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def register_collector(self, fn):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines += m.render()
+
+        # 同名指标的样本必须连续输出，按名字分组
+        families: dict[str, list] = {}
+        for fn in self._collectors:
+            for name, help_text, type_name, value, labels in fn():
+                fam = families.get(name)
+                if fam is None:
+                    fam = families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {type_name}"]
+                lv = _fmt_labels(list(labels), list(labels.values())) if labels else ""
+                fam.append(f"{name}{lv} {_fmt_value(value)}")
+        for fam in families.values():
+            lines += fam
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -3,9 +3,27 @@ import subprocess
 import threading
 import logging
 import os
+import selectors
 import signal
+import time
 from typing import Optional
 
+from .host_tuning import prepare as prepare_host_tuning, release as release_host_tuning
+from .miner_api import api_cmd_args, api_enabled, api_port
+from .proctree import ProcessTree
+from .topology import affinity_mask, recommend_layout
+
+
+# Miner 生命周期状态：
+# stopped → starting → running → stopping → stopped
+# 没有经过 stop() 的退出（崩溃 / 自己退出）以及启动失败都记为 failed
+STATES = ("stopped", "starting", "running", "stopping", "failed")
+
+# stdout 每次最多读多少字节
+READ_CHUNK = 64 * 1024
+# 没有换行的半行最多等多少秒就输出
+FLUSH_PARTIAL = 1.0
+
 
 class Miner:
     """
@@ -14,15 +32,32 @@ class Miner:
     - 负责启动 / 停止真实挖矿进程
     - cpuminer / SRBMiner / XMRig 三类都兼容
     - stdout 实时回调 push_log
+    - state 为当前生命周期状态（见 STATES），变化时通知 state 监听者
     """
 
     def __init__(self, cfg, log_cb=None):
         self.cfg = cfg
-        self.log_cb = log_cb or (lambda msg: None)
+        self.log_cb = log_cb or (lambda msg, source="manager": None)
         self.proc: Optional[subprocess.Popen] = None
         self._lock = threading.Lock()
         self._manual_stop_flag = False   # 前端点击停止 = True
+        self._release_tuning = True      # 这次 stop() 之后要不要把大页还给系统
         self._stdout_thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None  # 最近一次启动的 time.time()
+        self.last_uptime: Optional[float] = None  # 上一个进程退出时运行了多少秒
+        self.last_exit_code: Optional[int] = None
+        # 进程退出时回调 cb(exit_code)，在等待线程里调用（Watchdog 用）
+        self._exit_listeners: list = []
+        self.state = "stopped"
+        # 状态变化时回调 cb(state)（推送给前端用），不要在回调里调用 Miner 的方法
+        self._state_listeners: list = []
+        self.layout: Optional[dict] = None       # 最近一次启动时的线程 / 绑核方案
+        self.tuning: Optional[dict] = None       # 最近一次启动时的大页方案（见 host_tuning.py）
+        # 走本地 stratum 代理时替换矿池地址 / 用户名：{"url", "user"}
+        self.pool_override: Optional[dict] = None
+        # 配置了多个矿池时由 PoolSelector 挑选（见 pools.py）
+        self.pool_selector = None
+        self.pool_url: Optional[str] = None      # 最近一次启动时实际使用的矿池
 
     # ======================================================================
     # 工具方法
@@ -31,11 +66,122 @@ class Miner:
     def is_running(self) -> bool:
         return self.proc is not None and self.proc.poll() is None
 
+    def uptime(self) -> Optional[float]:
+        """当前进程已运行的秒数，没在运行返回 None。"""
+        if not self.is_running() or self.started_at is None:
+            return None
+        return time.time() - self.started_at
+
+    def stdout_backlog(self) -> Optional[int]:
+        """stdout 管道里还没被读线程读走的字节数（FIONREAD），拿不到返回 None。"""
+        proc = self.proc
+        if proc is None or proc.stdout is None:
+            return None
+        try:
+            import fcntl
+            import struct
+            import termios
+
+            buf = fcntl.ioctl(proc.stdout.fileno(), termios.FIONREAD, b"\0\0\0\0")
+            return struct.unpack("i", buf)[0]
+        except Exception:
+            return None
+
+    def process_stats(self) -> Optional[dict]:
+        """
+        Miner 进程树的资源占用：{"cpu_seconds", "rss_bytes"}。
+        需要 psutil；没在运行或拿不到时返回 None。
+        """
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return None
+        try:
+            import psutil
+        except ImportError:
+            return None
+
+        try:
+            root = psutil.Process(proc.pid)
+            procs = [root] + root.children(recursive=True)
+        except Exception:
+            return None
+
+        cpu = 0.0
+        rss = 0
+        for p in procs:
+            try:
+                t = p.cpu_times()
+                cpu += t.user + t.system
+                rss += p.memory_info().rss
+            except Exception:
+                pass
+        return {"cpu_seconds": cpu, "rss_bytes": rss}
+
+    def add_exit_listener(self, cb):
+        if cb not in self._exit_listeners:
+            self._exit_listeners.append(cb)
+
+    def remove_exit_listener(self, cb):
+        try:
+            self._exit_listeners.remove(cb)
+        except ValueError:
+            pass
+
+    def add_state_listener(self, cb):
+        if cb not in self._state_listeners:
+            self._state_listeners.append(cb)
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        for cb in list(self._state_listeners):
+            try:
+                cb(state)
+            except Exception as e:
+                logging.error("[Miner] 状态回调异常: %s", e)
+
     def _log(self, msg: str):
         logging.info(msg)
         if self.log_cb:
             self.log_cb(msg)
 
+    # ======================================================================
+    # 线程数 / 绑核
+    # ======================================================================
+
+    def _resolve_layout(self) -> dict:
+        """
+        根据 CPU 拓扑决定线程数和绑定的 CPU（见 topology.py）：
+        - miner.threads 为空时用按 L3 推荐的线程数；
+        - miner.affinity: "auto"（默认）按 L3 / NUMA 均匀绑核，"off" 不绑，
+          也可以直接写 CPU 列表；
+        - miner.numa_node：只用某个 NUMA 节点（多实例时每个节点一个实例）。
+        """
+        mcfg = self.cfg.get("miner", {}) or {}
+        affinity = mcfg.get("affinity", "auto")
+        layout = recommend_layout(
+            mcfg.get("algorithm"),
+            threads=mcfg.get("threads"),
+            node=mcfg.get("numa_node"),
+        )
+        if isinstance(affinity, list):
+            layout["cpus"] = sorted(int(c) for c in affinity) or None
+        elif affinity in (False, None, "off", "none"):
+            layout["cpus"] = None
+        return layout
+
+    def _preexec(self):
+        """子进程里执行：新进程组 + 绑核（所有矿工线程都继承这个 CPU 集合）。"""
+        os.setsid()
+        cpus = (self.layout or {}).get("cpus")
+        if cpus:
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError:
+                # 绑核失败不影响启动
+                pass
+
     # ======================================================================
     # 构造启动命令
     # ======================================================================
@@ -45,7 +191,15 @@ class Miner:
         impl = mcfg.get("impl", "cpuminer")
         wallet = self.cfg.get("wallet")
         pool = mcfg.get("url")
-        threads = mcfg.get("threads", 1)
+        if self.pool_selector is not None:
+            pool = self.pool_selector.choose() or pool
+        if self.pool_override:
+            # 代理用自己的账号连矿池，这里的用户名只用来区分本地矿工
+            pool = self.pool_override["url"]
+            wallet = self.pool_override["user"]
+        self.pool_url = pool
+        self.layout = self._resolve_layout()
+        threads = self.layout["threads"]
         bin_path = mcfg.get("bin_path")
         algo = (mcfg.get("algorithm") or "randomx").strip()  # <--- 关键：使用配置里的算法
 
@@ -57,7 +211,7 @@ class Miner:
             # cpuminer 直接用 stratum+tcp://...
             # SCASH / XMR / ZEPH / WOW 这些 RandomX 系就用 randomx；
             # 如果将来你给它填别的 algo，这里也会跟着走。
-            return [
+            cmd = [
                 bin_path,
                 "-a", algo,
                 "-o", pool,
@@ -73,7 +227,7 @@ class Miner:
             # - WOW：algo = rx/wow
             # - DERO：algo = astrobwt
             # 这些都是前面 webapp 里根据币种算好的。
-            return [
+            cmd = [
                 bin_path,
                 "-a", algo,
                 "-o", pool,
@@ -87,7 +241,7 @@ class Miner:
             # SRBMiner 使用 host:port（不带 stratum+tcp:// 前缀）
             hostport = pool.replace("stratum+tcp://", "").replace("stratum://", "")
             # 这里我们还是直接写死 randomscash，跟 webapp 里保持一致
-            return [
+            cmd = [
                 bin_path,
                 "--algorithm", "randomscash",
                 "--pool", hostport,
@@ -99,27 +253,106 @@ class Miner:
         else:
             raise RuntimeError(f"未知 miner impl: {impl}")
 
+        # XMRig 自己会把第 N 个线程绑到掩码里的第 N 个 CPU 上
+        if impl == "xmrig" and self.layout.get("cpus"):
+            cmd += ["--cpu-affinity", affinity_mask(self.layout["cpus"])]
+
+        # 大页：按线程数预留（有权限时）并加上对应参数
+        self.tuning = prepare_host_tuning(mcfg, threads, self.cfg.get("host_tuning"), previous=self.tuning)
+        cmd += self.tuning["flags"]
+
+        # 可选：打开矿工自带的本地 API（SRBMiner 以外只绑 127.0.0.1），供 MinerApiPoller 读取
+        if api_enabled(mcfg):
+            cmd += api_cmd_args(impl, api_port(mcfg))
+
+        return cmd
+
 
     # ======================================================================
     # stdout 实时读取
     # ======================================================================
 
     def _reader(self, pipe):
+        """
+        按块读 stdout（os.read，一次最多 READ_CHUNK 字节），把已经完整的行整批交给 log_cb：
+        输出很密（xmrig --print-time 1、SRBMiner 调试输出）时一批几十上百行，
+        LogRing 只加一次锁；没换行的尾巴留到下一块，超过 FLUSH_PARTIAL 秒没有后续就直接输出。
+        """
+        fd = pipe.fileno()
+        sel = selectors.DefaultSelector()
+        pending = b""
         try:
-            for line in iter(pipe.readline, b""):
-                if not line:
+            os.set_blocking(fd, False)
+            sel.register(fd, selectors.EVENT_READ)
+            while True:
+                if not sel.select(FLUSH_PARTIAL if pending else None):
+                    # 半行等太久了（例如矿工打印提示后没有换行），先输出
+                    self._emit(pending)
+                    pending = b""
+                    continue
+
+                chunks = [pending]
+                size = 0
+                eof = False
+                # 把管道里已经有的数据一次读完，凑成一批
+                while size < READ_CHUNK:
+                    try:
+                        data = os.read(fd, READ_CHUNK)
+                    except BlockingIOError:
+                        break
+                    if not data:
+                        eof = True
+                        break
+                    chunks.append(data)
+                    size += len(data)
+
+                buf = b"".join(chunks)
+                if eof:
+                    self._emit(buf)
                     break
-                text = line.decode("utf-8", errors="ignore").rstrip()
-                if text:
-                    self._log(text)
+                cut = buf.rfind(b"\n") + 1
+                if cut:
+                    self._emit(buf[:cut])
+                    buf = buf[cut:]
+                if len(buf) >= READ_CHUNK:
+                    self._emit(buf)
+                    buf = b""
+                pending = buf
         except Exception as e:
             self._log(f"[miner reader] 异常: {e}")
         finally:
+            sel.close()
             try:
                 pipe.close()
             except Exception:
                 pass
 
+    def _emit(self, data: bytes):
+        """一批 stdout 原样交给 log_cb（拆行 / 去颜色码 / 解析见 LogRing.push）。"""
+        text = data.decode("utf-8", errors="ignore")
+        if text.strip():
+            self.log_cb(text, "miner")
+
+    def _waiter(self, proc: subprocess.Popen, started_at: float):
+        """阻塞等待进程退出，然后通知监听者（不轮询，退出后立即触发）。"""
+        try:
+            rc = proc.wait()
+        except Exception:
+            rc = None
+        self.last_exit_code = rc
+        self.last_uptime = time.time() - started_at
+        # 手动停止由 stop() 收尾置为 stopped；其它退出都算失败
+        if not self._manual_stop_flag and self.proc is proc:
+            self._set_state("failed")
+        if self._manual_stop_flag and self._release_tuning:
+            # Watchdog 重启时留着大页（stop(release_tuning=False)），手动停止才还给系统
+            release_host_tuning(self.tuning, self.cfg.get("host_tuning"))
+        for cb in list(self._exit_listeners):
+            try:
+                cb(rc)
+            except Exception as e:
+                logging.error("[Miner] 退出回调异常: %s", e)
+
     # ======================================================================
     # 启动 Miner
     # ======================================================================
@@ -132,9 +365,22 @@ class Miner:
 
             # 每次启动前都认为是“自动/正常启动”，允许 Watchdog 重启
             self._manual_stop_flag = False
+            self._set_state("starting")
 
-            cmd = self._build_cmd()
+            try:
+                # bin_path 不存在、未知实现、选池 / 主机调优出错都会在这里抛出
+                cmd = self._build_cmd()
+            except Exception as e:
+                self.proc = None
+                self._log(f"启动 Miner 失败（生成命令行出错）: {e}")
+                self._set_state("failed")
+                return
             self._log(f"启动 Miner 进程: {' '.join(cmd)}")
+            if self.layout and self.layout.get("cpus"):
+                self._log(
+                    f"线程数={self.layout['threads']}，绑定 CPU: "
+                    f"{','.join(map(str, self.layout['cpus']))}"
+                )
 
             try:
                 # 关键：把 Miner 放进单独的进程组，便于后面 killpg
@@ -142,14 +388,25 @@ class Miner:
                     cmd,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
-                    bufsize=1,
-                    preexec_fn=os.setsid,   # 创建新进程组（Linux）
+                    bufsize=0,                  # 读线程直接 os.read 管道 fd
+                    preexec_fn=self._preexec,   # 新进程组（Linux）+ 绑核
                 )
             except Exception as e:
                 self.proc = None
                 self._log(f"启动 Miner 失败: {e}")
+                self._set_state("failed")
                 return
 
+            self.started_at = time.time()
+            self._set_state("running")
+
+            # 等待线程：进程一退出就通知 Watchdog
+            threading.Thread(
+                target=self._waiter,
+                args=(self.proc, self.started_at),
+                daemon=True,
+            ).start()
+
             # stdout 线程
             if self.proc.stdout is not None:
                 self._stdout_thread = threading.Thread(
@@ -163,18 +420,33 @@ class Miner:
     # 停止 Miner（前端点击停止）
     # ======================================================================
 
-    def stop(self):
-        """前端点击停止：杀掉整个进程树，而不是只杀一部分"""
+    def stop(self, release_tuning: bool = True):
+        """
+        前端点击停止：杀掉整个进程树，而不是只杀一部分。
+        只在发信号前后持锁，等待进程退出（最多 8 秒 + 清理）时不持锁。
+        release_tuning=False：Watchdog 停掉马上要重启，预留的大页留着不还。
+        """
         with self._lock:
             if not self.is_running():
+                if self.state != "failed":
+                    self._set_state("stopped")
                 self._log("Miner 已停止。")
                 return
+            if self.state == "stopping":
+                self._log("Miner 正在停止中。")
+                return
 
-            assert self.proc is not None
-            pid = self.proc.pid
+            proc = self.proc
+            assert proc is not None
+            pid = proc.pid
             self._manual_stop_flag = True  # 告诉 watchdog 不要重启
+            self._release_tuning = release_tuning
+            self._set_state("stopping")
             self._log(f"正在停止 Miner (pid={pid})...")
 
+            # 发信号之前记下整棵进程树（子进程被 SIGTERM 后会被 init 收养，之后就找不到了）
+            tree = ProcessTree.snapshot(pid)
+
             try:
                 # 拿到进程组 ID
                 pgid = os.getpgid(pid)
@@ -183,58 +455,51 @@ class Miner:
             except Exception as e:
                 self._log(f"SIGTERM 进程组失败：{e}，改用 terminate()")
                 try:
-                    self.proc.terminate()
-                except Exception:
-                    pass
-
-            # 等待退出
-            try:
-                self.proc.wait(timeout=8)
-            except subprocess.TimeoutExpired:
-                self._log("SIGTERM 无效，开始暴力 kill 进程树")
-
-                try:
-                    pgid = os.getpgid(pid)
-                    os.killpg(pgid, signal.SIGKILL)
-                except Exception as e:
-                    self._log(f"SIGKILL 进程组失败：{e}")
-
-                try:
-                    self.proc.kill()
+                    proc.terminate()
                 except Exception:
                     pass
+            # 自己 setsid 脱离了进程组的子孙进程
+            tree.signal(signal.SIGTERM, skip=(pid,))
 
-            # 关键：彻底再扫一遍，把 SRBMiner 残余进程全杀掉
-            self._kill_residual_srbminer()
-
-            rc = self.proc.returncode
-            self.proc = None
-            self._log(f"Miner 已停止，退出码={rc}")
-
-    def _kill_residual_srbminer(self):
-        """彻底清除系统里所有 SRBMiner 相关残余进程"""
+        # 等待退出
         try:
-            import psutil
-        except ImportError:
-            self._log("未安装 psutil，无法扫描残余 SRBMiner 进程。")
-            return
-
-        targets = ["SRBMiner-MULTI", "SRBMiner", "randomscash"]
+            proc.wait(timeout=8)
+        except subprocess.TimeoutExpired:
+            self._log("SIGTERM 无效，开始暴力 kill 进程树")
 
-        for p in psutil.process_iter(["pid", "name", "cmdline"]):
             try:
-                name = p.info["name"] or ""
-                cmd = " ".join(p.info.get("cmdline") or [])
+                pgid = os.getpgid(pid)
+                os.killpg(pgid, signal.SIGKILL)
+            except Exception as e:
+                self._log(f"SIGKILL 进程组失败：{e}")
 
-                if any(t in name for t in targets) or any(t in cmd for t in targets):
-                    self._log(f"发现残余 SRBMiner 进程 pid={p.pid}，正在 kill -9")
-                    try:
-                        os.kill(p.pid, signal.SIGKILL)
-                    except Exception:
-                        pass
+            try:
+                proc.kill()
             except Exception:
                 pass
 
+        # 关键：只清理这次启动的进程树里还活着的残余进程（例如 SRBMiner 的子进程）
+        self._kill_residual_children(tree)
+
+        with self._lock:
+            # 等待期间可能已经被重新启动过，只清理自己停掉的那个进程
+            if self.proc is proc:
+                self.proc = None
+                self._set_state("stopped")
+        self._log(f"Miner 已停止，退出码={proc.returncode}")
+
+    def _kill_residual_children(self, tree: ProcessTree):
+        """
+        kill -9 停止前快照里仍然存活的子孙进程。
+        只动 Miner 自己的进程树（pidfd / 启动时间核对身份），不扫描宿主机上的其它进程。
+        """
+        try:
+            killed = tree.signal(signal.SIGKILL)
+            if killed:
+                self._log(f"发现残余子进程 {killed}，已 kill -9")
+        finally:
+            tree.close()
+
     # ======================================================================
     # 被看门狗检测到时判断是否该重启
     # ======================================================================
@@ -0,0 +1,311 @@
+# scash_manager/miner_api.py
+import json
+import logging
+import socket
+import threading
+import time
+
+import requests
+
+
+"""
+miner_api.py
+
+直接读矿工自带的本地 API，而不是从 stdout 里用正则抠数字：
+
+- XMRig：HTTP API（--http-host / --http-port），GET /2/summary
+- SRBMiner-MULTI：HTTP API（--api-enable / --api-port），GET /
+  （SRBMiner 没有指定监听地址的参数，API 监听所有网卡，需要防火墙挡住）
+- cpuminer：--api-bind 的 TCP 文本协议（"summary" / "threads"），
+  只有带 API 的 cpuminer 构建才支持，默认不开。
+
+所有后端都输出同一个“统一指标”结构（见 empty_metrics），
+拿不到数据时 webapp 会自动退回日志正则解析。
+"""
+
+
+# 各实现默认的本地 API 端口（XMRig / cpuminer 只监听 127.0.0.1，SRBMiner 见 api_cmd_args）
+DEFAULT_API_PORTS = {
+    "xmrig": 18092,
+    "srbminer": 21550,
+    "cpuminer": 4048,
+}
+
+
+def empty_metrics(impl: str) -> dict:
+    """统一指标结构，所有算力单位都是 H/s。"""
+    return {
+        "source": "api",
+        "impl": impl,
+        "ts": time.time(),
+        "hashrate_hs": None,       # 当前算力（优先 10s 窗口）
+        "hashrate_10s": None,
+        "hashrate_60s": None,
+        "hashrate_15m": None,
+        "threads_hs": [],          # 每个线程 / 核心的当前算力
+        "accepted": None,
+        "rejected": None,
+        "difficulty": None,
+        "ping_ms": None,           # 矿池延迟
+        "pool": None,
+        "uptime": None,            # 秒
+    }
+
+
+def api_port(mcfg: dict) -> int:
+    """配置里的端口，没配置就用该实现的默认端口。"""
+    acfg = mcfg.get("api", {}) or {}
+    impl = mcfg.get("impl", "cpuminer")
+    return int(acfg.get("port") or DEFAULT_API_PORTS.get(impl, 0))
+
+
+def api_enabled(mcfg: dict) -> bool:
+    acfg = mcfg.get("api", {}) or {}
+    return bool(acfg.get("enabled")) and mcfg.get("impl", "cpuminer") in DEFAULT_API_PORTS
+
+
+def api_cmd_args(impl: str, port: int) -> list[str]:
+    """
+    启动矿工时追加的参数：打开本地 API。
+    XMRig / cpuminer 只绑定回环地址；SRBMiner 没有对应参数，API 会监听所有网卡，
+    局域网里的其他机器也能读到（只读，但会暴露矿池 / 钱包信息），要用防火墙挡住端口。
+    """
+    if impl == "xmrig":
+        return ["--http-host", "127.0.0.1", "--http-port", str(port)]
+    if impl == "srbminer":
+        logging.warning("[MinerApi] SRBMiner 的 API 会监听所有网卡（端口 %s），请用防火墙限制访问", port)
+        return ["--api-enable", "--api-port", str(port)]
+    if impl == "cpuminer":
+        return ["--api-bind", f"127.0.0.1:{port}"]
+    return []
+
+
+def _num(v):
+    """API 里的数字可能是 null / 字符串，统一转 float 或 None。"""
+    try:
+        return None if v is None else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================================================
+#                        XMRig
+# ============================================================
+
+def parse_xmrig_summary(data: dict) -> dict:
+    """解析 XMRig /2/summary（/1/summary 结构相同）。"""
+    m = empty_metrics("xmrig")
+
+    hr = data.get("hashrate", {}) or {}
+    total = hr.get("total") or []
+    windows = [_num(v) for v in total] + [None, None, None]
+    m["hashrate_10s"], m["hashrate_60s"], m["hashrate_15m"] = windows[:3]
+    m["hashrate_hs"] = next((v for v in windows[:3] if v is not None), None)
+
+    threads = []
+    for row in hr.get("threads") or []:
+        vals = [_num(v) for v in (row or [])]
+        threads.append(next((v for v in vals if v is not None), None))
+    m["threads_hs"] = threads
+
+    res = data.get("results", {}) or {}
+    good = res.get("shares_good")
+    total_shares = res.get("shares_total")
+    if good is not None:
+        m["accepted"] = int(good)
+        if total_shares is not None:
+            m["rejected"] = max(0, int(total_shares) - int(good))
+    m["difficulty"] = _num(res.get("diff_current"))
+
+    conn = data.get("connection", {}) or {}
+    m["ping_ms"] = _num(conn.get("ping"))
+    m["pool"] = conn.get("pool")
+    m["uptime"] = _num(data.get("uptime"))
+    return m
+
+
+# ============================================================
+#                      SRBMiner-MULTI
+# ============================================================
+
+def parse_srbminer_summary(data: dict) -> dict:
+    """
+    解析 SRBMiner-MULTI 的 API 根路径返回。
+    只关心 CPU 部分；多算法时取第一个算法。
+    """
+    m = empty_metrics("srbminer")
+
+    algos = data.get("algorithms") or []
+    algo = algos[0] if algos else {}
+
+    hr = algo.get("hashrate", {}) or {}
+    cpu = hr.get("cpu", {}) or {}
+    m["hashrate_hs"] = _num(cpu.get("total"))
+    if m["hashrate_hs"] is None:
+        m["hashrate_hs"] = _num(hr.get("now"))
+    m["hashrate_10s"] = m["hashrate_hs"]
+
+    threads = []
+    i = 0
+    while f"thread{i}" in cpu:
+        threads.append(_num(cpu.get(f"thread{i}")))
+        i += 1
+    m["threads_hs"] = threads
+
+    shares = algo.get("shares", {}) or {}
+    if shares.get("accepted") is not None:
+        m["accepted"] = int(shares["accepted"])
+    if shares.get("rejected") is not None:
+        m["rejected"] = int(shares["rejected"])
+
+    pool = algo.get("pool", {}) or {}
+    m["pool"] = pool.get("pool")
+    m["difficulty"] = _num(pool.get("difficulty"))
+    m["ping_ms"] = _num(pool.get("latency_ms") or pool.get("latency"))
+    m["uptime"] = _num(data.get("mining_time") or pool.get("time_connected_seconds"))
+    return m
+
+
+# ============================================================
+#                   cpuminer（--api-bind）
+# ============================================================
+
+def _parse_kv_block(block: str) -> dict:
+    """'NAME=cpuminer;KHS=1.23;ACC=5;' → dict"""
+    out = {}
+    for item in block.split(";"):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            out[k.strip()] = v.strip()
+    return out
+
+
+def parse_cpuminer_summary(summary: str, threads: str = "") -> dict:
+    """解析 cpuminer API 的 summary / threads 文本返回。"""
+    m = empty_metrics("cpuminer")
+
+    kv = _parse_kv_block(summary.strip().strip("|\x00"))
+    khs = _num(kv.get("KHS"))
+    m["hashrate_hs"] = khs * 1000 if khs is not None else None
+    m["hashrate_10s"] = m["hashrate_hs"]
+    if kv.get("ACC") is not None:
+        m["accepted"] = int(float(kv["ACC"]))
+    if kv.get("REJ") is not None:
+        m["rejected"] = int(float(kv["REJ"]))
+    m["difficulty"] = _num(kv.get("DIFF"))
+    m["uptime"] = _num(kv.get("UPTIME"))
+
+    per_cpu = []
+    for block in (threads or "").strip("\x00").split("|"):
+        tkv = _parse_kv_block(block)
+        if "CPU" in tkv:
+            v = _num(tkv.get("KHS"))
+            if v is None:
+                v = _num(tkv.get("H/s"))
+            else:
+                v *= 1000
+            per_cpu.append(v)
+    m["threads_hs"] = per_cpu
+    return m
+
+
+def _cpuminer_request(port: int, command: str, timeout: float) -> str:
+    """cpuminer API：连上 → 发命令 → 读到对端关闭。"""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as s:
+        s.sendall(command.encode())
+        chunks = []
+        while True:
+            buf = s.recv(4096)
+            if not buf:
+                break
+            chunks.append(buf)
+    return b"".join(chunks).decode("utf-8", errors="ignore")
+
+
+# ============================================================
+#                        轮询线程
+# ============================================================
+
+class MinerApiPoller:
+    """
+    定期轮询矿工本地 API，保存最近一次的统一指标。
+
+    - HTTP 类后端复用同一个 requests.Session（连接池 + keep-alive）；
+    - 拉取失败只记 debug 日志，latest() 过期后 webapp 自动退回正则解析。
+    """
+
+    def __init__(self, impl: str, port: int, interval: float = 5, timeout: float = 2):
+        self.impl = impl
+        self.port = port
+        self.interval = max(1.0, float(interval))
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._latest: dict | None = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # =========================================================
+    # 外部接口
+    # =========================================================
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        logging.info("[MinerAPI] 开始轮询 %s API 127.0.0.1:%s", self.impl, self.port)
+
+    def stop(self):
+        self._stop_event.set()
+        self._session.close()
+
+    def latest(self, max_age: float | None = None) -> dict | None:
+        """最近一次成功拉到的指标；超过 max_age（默认 3 个轮询周期）视为过期。"""
+        if max_age is None:
+            max_age = self.interval * 3
+        with self._lock:
+            m = self._latest
+        if m is None or time.time() - m["ts"] > max_age:
+            return None
+        return m
+
+    # =========================================================
+    # 拉取
+    # =========================================================
+
+    def fetch(self) -> dict:
+        base = f"http://127.0.0.1:{self.port}"
+        if self.impl == "xmrig":
+            r = self._session.get(f"{base}/2/summary", timeout=self.timeout)
+            r.raise_for_status()
+            return parse_xmrig_summary(r.json())
+        if self.impl == "srbminer":
+            r = self._session.get(f"{base}/", timeout=self.timeout)
+            r.raise_for_status()
+            return parse_srbminer_summary(json.loads(r.text))
+        if self.impl == "cpuminer":
+            summary = _cpuminer_request(self.port, "summary", self.timeout)
+            try:
+                threads = _cpuminer_request(self.port, "threads", self.timeout)
+            except OSError:
+                threads = ""
+            return parse_cpuminer_summary(summary, threads)
+        raise RuntimeError(f"不支持的 miner impl: {self.impl}")
+
+    def poll_once(self) -> dict | None:
+        try:
+            m = self.fetch()
+        except Exception as e:
+            logging.debug("[MinerAPI] 拉取 %s API 失败: %s", self.impl, e)
+            return None
+        with self._lock:
+            self._latest = m
+        return m
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll_once()
+        logging.info("[MinerAPI] run() 线程已退出")
@@ -1,12 +1,11 @@
 # scash_manager/miner_downloader.py
 import logging
 import os
-import shutil
 import tarfile
 import tempfile
 import platform
-import urllib.request
-import requests
+
+from .artifacts import PackageError, cache_enabled, fetch, stream
 
 
 """
@@ -26,7 +25,11 @@ miner_downloader.py
    - 自动根据 CPU 架构选择 x86_64 / ARM64 / macOS
    - 自动下载并提取 xmrig
 
-所有路径都在容器内。
+所有路径都在容器内。下载走 artifacts.fetch：分段并行 + 断点续传 +
+SHA-256 校验，安装包缓存在 /data/cache，容器重建后不用重新下载。
+
+解压用 tarfile 的流式模式（r|gz）：只顺序读一遍，找到需要的那个可执行文件就停，
+先写临时文件再原子 rename 到正式路径；关闭缓存时直接从下载流解压，不落临时包。
 """
 
 
@@ -55,6 +58,12 @@ CPUMINER_PACKAGES = {
 }
 
 
+# 各安装包的 SHA-256（按文件名），填的必须是官方发布页公布、核对过的值，填上后严格校验。
+# 没填的包下载时会打警告（只做首次信任：第一次下载的哈希记下来，之后必须一致）；
+# 也可以在配置 downloads.sha256 里补充，downloads.require_sha256=true 时没填的包拒绝下载。
+PACKAGE_SHA256: dict[str, str] = {}
+
+
 def _detect_platform() -> tuple[str, str]:
     """获取 (OS, ARCH)"""
     system = platform.system() or "Unknown"
@@ -75,58 +84,80 @@ def _get_cpuminer_url() -> str:
     return CPUMINER_BASE.format(fname=fname)
 
 
-def _download_file(url: str, dest: str, timeout=120):
-    """下载通用文件"""
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    logging.info(f"[下载] {url}")
+def _fetch_package(url: str) -> str:
+    """下载（或从缓存取）安装包，返回缓存里的路径（只读）。"""
+    fname = url.rsplit("/", 1)[-1]
+    return fetch(url, sha256=PACKAGE_SHA256.get(fname), name=fname)
+
 
+def _safe_member(m: tarfile.TarInfo) -> bool:
+    """只接受普通文件，且路径不能是绝对路径 / 带 ..（防路径穿越）。"""
+    if not m.isfile():
+        return False
+    name = m.name.replace("\\", "/")
+    if name.startswith("/") or ".." in name.split("/"):
+        logging.warning("[解压] 跳过可疑路径: %s", m.name)
+        return False
+    return True
+
+
+def _extract_binary(fileobj, names: tuple[str, ...], dest: str, verify=None) -> str:
+    """
+    流式读取 tar.gz，把第一个文件名在 names 里的成员写到 dest：
+    - 不调用 getmembers()，找到就停，不解压其它文件；
+    - 先写到 dest 同目录的临时文件，verify()（可选，例如校验下载哈希）通过后再原子 rename。
+    """
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
     try:
-        with requests.get(url, stream=True, timeout=timeout) as r:
-            r.raise_for_status()
-            with open(dest, "wb") as f:
-                for chunk in r.iter_content(8192):
-                    if chunk:
-                        f.write(chunk)
-    except Exception as e:
-        logging.error(f"下载失败: {e}")
-        raise
-
-
-def _extract_minerd(tgz_path: str, out_dir: str) -> str:
-    """从 TGZ 中提取 minerd 文件"""
-    with tarfile.open(tgz_path, "r:gz") as tar:
-        members = [m for m in tar.getmembers() if m.isfile()]
-
-        # 优先 minerd
-        target = None
-        for m in members:
-            if os.path.basename(m.name) == "minerd":
-                target = m
-                break
-
-        if not target:
-            target = members[0]
-
-        tar.extract(target, out_dir)
-        # 解压路径通常是 out_dir/解压出来的目录/minerd
-        # 我们只关心可执行文件本身
-        full = os.path.join(out_dir, target.name)
-        # 确保路径是规范的，因为 tar.extract 会创建目录
-        if not os.path.isfile(full):
-            # 查找最深处的 minerd 文件
-            for root, _, files in os.walk(os.path.join(out_dir, os.path.dirname(target.name).split(os.path.sep)[0])):
-                if os.path.basename(root) == "minerd":
-                    full = root
-                    break
-                if "minerd" in files:
-                    full = os.path.join(root, "minerd")
-                    break
-
-        if not os.path.isfile(full):
-            raise RuntimeError("解压成功但未找到 minerd")
-
-        logging.info(f"[cpuminer] 解压成功 → {full}")
-        return full
+        with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+            for m in tar:
+                if os.path.basename(m.name) not in names or not _safe_member(m):
+                    continue
+
+                src = tar.extractfile(m)
+                fd, tmp = tempfile.mkstemp(prefix=".install-", dir=os.path.dirname(dest) or ".")
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        while True:
+                            chunk = src.read(256 * 1024)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.chmod(tmp, 0o755)
+                    if verify is not None:
+                        verify()
+                    os.replace(tmp, dest)
+                except BaseException:
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+                    raise
+
+                logging.info(f"[解压] {m.name} → {dest}")
+                return dest
+    except tarfile.TarError as e:
+        raise PackageError(f"安装包解压失败：{e}") from e
+
+    raise PackageError(f"安装包里没有找到 {' / '.join(names)}")
+
+
+def _install_binary(url: str, names: tuple[str, ...], dest: str) -> str:
+    """下载安装包并只解出需要的可执行文件；关闭缓存时边下边解压。"""
+    fname = url.rsplit("/", 1)[-1]
+    if cache_enabled():
+        path = _fetch_package(url)
+        with open(path, "rb") as f:
+            return _extract_binary(f, names, dest)
+
+    return stream(
+        url,
+        lambda fileobj, verify: _extract_binary(fileobj, names, dest, verify),
+        sha256=PACKAGE_SHA256.get(fname),
+        name=fname,
+    )
 
 
 def ensure_cpuminer_binary(bin_path="/usr/local/bin/minerd"):
@@ -136,21 +167,7 @@ def ensure_cpuminer_binary(bin_path="/usr/local/bin/minerd"):
         return
 
     url = _get_cpuminer_url()
-
-    with tempfile.TemporaryDirectory() as tmp:
-        tgz_path = os.path.join(tmp, "cpuminer.tgz")
-
-        _download_file(url, tgz_path)
-
-        src = _extract_minerd(tgz_path, tmp)
-
-        os.makedirs(os.path.dirname(bin_path), exist_ok=True)
-        if os.path.exists(bin_path):
-            os.remove(bin_path)
-
-        shutil.move(src, bin_path)
-
-    os.chmod(bin_path, 0o755)
+    _install_binary(url, ("minerd",), bin_path)
     logging.info(f"[cpuminer] 已安装 → {bin_path}")
 
 
@@ -175,47 +192,12 @@ def ensure_srbminer(base_dir="/opt/SRBMiner-Multi") -> str:
         logging.info(f"[SRBMiner] 已存在 → {exe_path}")
         return exe_path
 
-    # 下载
-    tmp_tar = "/tmp/SRBMiner.tar.gz"
+    # 下载 + 只解出 SRBMiner-MULTI（其它文件不落盘）
     logging.info(f"[SRBMiner] 开始下载: {SRB_URL}")
-
     try:
-        # 优先使用 requests (支持超时)
-        _download_file(SRB_URL, tmp_tar)
+        _install_binary(SRB_URL, ("SRBMiner-MULTI",), exe_path)
     except Exception as e:
-        # 如果 requests 失败，可以尝试 urllib (原代码逻辑)
-        try:
-            urllib.request.urlretrieve(SRB_URL, tmp_tar)
-        except Exception:
-            raise RuntimeError(f"无法下载 SRBMiner：{e}")
-
-    # 解压
-    extract_dir = "/tmp/srbminer_extract"
-    if os.path.isdir(extract_dir):
-        shutil.rmtree(extract_dir)
-    os.makedirs(extract_dir)
-
-    try:
-        with tarfile.open(tmp_tar, "r:gz") as tar:
-            tar.extractall(extract_dir)
-    except Exception as e:
-        raise RuntimeError(f"SRBMiner 解压失败：{e}")
-
-    # 查找可执行文件
-    real_exe = None
-    for root, dirs, files in os.walk(extract_dir):
-        if "SRBMiner-MULTI" in files:
-            real_exe = os.path.join(root, "SRBMiner-MULTI")
-            break
-
-    if not real_exe:
-        raise RuntimeError("解压完成但未找到 SRBMiner-MULTI")
-
-    os.makedirs(base_dir, exist_ok=True)
-
-    # 移动到正式路径
-    shutil.move(real_exe, exe_path)
-    os.chmod(exe_path, 0o755)
+        raise RuntimeError(f"无法安装 SRBMiner：{e}")
 
     logging.info(f"[SRBMiner] 安装成功 → {exe_path}")
     return exe_path
@@ -267,40 +249,6 @@ def _get_xmrig_url() -> str:
     return XMRIG_BASE.format(fname=fname)
 
 
-def _extract_xmrig(tgz_path: str, out_dir: str) -> str:
-    """从 TGZ 中提取 xmrig 文件"""
-    with tarfile.open(tgz_path, "r:gz") as tar:
-        # 查找所有文件，并优先选择名为 'xmrig' 的可执行文件
-        members = [m for m in tar.getmembers() if m.isfile()]
-        target = None
-        for m in members:
-            if os.path.basename(m.name) == "xmrig":
-                target = m
-                break
-
-        if not target:
-            raise RuntimeError("解压成功但未找到 xmrig 可执行文件。")
-
-        # 提取目标文件
-        tar.extract(target, out_dir)
-        # 获取提取后的完整路径
-        full = os.path.join(out_dir, target.name)
-
-        # 某些压缩包解压后路径可能为 <tmp>/xmrig-v6.x.x/xmrig，需要找到实际文件
-        if not os.path.isfile(full):
-            # 简单查找解压目录下的 xmrig 文件
-            for root, _, files in os.walk(out_dir):
-                if "xmrig" in files:
-                    full = os.path.join(root, "xmrig")
-                    break
-
-        if not os.path.isfile(full):
-            raise RuntimeError("解压成功但未找到 xmrig 文件 (二次查找失败)")
-
-        logging.info(f"[XMRig] 解压成功 → {full}")
-        return full
-
-
 def ensure_xmrig_binary(bin_path="/usr/local/bin/xmrig"):
     """确保 XMRig 存在，否则自动下载"""
     if os.path.isfile(bin_path):
@@ -308,21 +256,6 @@ def ensure_xmrig_binary(bin_path="/usr/local/bin/xmrig"):
         return bin_path
 
     url = _get_xmrig_url()
-
-    with tempfile.TemporaryDirectory() as tmp:
-        tgz_path = os.path.join(tmp, "xmrig.tgz")
-
-        _download_file(url, tgz_path)
-
-        src = _extract_xmrig(tgz_path, tmp)
-
-        # 移动到目标路径
-        os.makedirs(os.path.dirname(bin_path), exist_ok=True)
-        if os.path.exists(bin_path):
-            os.remove(bin_path)
-
-        shutil.move(src, bin_path)
-
-    os.chmod(bin_path, 0o755)
+    _install_binary(url, ("xmrig",), bin_path)
     logging.info(f"[XMRig] 已安装 → {bin_path}")
-    return bin_path
\ No newline at end of file
+    return bin_path
@@ -0,0 +1,424 @@
+# scash_manager/parsers.py
+import argparse
+import os
+import re
+import sys
+import time
+
+
+"""
+parsers.py
+
+按矿工实现（miner.impl）解析输出的插件：
+
+- 每个解析器对一行日志做一次分类，先用关键字过滤，再跑预编译的正则，
+  大部分行（非算力 / 非份额）只做几次子串查找就返回；
+- 输出统一的事件（dict，type 字段区分）：
+  - hashrate：{"hs", "raw", "window", "scope", "thread"}，window 为 "10s" / "60s" / "15m" / None，
+    scope 为 "total"（整机）或 "thread"（单线程，thread 为编号）；
+  - share：{"accepted", "stale", "latency_ms", "diff", "reason",
+    "accepted_total", "rejected_total"}（矿工没报累计值时为 None）；
+  - job：{"pool", "diff", "height"}；
+  - conn_lost：{"reason"}；
+  - huge_pages：{"kind", "percent", "allocated", "total"}（XMRig）。
+- LogRing 写入时按实例的 impl 选解析器（见 get_parser）。
+
+python -m scash_manager.parsers 会用 fixtures/miner_output 下的样例输出
+跑一遍各解析器，打印事件统计和吞吐（行/秒）。
+"""
+
+
+UNIT_MAP = {
+    "h/s": 1,
+    "hash/s": 1,
+    "kh/s": 1_000,
+    "khash/s": 1_000,
+    "mh/s": 1_000_000,
+    "mhash/s": 1_000_000,
+    "gh/s": 1_000_000_000,
+    "ghash/s": 1_000_000_000,
+    "th/s": 1_000_000_000_000,
+    "thash/s": 1_000_000_000_000,
+}
+
+UNIT = r"[kKmMgGtT]?(?:hash/s|H/s|h/s)"
+
+# 矿工输出里的矿池连接错误（各实现的常见说法）
+CONN_ERROR_RE = re.compile(
+    r"(stratum connection (failed|interrupted)|stratum_recv_line failed|"
+    r"connect error|connection (refused|reset|timed out|lost|failed)|"
+    r"can'?not connect|can't connect|failed to connect|read error|"
+    r"no active pools|disconnected from)",
+    re.IGNORECASE,
+)
+
+HUGEPAGES_RE = re.compile(
+    r"huge pages\s+(?P<pct>\d+)%\s+(?P<ok>\d+)/(?P<total>\d+)", re.IGNORECASE
+)
+
+HASHRATE_RE = re.compile(rf"(?P<val>\d+(?:\.\d+)?)\s*(?P<unit>{UNIT})")
+SUBMIT_LINE_RE = re.compile(r"accepted:\s*(?P<ok>\d+)/(?P<total>\d+)", re.IGNORECASE)
+
+
+def to_hs(val: str, unit: str) -> float:
+    return float(val) * UNIT_MAP.get(unit.lower(), 1)
+
+
+def hashrate_event(val: str, unit: str, window=None, scope="total", thread=None) -> dict:
+    return {
+        "type": "hashrate",
+        "hs": to_hs(val, unit),
+        "raw": f"{float(val)} {unit}",
+        "window": window,
+        "scope": scope,
+        "thread": thread,
+    }
+
+
+def share_event(accepted: bool, stale=False, latency_ms=None, diff=None, reason=None,
+                accepted_total=None, rejected_total=None) -> dict:
+    return {
+        "type": "share",
+        "accepted": accepted,
+        "stale": stale,
+        "latency_ms": latency_ms,
+        "diff": diff,
+        "reason": reason,
+        "accepted_total": accepted_total,
+        "rejected_total": rejected_total,
+    }
+
+
+def job_event(pool=None, diff=None, height=None) -> dict:
+    return {"type": "job", "pool": pool, "diff": diff, "height": height}
+
+
+def conn_lost_event(reason: str) -> dict:
+    return {"type": "conn_lost", "reason": reason}
+
+
+def _num(s):
+    if s is None:
+        return None
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
+
+
+class OutputParser:
+    """
+    通用解析器（未知实现时使用，也是各实现的基类）：
+    任意 "<数字> H/s" 算最新算力，"accepted: n/m" 算份额，连接错误关键字算断线。
+    """
+
+    impl = "generic"
+
+    def parse(self, line: str) -> list[dict]:
+        events = []
+        self._parse_hashrate(line, events)
+        self._parse_share(line, events)
+        self._parse_conn(line, events)
+        return events
+
+    def _parse_hashrate(self, line: str, events: list):
+        if "/s" not in line:
+            return
+        last = None
+        for last in HASHRATE_RE.finditer(line):
+            pass
+        if last is not None:
+            events.append(hashrate_event(last.group("val"), last.group("unit")))
+
+    def _parse_share(self, line: str, events: list):
+        if "ccepted" not in line:
+            return
+        m = SUBMIT_LINE_RE.search(line)
+        if m:
+            ok, total = int(m.group("ok")), int(m.group("total"))
+            events.append(share_event(True, accepted_total=ok, rejected_total=max(0, total - ok)))
+
+    def _parse_conn(self, line: str, events: list):
+        m = CONN_ERROR_RE.search(line)
+        if m:
+            events.append(conn_lost_event(m.group(0)))
+
+
+class CpuminerParser(OutputParser):
+    """
+    cpuminer（pooler / cpuminer-scash）：
+      CPU #3: 279.90 H/s                         单线程算力
+      thread 0: 2097152 hashes, 0.28 khash/s     老版本的单线程算力
+      Total: 4493.11 H/s                         整机算力（benchmark 模式）
+      accepted: 1/2 (50.00%), 4490.02 H/s (booooo)   份额：n/m = 接受/总数，yay / booooo
+      Stratum requested work restart / Stratum detected new block   新任务
+    """
+
+    impl = "cpuminer"
+
+    THREAD_RE = re.compile(
+        rf"(?:CPU #|thread )(?P<thread>\d+):\s*(?:\d+ hashes,\s*)?(?P<val>\d+(?:\.\d+)?)\s*(?P<unit>{UNIT})"
+    )
+    SUBMIT_RE = re.compile(
+        rf"accepted:\s*(?P<ok>\d+)/(?P<total>\d+)"
+        rf"(?:\s*\([\d.]+%\))?(?:,\s*(?P<val>\d+(?:\.\d+)?)\s*(?P<unit>{UNIT}))?"
+        rf"(?:\s*\((?P<verdict>yay|boo)\w*!*\))?",
+        re.IGNORECASE,
+    )
+    TOTAL_RE = re.compile(rf"Total:\s*(?P<val>\d+(?:\.\d+)?)\s*(?P<unit>{UNIT})")
+    DIFF_RE = re.compile(r"Stratum difficulty set to (?P<diff>[\d.]+)")
+
+    def parse(self, line: str) -> list[dict]:
+        events = []
+        if "/s" in line:
+            m = self.THREAD_RE.search(line)
+            if m:
+                events.append(hashrate_event(
+                    m.group("val"), m.group("unit"),
+                    scope="thread", thread=int(m.group("thread")),
+                ))
+                return events
+            m = self.TOTAL_RE.search(line)
+            if m:
+                events.append(hashrate_event(m.group("val"), m.group("unit")))
+                return events
+
+        if "ccepted:" in line:
+            m = self.SUBMIT_RE.search(line)
+            if m:
+                ok, total = int(m.group("ok")), int(m.group("total"))
+                verdict = (m.group("verdict") or "").lower()
+                events.append(share_event(
+                    verdict != "boo",
+                    accepted_total=ok, rejected_total=max(0, total - ok),
+                ))
+                if m.group("val"):
+                    events.append(hashrate_event(m.group("val"), m.group("unit")))
+                return events
+
+        if "Stratum" in line:
+            if "work restart" in line or "new block" in line:
+                events.append(job_event())
+                return events
+            m = self.DIFF_RE.search(line)
+            if m:
+                events.append(job_event(diff=_num(m.group("diff"))))
+                return events
+
+        self._parse_conn(line, events)
+        return events
+
+
+class XmrigParser(OutputParser):
+    """
+    XMRig：
+      miner    speed 10s/60s/15m 16843.2 16790.5 n/a H/s max 16901.7 H/s
+      cpu      accepted (5/0) diff 120001 (45 ms)           括号里是 接受/拒绝 累计
+      cpu      rejected (5/1) diff 120001 "Low difficulty share" (52 ms)
+      net      new job from pool:3333 diff 120001 algo rx/0 height 3321456
+      randomx  allocated 2336 MB (2080+256) huge pages 100% 1168/1168 +JIT
+    """
+
+    impl = "xmrig"
+
+    SPEED_RE = re.compile(
+        rf"speed\s+(?P<labels>[\w/]+)\s+(?P<a>[\d.]+|n/a)\s+(?P<b>[\d.]+|n/a)\s+(?P<c>[\d.]+|n/a)\s+(?P<unit>{UNIT})"
+    )
+    RESULT_RE = re.compile(
+        r"(?P<verdict>accepted|rejected)\s+\((?P<ok>\d+)/(?P<bad>\d+)\)\s+diff\s+(?P<diff>\d+)"
+        r'(?:\s+"(?P<reason>[^"]*)")?(?:\s+\((?P<ms>\d+)\s*ms\))?'
+    )
+    JOB_RE = re.compile(
+        r"new job from\s+(?P<pool>\S+)\s+diff\s+(?P<diff>\d+)(?:.*?height\s+(?P<height>\d+))?"
+    )
+
+    def parse(self, line: str) -> list[dict]:
+        events = []
+        if "speed" in line:
+            m = self.SPEED_RE.search(line)
+            if m:
+                windows = m.group("labels").split("/")
+                for window, val in zip(windows, (m.group("a"), m.group("b"), m.group("c"))):
+                    if val != "n/a":
+                        events.append(hashrate_event(val, m.group("unit"), window=window))
+                return events
+
+        if "accepted (" in line or "rejected (" in line:
+            m = self.RESULT_RE.search(line)
+            if m:
+                reason = m.group("reason")
+                events.append(share_event(
+                    m.group("verdict") == "accepted",
+                    stale="stale" in (reason or "").lower(),
+                    latency_ms=int(m.group("ms")) if m.group("ms") else None,
+                    diff=int(m.group("diff")),
+                    reason=reason,
+                    accepted_total=int(m.group("ok")),
+                    rejected_total=int(m.group("bad")),
+                ))
+                return events
+
+        if "new job" in line:
+            m = self.JOB_RE.search(line)
+            if m:
+                events.append(job_event(m.group("pool"), int(m.group("diff")), _num(m.group("height"))))
+                return events
+
+        if "huge pages" in line:
+            m = HUGEPAGES_RE.search(line)
+            if m:
+                events.append({
+                    "type": "huge_pages",
+                    "kind": "threads" if "threads" in line.lower() else "dataset",
+                    "percent": int(m.group("pct")),
+                    "allocated": int(m.group("ok")),
+                    "total": int(m.group("total")),
+                })
+                return events
+
+        self._parse_conn(line, events)
+        return events
+
+
+class SrbminerParser(OutputParser):
+    """
+    SRBMiner-MULTI：
+      Total hashrate 10s/60s/1h: 4.493 KH/s 4.490 KH/s 4.480 KH/s
+      CPU0  |  281.43 H/s                         单设备表格行
+      CPU result accepted [45ms] / CPU result rejected [Low difficulty share] [52ms]
+      CPU result stale [60ms]
+      New job received [pool:8888] [diff 10000] [height 123456]
+    没有累计份额数，由 LogRing 按事件自己累计。
+    """
+
+    impl = "srbminer"
+
+    TOTAL_RE = re.compile(
+        rf"Total hashrate\s+(?P<labels>[\w/]+):?\s+(?P<a>[\d.]+)\s*(?P<ua>{UNIT})"
+        rf"(?:\s*\|?\s*(?P<b>[\d.]+)\s*(?P<ub>{UNIT}))?(?:\s*\|?\s*(?P<c>[\d.]+)\s*(?P<uc>{UNIT}))?",
+        re.IGNORECASE,
+    )
+    DEVICE_RE = re.compile(
+        rf"\b(?:CPU|GPU)(?P<thread>\d+)\s*[|:]\s*(?P<val>[\d.]+)\s*(?P<unit>{UNIT})"
+    )
+    RESULT_RE = re.compile(
+        r"result\s+(?P<verdict>accepted|rejected|stale)"
+        r"(?:\s*\[(?P<reason>[^\]]*[^\d\]ms][^\]]*)\])?(?:\s*\[(?P<ms>\d+)\s*ms\])?",
+        re.IGNORECASE,
+    )
+    JOB_RE = re.compile(
+        r"(?:new )?job received(?:.*?\[(?P<pool>[^\]\s]+:\d+)\])?"
+        r"(?:.*?diff\s+(?P<diff>[\d.]+))?(?:.*?height\s+(?P<height>\d+))?",
+        re.IGNORECASE,
+    )
+
+    def parse(self, line: str) -> list[dict]:
+        events = []
+        if "/s" in line:
+            m = self.TOTAL_RE.search(line)
+            if m:
+                windows = m.group("labels").split("/")
+                vals = [(m.group("a"), m.group("ua")), (m.group("b"), m.group("ub")),
+                        (m.group("c"), m.group("uc"))]
+                for window, (val, unit) in zip(windows, vals):
+                    if val:
+                        events.append(hashrate_event(val, unit, window=window))
+                return events
+            m = self.DEVICE_RE.search(line)
+            if m:
+                events.append(hashrate_event(
+                    m.group("val"), m.group("unit"),
+                    scope="thread", thread=int(m.group("thread")),
+                ))
+                return events
+
+        if "result" in line:
+            m = self.RESULT_RE.search(line)
+            if m:
+                verdict = m.group("verdict").lower()
+                events.append(share_event(
+                    verdict == "accepted",
+                    stale=verdict == "stale",
+                    latency_ms=int(m.group("ms")) if m.group("ms") else None,
+                    reason=m.group("reason"),
+                ))
+                return events
+
+        if "job received" in line.lower():
+            m = self.JOB_RE.search(line)
+            events.append(job_event(
+                m.group("pool"), _num(m.group("diff")), _num(m.group("height"))
+            ) if m else job_event())
+            return events
+
+        self._parse_conn(line, events)
+        return events
+
+
+PARSERS = {
+    "cpuminer": CpuminerParser,
+    "xmrig": XmrigParser,
+    "srbminer": SrbminerParser,
+}
+
+
+def get_parser(impl: str | None) -> OutputParser:
+    """按 miner.impl 取解析器，未知实现用通用解析器。"""
+    return PARSERS.get(impl or "", OutputParser)()
+
+
+# =========================================================
+# 样例输出 + 吞吐测试
+# =========================================================
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "miner_output"
+)
+
+
+def load_fixture(impl: str, fixtures_dir: str = FIXTURES_DIR) -> list[str]:
+    with open(os.path.join(fixtures_dir, f"{impl}.log"), "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def bench_parser(parser: OutputParser, lines: list[str], min_seconds: float = 1.0) -> dict:
+    """重复解析 lines 至少 min_seconds 秒，返回 {"lines", "seconds", "lines_per_sec"}。"""
+    parse = parser.parse
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        for line in lines:
+            parse(line)
+        n += len(lines)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds:
+            break
+    return {"lines": n, "seconds": elapsed, "lines_per_sec": n / elapsed}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="矿工输出解析器：样例统计 + 吞吐测试")
+    ap.add_argument("--fixtures", default=FIXTURES_DIR, help="样例输出目录（<impl>.log）")
+    ap.add_argument("--seconds", type=float, default=1.0, help="每个解析器的测试时长")
+    args = ap.parse_args(argv)
+
+    for impl in PARSERS:
+        try:
+            lines = load_fixture(impl, args.fixtures)
+        except OSError as e:
+            print(f"{impl}: 读取样例失败 {e}", file=sys.stderr)
+            continue
+        parser = get_parser(impl)
+        counts: dict[str, int] = {}
+        for line in lines:
+            for ev in parser.parse(line):
+                counts[ev["type"]] = counts.get(ev["type"], 0) + 1
+        result = bench_parser(parser, lines, args.seconds)
+        summary = ", ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+        print(f"{impl:9s} {len(lines):4d} 行  {summary}")
+        print(f"{'':9s} {result['lines_per_sec']:,.0f} 行/秒")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,229 @@
+# scash_manager/pools.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Optional
+
+
+"""
+pools.py
+
+多矿池地址：延迟探测 + 故障切换。
+
+- miner.pools 是有序列表（为空时只用 miner.url）；
+- 后台线程定期用 asyncio 并发探测每个矿池：TCP 建连耗时 + 发一条
+  mining.subscribe 到收到第一行回复的往返时间；
+- 启动 Miner 时选延迟最低的健康矿池；
+- Watchdog 在矿工输出里看到连续的连接错误时调用 failover()：
+  当前矿池进入冷却期，换到下一个最优的。
+
+延迟越高，份额越容易过期（stale），选最近的矿池就是实打实的收益。
+"""
+
+
+def pool_list(mcfg: dict) -> list[str]:
+    """配置里的矿池列表：miner.pools 优先，没有就是 [miner.url]。"""
+    pools = [p for p in (mcfg.get("pools") or []) if p]
+    if pools:
+        return pools
+    return [mcfg["url"]] if mcfg.get("url") else []
+
+
+def _hostport(url: str) -> tuple[str, int]:
+    hostport = url.split("://", 1)[-1].strip().rstrip("/")
+    host, _, port = hostport.rpartition(":")
+    return host, int(port)
+
+
+async def _probe_one(url: str, timeout: float) -> dict:
+    result = {
+        "url": url,
+        "ok": False,
+        "connect_ms": None,
+        "subscribe_ms": None,
+        "error": None,
+        "ts": time.time(),
+    }
+    try:
+        host, port = _hostport(url)
+    except ValueError:
+        result["error"] = "地址格式错误"
+        return result
+
+    t0 = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        result["error"] = f"连接失败: {e or '超时'}"
+        return result
+    result["connect_ms"] = (time.perf_counter() - t0) * 1000
+    result["ok"] = True
+
+    # 比特币风格矿池会回 subscribe 结果；RandomX 系矿池一般回一条错误，
+    # 这里只关心往返时间，内容不管
+    try:
+        req = {"id": 1, "method": "mining.subscribe", "params": ["scash-manager-probe"]}
+        t1 = time.perf_counter()
+        writer.write((json.dumps(req) + "\n").encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if line:
+            result["subscribe_ms"] = (time.perf_counter() - t1) * 1000
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+    return result
+
+
+def probe_pools(urls: list[str], timeout: float = 3) -> list[dict]:
+    """并发探测所有矿池，总耗时约等于最慢的那个（最多 2 * timeout）。"""
+    if not urls:
+        return []
+
+    async def _all():
+        return await asyncio.gather(*(_probe_one(u, timeout) for u in urls))
+
+    return list(asyncio.run(_all()))
+
+
+def latency_ms(result: dict) -> Optional[float]:
+    """排序用的延迟：优先 subscribe 往返，其次 TCP 建连。"""
+    if not result.get("ok"):
+        return None
+    if result.get("subscribe_ms") is not None:
+        return result["subscribe_ms"]
+    return result.get("connect_ms")
+
+
+class PoolSelector:
+    """
+    在多个矿池之间选择：
+    - current()：当前使用的矿池（第一次调用时选延迟最低的健康矿池）；
+    - choose()：重新选一次（Miner 每次启动时调用）；第一轮探测结果出来之前按配置顺序选；
+    - failover()：当前矿池进入冷却期，切到下一个。
+    """
+
+    def __init__(self, urls: list[str], probe_interval: float = 300, timeout: float = 3,
+                 cooldown: float = 600):
+        self.urls = list(urls)
+        self.probe_interval = max(30.0, float(probe_interval))
+        self.timeout = timeout
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._results: dict[str, dict] = {}
+        self._bad_until: dict[str, float] = {}
+        self._current: Optional[str] = None
+        self.failovers = 0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # =========================================================
+    # 探测
+    # =========================================================
+
+    def start(self):
+        """
+        只起后台线程，第一轮探测也在线程里做：start() 是在实例锁里、
+        甚至是 GET /api/status 里调用的，不能在这里等 DNS / TCP。
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def probe_now(self) -> list[dict]:
+        try:
+            results = probe_pools(self.urls, self.timeout)
+        except Exception as e:
+            logging.warning("[Pools] 探测矿池失败: %s", e)
+            return []
+        with self._lock:
+            for r in results:
+                self._results[r["url"]] = r
+        logging.info(
+            "[Pools] 探测结果: %s",
+            ", ".join(
+                f"{r['url']}={latency_ms(r):.0f}ms" if r["ok"] else f"{r['url']}=不可用"
+                for r in results
+            ),
+        )
+        return results
+
+    def run(self):
+        self.probe_now()
+        while not self._stop_event.wait(self.probe_interval):
+            self.probe_now()
+
+    # =========================================================
+    # 选择 / 切换
+    # =========================================================
+
+    def _ranked(self) -> list[str]:
+        """可用矿池按延迟排序（调用方持有 _lock）；没有探测结果的按配置顺序排在后面。"""
+        now = time.time()
+        usable = [u for u in self.urls if self._bad_until.get(u, 0) <= now]
+        if not usable:
+            # 全在冷却期：不挑了，按配置顺序来
+            usable = list(self.urls)
+
+        def key(u):
+            r = self._results.get(u)
+            lat = latency_ms(r) if r else None
+            if r is not None and not r["ok"]:
+                return (2, 0, self.urls.index(u))
+            if lat is None:
+                return (1, 0, self.urls.index(u))
+            return (0, lat, self.urls.index(u))
+
+        return sorted(usable, key=key)
+
+    def choose(self) -> Optional[str]:
+        with self._lock:
+            ranked = self._ranked()
+            self._current = ranked[0] if ranked else None
+            return self._current
+
+    def current(self) -> Optional[str]:
+        with self._lock:
+            if self._current is None:
+                ranked = self._ranked()
+                self._current = ranked[0] if ranked else None
+            return self._current
+
+    def failover(self, reason: str = "") -> Optional[str]:
+        """当前矿池冷却 cooldown 秒，返回新选中的矿池。"""
+        with self._lock:
+            old = self._current
+            if old is not None:
+                self._bad_until[old] = time.time() + self.cooldown
+            ranked = self._ranked()
+            self._current = ranked[0] if ranked else None
+            self.failovers += 1
+            new = self._current
+        logging.warning("[Pools] 矿池故障切换: %s → %s（%s）", old, new, reason or "连接错误")
+        return new
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "current": self._current,
+                "failovers": self.failovers,
+                "pools": [
+                    {
+                        **(self._results.get(u) or {"url": u}),
+                        "latency_ms": latency_ms(self._results[u]) if u in self._results else None,
+                        "cooldown_left": max(0.0, self._bad_until.get(u, 0) - now),
+                    }
+                    for u in self.urls
+                ],
+            }
@@ -0,0 +1,174 @@
+# scash_manager/proctree.py
+import logging
+import os
+import select
+import signal
+
+
+"""
+proctree.py
+
+只针对我们自己启动的 Miner 进程树做清理，不扫描整台机器：
+
+- 从 /proc/<pid>/task/<tid>/children 递归读出 Miner 的所有子孙进程
+  （开销只和进程树大小有关，和宿主机进程数无关）；
+  内核没开 CONFIG_PROC_CHILDREN（没有 children 文件）时，退而扫一遍
+  /proc/<pid>/stat 按父进程建树，只在停止 Miner 时做一次；
+- 每个进程优先拿一个 pidfd（Linux 5.3+），之后通过 pidfd 发信号，
+  进程退出后 PID 被复用也不会误杀别的进程；
+  拿不到 pidfd 时用 /proc/<pid>/stat 里的启动时间核对身份。
+
+Miner 本身放在独立的进程组里（见 Miner._preexec），进程组 + 这里的 PID 快照
+可以覆盖「子进程自己 setsid 脱离进程组」的情况。
+"""
+
+
+PROC_ROOT = "/proc"
+
+
+def children(pid: int, proc_root: str = PROC_ROOT) -> list[int]:
+    """pid 的直接子进程（所有线程的 children 合并）；内核不支持 / 进程已退出时返回 []。"""
+    out = []
+    task_dir = os.path.join(proc_root, str(pid), "task")
+    try:
+        tids = os.listdir(task_dir)
+    except OSError:
+        return out
+    for tid in tids:
+        try:
+            with open(os.path.join(task_dir, tid, "children"), "r", encoding="ascii") as f:
+                out.extend(int(x) for x in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def _children_supported(pid: int, proc_root: str = PROC_ROOT) -> bool:
+    return os.path.exists(os.path.join(proc_root, str(pid), "task", str(pid), "children"))
+
+
+def _children_by_ppid(proc_root: str = PROC_ROOT) -> dict[int, list[int]]:
+    """{ppid: [pid, ...]}，从每个 /proc/<pid>/stat 的第 4 个字段读父进程。"""
+    tree: dict[int, list[int]] = {}
+    try:
+        names = os.listdir(proc_root)
+    except OSError:
+        return tree
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_root, name, "stat"), "r", encoding="utf-8",
+                      errors="replace") as f:
+                data = f.read()
+            ppid = int(data[data.rfind(")") + 2:].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        tree.setdefault(ppid, []).append(int(name))
+    return tree
+
+
+def descendants(pid: int, proc_root: str = PROC_ROOT) -> list[int]:
+    """pid 的所有子孙进程（广度优先，不含 pid 自己）。"""
+    by_ppid = None if _children_supported(pid, proc_root) else _children_by_ppid(proc_root)
+    seen = set()
+    order = []
+    queue = [pid]
+    while queue:
+        cur = queue.pop(0)
+        kids = children(cur, proc_root) if by_ppid is None else by_ppid.get(cur, [])
+        for child in kids:
+            if child not in seen and child != pid:
+                seen.add(child)
+                order.append(child)
+                queue.append(child)
+    return order
+
+
+def start_time(pid: int, proc_root: str = PROC_ROOT) -> int | None:
+    """/proc/<pid>/stat 第 22 个字段（启动时间，clock ticks），用来识别 PID 复用。"""
+    try:
+        with open(os.path.join(proc_root, str(pid), "stat"), "r", encoding="utf-8",
+                  errors="replace") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # comm 可能带空格 / 括号，从最后一个 ')' 之后开始数（第 3 个字段起）
+    fields = data[data.rfind(")") + 2:].split()
+    try:
+        return int(fields[19])
+    except (IndexError, ValueError):
+        return None
+
+
+class ProcessTree:
+    """
+    某一时刻 Miner 进程树的快照：[(pid, start_time, pidfd)]。
+    用完要 close()（关掉 pidfd）。
+    """
+
+    def __init__(self, members: list[tuple[int, int | None, int | None]]):
+        self.members = members
+
+    @classmethod
+    def snapshot(cls, root_pid: int, proc_root: str = PROC_ROOT) -> "ProcessTree":
+        members = []
+        for pid in [root_pid] + descendants(root_pid, proc_root):
+            st = start_time(pid, proc_root)
+            if st is None:
+                continue
+            fd = None
+            if hasattr(os, "pidfd_open"):
+                try:
+                    fd = os.pidfd_open(pid)
+                except OSError:
+                    fd = None
+            # 拿 pidfd 之前进程可能刚好退出、PID 被复用：再核对一次
+            if start_time(pid, proc_root) != st:
+                if fd is not None:
+                    os.close(fd)
+                continue
+            members.append((pid, st, fd))
+        return cls(members)
+
+    def pids(self) -> list[int]:
+        return [pid for pid, _, _ in self.members]
+
+    def _alive(self, pid: int, st: int | None, fd: int | None) -> bool:
+        if fd is not None:
+            # 进程退出后 pidfd 变为可读
+            p = select.poll()
+            p.register(fd, select.POLLIN)
+            return not p.poll(0)
+        return start_time(pid) == st
+
+    def alive(self) -> list[int]:
+        """快照里仍然存活（且还是同一个进程）的 PID。"""
+        return [pid for pid, st, fd in self.members if self._alive(pid, st, fd)]
+
+    def signal(self, sig: int, skip: tuple = ()) -> list[int]:
+        """给快照里仍存活的进程发信号，返回实际发送了的 PID。"""
+        sent = []
+        for pid, st, fd in self.members:
+            if pid in skip or not self._alive(pid, st, fd):
+                continue
+            try:
+                if fd is not None and hasattr(signal, "pidfd_send_signal"):
+                    signal.pidfd_send_signal(fd, sig)
+                else:
+                    os.kill(pid, sig)
+                sent.append(pid)
+            except ProcessLookupError:
+                pass
+            except OSError as e:
+                logging.warning("[ProcTree] 向 pid=%s 发送信号 %s 失败: %s", pid, sig, e)
+        return sent
+
+    def close(self):
+        for _, _, fd in self.members:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.members = []
@@ -0,0 +1,92 @@
+# scash_manager/sampler.py
+import logging
+import threading
+import time
+
+
+class MetricsSampler:
+    """
+    后台采样线程（和 HTTP 请求解耦，没人打开页面也照常记录）：
+
+    - 每 interval 秒调用一次 collect() 拿到当前指标；
+    - 依次交给 sinks（例如内存里的 24h 曲线）；
+    - 如果有 HistoryStore，再写入磁盘上的降采样时间序列，
+      并每隔 prune_interval 秒清理一次过期数据。
+
+    collect() 返回 dict：{"hs", "accepted", "rejected", "restarts"}，
+    hs 为 None 表示还没解析到算力（不写入 HistoryStore）；整体返回 None 表示这次不记录。
+    sink 的签名是 sink(ts, metrics)。
+    """
+
+    def __init__(self, collect, interval: int = 10, store=None, sinks=None,
+                 prune_interval: int = 600):
+        self.collect = collect
+        self.interval = max(1, int(interval))
+        self.store = store
+        self.sinks = list(sinks or [])
+        self.prune_interval = prune_interval
+
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # =========================================================
+    # 外部接口
+    # =========================================================
+
+    def start(self):
+        """启动采样线程（只允许启动一次）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        logging.info("[Sampler] 已启动，采样间隔=%ss", self.interval)
+
+    def stop(self):
+        """停止采样线程"""
+        logging.info("[Sampler] 收到 stop 信号")
+        self._stop_event.set()
+
+    # =========================================================
+    # 主循环
+    # =========================================================
+
+    def sample_once(self, now: int | None = None):
+        """采一次样并写入存储。"""
+        if now is None:
+            now = int(time.time())
+        m = self.collect()
+        if m is None:
+            return
+
+        for sink in self.sinks:
+            try:
+                sink(now, m)
+            except Exception as e:
+                logging.error("[Sampler] sink 处理失败: %s", e)
+
+        # 还没解析到算力不是 0 H/s：记成 0 会把各层的平均 / 最小值拉低，曲线上多出假的低谷
+        if self.store is not None and m.get("hs") is not None:
+            self.store.record(
+                now,
+                float(m["hs"]),
+                int(m.get("accepted") or 0),
+                int(m.get("rejected") or 0),
+                int(m.get("restarts") or 0),
+            )
+
+    def run(self):
+        last_prune = 0.0
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample_once()
+
+                mono = time.monotonic()
+                if self.store is not None and mono - last_prune >= self.prune_interval:
+                    self.store.prune()
+                    last_prune = mono
+            except Exception as e:
+                logging.error("[Sampler] 采样失败: %s", e)
+
+        logging.info("[Sampler] run() 线程已退出")
@@ -0,0 +1,156 @@
+# scash_manager/stats.py
+import math
+import threading
+import time
+from collections import deque
+
+
+def humanize_hs(v: float | None) -> str | None:
+    """把 H/s 数值格式化为 '123.45 H/s'，如果为 None 则返回 None。"""
+    if v is None:
+        return None
+    return f"{v:.2f} H/s"
+
+
+class RollingHashrate:
+    """
+    算力历史 + 滚动统计（固定长度环形缓冲）：
+
+    - 每 min_interval 秒一个点，最多 maxlen 个点；
+    - 同一个时间段内的多次采样只更新“当前点”（最后一个点）；
+    - 平均值 / EWMA / 最小 / 最大 / 方差 在写入时增量维护，读取是 O(1)；
+    - 只有画曲线时才需要 points() 把整段历史展开。
+
+    实现上把历史分成两部分：
+    - 已封口的点：deque 里，和对应的累加量（sum / sumsq / 单调队列求 min/max）；
+    - 当前点：还会被覆盖，读统计时再和已封口部分合并。
+    """
+
+    def __init__(self, maxlen: int = 600, min_interval: int = 180, alpha: float = 0.3):
+        self.maxlen = max(2, int(maxlen))
+        self.min_interval = min_interval
+        self.alpha = alpha
+
+        self._lock = threading.Lock()
+
+        # 已封口的点：(idx, ts, hs, ewma)
+        self._points: deque = deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._ewma = None               # 最后一个封口点上的 EWMA
+        self._min_q: deque = deque()    # (idx, hs)，hs 单调递增
+        self._max_q: deque = deque()    # (idx, hs)，hs 单调递减
+        self._next_idx = 0
+
+        # 当前点：(ts, hs) 或 None
+        self._open = None
+
+    # =========================================================
+    # 写入
+    # =========================================================
+
+    def add(self, hs: float, now: int | None = None):
+        """写入一次采样（不足 min_interval 时覆盖当前点）。"""
+        if now is None:
+            now = int(time.time())
+        hs = float(hs)
+
+        with self._lock:
+            if self._open is None:
+                self._open = (now, hs)
+            elif now - self._open[0] < self.min_interval:
+                self._open = (self._open[0], hs)
+            else:
+                self._commit(*self._open)
+                self._open = (now, hs)
+
+    def _commit(self, ts: int, hs: float):
+        """把当前点封口，追加到环里（调用方持有 _lock）。"""
+        idx = self._next_idx
+        self._next_idx += 1
+
+        if self._ewma is None:
+            self._ewma = hs
+        else:
+            self._ewma = self.alpha * hs + (1 - self.alpha) * self._ewma
+
+        self._points.append((idx, ts, hs, self._ewma))
+        self._sum += hs
+        self._sumsq += hs * hs
+
+        while self._min_q and self._min_q[-1][1] >= hs:
+            self._min_q.pop()
+        self._min_q.append((idx, hs))
+        while self._max_q and self._max_q[-1][1] <= hs:
+            self._max_q.pop()
+        self._max_q.append((idx, hs))
+
+        # 当前点也占一个名额，所以封口部分最多 maxlen - 1 个
+        if len(self._points) > self.maxlen - 1:
+            old_idx, _, old_hs, _ = self._points.popleft()
+            self._sum -= old_hs
+            self._sumsq -= old_hs * old_hs
+            if self._min_q and self._min_q[0][0] == old_idx:
+                self._min_q.popleft()
+            if self._max_q and self._max_q[0][0] == old_idx:
+                self._max_q.popleft()
+
+    # =========================================================
+    # 读取
+    # =========================================================
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._points) + (1 if self._open else 0)
+
+    def summary(self) -> dict | None:
+        """
+        O(1) 统计：
+        {"count", "last_hs", "avg_hs", "ewma_hs", "min_hs", "max_hs", "stddev_hs"}
+        没有任何数据时返回 None。
+        """
+        with self._lock:
+            if self._open is None:
+                return None
+
+            _, cur = self._open
+            n = len(self._points) + 1
+            total = self._sum + cur
+            sumsq = self._sumsq + cur * cur
+
+            if self._ewma is None:
+                ewma = cur
+            else:
+                ewma = self.alpha * cur + (1 - self.alpha) * self._ewma
+
+            lo = min(self._min_q[0][1], cur) if self._min_q else cur
+            hi = max(self._max_q[0][1], cur) if self._max_q else cur
+
+        avg = total / n
+        # 浮点累加误差可能让方差略小于 0
+        var = max(0.0, sumsq / n - avg * avg)
+        return {
+            "count": n,
+            "last_hs": cur,
+            "avg_hs": avg,
+            "ewma_hs": ewma,
+            "min_hs": lo,
+            "max_hs": hi,
+            "stddev_hs": math.sqrt(var),
+        }
+
+    def points(self) -> list[dict]:
+        """展开整段历史，供折线图使用：[{ts, hs, ewma_hs}, ...]"""
+        with self._lock:
+            pts = [
+                {"ts": ts, "hs": hs, "ewma_hs": ew}
+                for _, ts, hs, ew in self._points
+            ]
+            if self._open is not None:
+                ts, cur = self._open
+                if self._ewma is None:
+                    ewma = cur
+                else:
+                    ewma = self.alpha * cur + (1 - self.alpha) * self._ewma
+                pts.append({"ts": ts, "hs": cur, "ewma_hs": ewma})
+        return pts
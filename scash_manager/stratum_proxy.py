@@ -0,0 +1,504 @@
+# scash_manager/stratum_proxy.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Optional
+
+from .pools import pool_list
+
+
+"""
+stratum_proxy.py
+
+本地 stratum 代理（可选）：多个 Miner 共用一条到矿池的连接。
+
+- 上游：按 upstreams 列表顺序连接矿池，断线后从第一个重新开始尝试（主池恢复后自动切回）；
+- 下游：每个本地矿工连上来时分到一个 extranonce 前缀：
+    下游 extranonce1 = 上游 extranonce1 + 前缀（prefix_bytes 字节）
+    下游 extranonce2_size = 上游 extranonce2_size - prefix_bytes
+  矿工提交时再把前缀拼回 extranonce2，用代理自己的账号转发给矿池，
+  这样各矿工的搜索空间互不重叠；
+- 每个下游矿工单独统计 accepted / rejected。
+
+只支持比特币风格的 stratum（mining.subscribe / notify / submit），
+也就是 cpuminer 用的协议；XMRig / SRBMiner 的 RandomX login/job 协议不走代理。
+"""
+
+
+def _parse_hostport(url: str) -> tuple[str, int]:
+    """stratum+tcp://host:port / host:port → (host, port)"""
+    hostport = url.split("://", 1)[-1].strip().rstrip("/")
+    host, _, port = hostport.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"无效的矿池地址: {url}")
+    return host, int(port)
+
+
+class _Worker:
+    """一个下游矿工连接。"""
+
+    def __init__(self, session_id: int, writer: asyncio.StreamWriter, peer: str):
+        self.session_id = session_id
+        self.writer = writer
+        self.peer = peer
+        self.name: Optional[str] = None
+        self.prefix: Optional[int] = None
+        self.prefix_gen = 0          # 分配前缀时的代数，前缀长度变化后旧前缀作废
+        self.subscribed = False
+        self.extranonce_subscribed = False
+        self.accepted = 0
+        self.rejected = 0
+        self.connected_at = time.time()
+        self.last_share_at: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        return {
+            "session": self.session_id,
+            "name": self.name,
+            "peer": self.peer,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "connected_at": self.connected_at,
+            "last_share_at": self.last_share_at,
+        }
+
+
+class StratumProxy:
+    """
+    asyncio 实现，跑在自己的后台线程里（start / stop 和其它后台组件一致）。
+    url 是给本地矿工用的地址（_build_cmd 里替换 miner.url）。
+    """
+
+    def __init__(self, upstreams: list[str], user: str, password: str = "x",
+                 listen_host: str = "127.0.0.1", listen_port: int = 3334,
+                 prefix_bytes: int = 1, retry_delay: float = 5, timeout: float = 10):
+        if not upstreams:
+            raise ValueError("stratum 代理至少需要一个上游矿池")
+        self.upstreams = list(upstreams)
+        self.user = user
+        self.password = password
+        self.listen_host = listen_host
+        self.listen_port = int(listen_port)
+        self.prefix_bytes = max(0, int(prefix_bytes))
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+        # 上游状态（只在事件循环线程里修改）
+        self.upstream_url: Optional[str] = None
+        self._up_writer: Optional[asyncio.StreamWriter] = None
+        self._extranonce1 = ""
+        self._extranonce2_size = 0
+        self._prefix_len = 0         # 实际使用的前缀字节数
+        self._difficulty = None      # 最近一次 set_difficulty 的参数
+        self._notify = None          # 最近一次 notify 的参数（新矿工连上来直接下发）
+        self._next_id = 1
+        self._pending: dict[int, asyncio.Future] = {}
+        self._ready: Optional[asyncio.Event] = None
+
+        self._workers: dict[int, _Worker] = {}
+        self._next_session = 1
+        self._free_prefixes: list[int] = []
+        self._next_prefix = 0
+        self._prefix_gen = 0
+
+        # 统计（跨线程读取，用锁保护）
+        self._stats_lock = threading.Lock()
+        self._accepted = 0
+        self._rejected = 0
+        self._failovers = 0
+        self._finished_workers: dict[str, list[int]] = {}   # name → [accepted, rejected]
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopping = False
+
+    # =========================================================
+    # 外部接口（任意线程调用）
+    # =========================================================
+
+    @property
+    def url(self) -> str:
+        return f"stratum+tcp://{self.listen_host}:{self.listen_port}"
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+        self._thread.start()
+        # 等监听端口就绪，避免 Miner 抢先连上来被拒
+        started.wait(timeout=5)
+
+    def stop(self):
+        self._stopping = True
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._shutdown)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            workers = [w.snapshot() for w in list(self._workers.values())]
+            finished = {k: list(v) for k, v in self._finished_workers.items()}
+            return {
+                "listen": self.url,
+                "upstream": self.upstream_url,
+                "connected": self._up_writer is not None,
+                "upstreams": list(self.upstreams),
+                "failovers": self._failovers,
+                "accepted": self._accepted,
+                "rejected": self._rejected,
+                "workers": workers,
+                # 已断开的矿工按名字累计
+                "finished_workers": [
+                    {"name": k, "accepted": a, "rejected": r} for k, (a, r) in finished.items()
+                ],
+            }
+
+    # =========================================================
+    # 事件循环
+    # =========================================================
+
+    def _run(self, started: threading.Event):
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main(started))
+        except Exception:
+            logging.exception("[StratumProxy] 事件循环异常退出")
+        finally:
+            started.set()
+            loop.close()
+            self._loop = None
+            logging.info("[StratumProxy] 已停止")
+
+    async def _main(self, started: threading.Event):
+        self._ready = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_worker, self.listen_host, self.listen_port
+        )
+        logging.info("[StratumProxy] 监听 %s，上游: %s", self.url, ", ".join(self.upstreams))
+        started.set()
+        try:
+            await self._upstream_loop()
+        except asyncio.CancelledError:
+            pass
+
+    def _shutdown(self):
+        if self._server is not None:
+            self._server.close()
+        for w in list(self._workers.values()):
+            w.writer.close()
+        if self._up_writer is not None:
+            self._up_writer.close()
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+
+    # =========================================================
+    # 上游
+    # =========================================================
+
+    async def _upstream_loop(self):
+        while not self._stopping:
+            for i, url in enumerate(self.upstreams):
+                if self._stopping:
+                    return
+                try:
+                    await self._connect_upstream(url, failover=i > 0)
+                except (OSError, asyncio.TimeoutError, ValueError, ConnectionError) as e:
+                    logging.warning("[StratumProxy] 上游 %s 不可用: %s", url, e)
+                finally:
+                    self._upstream_down()
+            if not self._stopping:
+                await asyncio.sleep(self.retry_delay)
+
+    async def _connect_upstream(self, url: str, failover: bool):
+        host, port = _parse_hostport(url)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout=self.timeout
+        )
+        self._up_writer = writer
+        read_task = asyncio.ensure_future(self._upstream_reader(reader))
+        try:
+            sub = await self._call("mining.subscribe", ["scash-manager-proxy/1.0"])
+            if not isinstance(sub, list) or len(sub) < 3:
+                raise ConnectionError(f"subscribe 返回格式异常: {sub}")
+            ok = await self._call("mining.authorize", [self.user, self.password])
+            if ok is not True:
+                raise ConnectionError("矿池拒绝了 authorize")
+
+            self._set_extranonce(sub[1], int(sub[2]))
+            with self._stats_lock:
+                self.upstream_url = url
+                if failover:
+                    self._failovers += 1
+            self._ready.set()
+            logging.info(
+                "[StratumProxy] 已连接上游 %s，extranonce1=%s，extranonce2_size=%s",
+                url, self._extranonce1, self._extranonce2_size,
+            )
+            await read_task
+        finally:
+            read_task.cancel()
+
+    def _upstream_down(self):
+        if self._ready is not None:
+            self._ready.clear()
+        if self._up_writer is not None:
+            self._up_writer.close()
+        self._up_writer = None
+        with self._stats_lock:
+            self.upstream_url = None
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError("上游连接已断开"))
+        self._pending.clear()
+
+    async def _upstream_reader(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("上游关闭了连接")
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+
+            method = msg.get("method")
+            if method is None:
+                fut = self._pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done():
+                    if msg.get("error"):
+                        fut.set_exception(RuntimeError(str(msg["error"])))
+                    else:
+                        fut.set_result(msg.get("result"))
+                continue
+
+            params = msg.get("params") or []
+            if method == "mining.notify":
+                self._notify = params
+                self._broadcast(method, params)
+            elif method == "mining.set_difficulty":
+                self._difficulty = params
+                self._broadcast(method, params)
+            elif method == "mining.set_extranonce" and len(params) >= 2:
+                self._set_extranonce(params[0], int(params[1]))
+            elif method == "client.reconnect":
+                raise ConnectionError("矿池要求重连")
+
+    async def _call(self, method: str, params: list, timeout: float | None = None):
+        if self._up_writer is None:
+            raise ConnectionError("上游未连接")
+        req_id = self._next_id
+        self._next_id += 1
+        fut = self._loop.create_future()
+        self._pending[req_id] = fut
+        data = json.dumps({"id": req_id, "method": method, "params": params}) + "\n"
+        self._up_writer.write(data.encode())
+        await self._up_writer.drain()
+        return await asyncio.wait_for(fut, timeout=timeout or self.timeout)
+
+    def _set_extranonce(self, extranonce1: str, extranonce2_size: int):
+        """上游 extranonce 变了：能推送的矿工发 set_extranonce，其它的断开让它重连。"""
+        old = (self._extranonce1, self._extranonce2_size)
+        self._extranonce1 = extranonce1
+        self._extranonce2_size = extranonce2_size
+        prefix_len = min(self.prefix_bytes, max(0, extranonce2_size - 2))
+        if (extranonce1, extranonce2_size) == old:
+            return
+
+        if prefix_len != self._prefix_len:
+            # 前缀长度变了，已分配的前缀全部作废，已订阅的矿工断开重连
+            self._prefix_len = prefix_len
+            self._prefix_gen += 1
+            self._free_prefixes.clear()
+            self._next_prefix = 0
+            for w in list(self._workers.values()):
+                if w.prefix is not None:
+                    w.writer.close()
+                    w.prefix = None
+                    w.subscribed = False
+            return
+
+        for w in list(self._workers.values()):
+            if not w.subscribed:
+                continue
+            if w.extranonce_subscribed:
+                self._send(w, {"id": None, "method": "mining.set_extranonce",
+                               "params": [self._worker_extranonce1(w), self._worker_extranonce2_size()]})
+            else:
+                w.writer.close()
+
+    # =========================================================
+    # 下游
+    # =========================================================
+
+    def _alloc_prefix(self) -> Optional[int]:
+        if self._free_prefixes:
+            return self._free_prefixes.pop()
+        if self._next_prefix >= 256 ** self._prefix_len:
+            return None
+        p = self._next_prefix
+        self._next_prefix += 1
+        return p
+
+    def _worker_extranonce1(self, w: _Worker) -> str:
+        if not self._prefix_len:
+            return self._extranonce1
+        return self._extranonce1 + f"{w.prefix:0{self._prefix_len * 2}x}"
+
+    def _worker_extranonce2_size(self) -> int:
+        return self._extranonce2_size - self._prefix_len
+
+    def _send(self, w: _Worker, msg: dict):
+        try:
+            w.writer.write((json.dumps(msg) + "\n").encode())
+        except Exception:
+            w.writer.close()
+
+    def _broadcast(self, method: str, params: list):
+        for w in list(self._workers.values()):
+            if w.subscribed:
+                self._send(w, {"id": None, "method": method, "params": params})
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = "%s:%s" % (writer.get_extra_info("peername") or ("?", "?"))[:2]
+        w = _Worker(self._next_session, writer, peer)
+        self._next_session += 1
+        with self._stats_lock:
+            self._workers[w.session_id] = w
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                await self._handle_worker_msg(w, msg)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            with self._stats_lock:
+                self._workers.pop(w.session_id, None)
+                if w.name:
+                    acc = self._finished_workers.setdefault(w.name, [0, 0])
+                    acc[0] += w.accepted
+                    acc[1] += w.rejected
+            if w.prefix is not None and w.prefix_gen == self._prefix_gen:
+                self._free_prefixes.append(w.prefix)
+            writer.close()
+
+    async def _handle_worker_msg(self, w: _Worker, msg: dict):
+        method = msg.get("method")
+        req_id = msg.get("id")
+        params = msg.get("params") or []
+
+        if method == "mining.subscribe":
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self._send(w, {"id": req_id, "result": None, "error": [20, "上游矿池未连接", None]})
+                return
+            if w.prefix is None:
+                w.prefix = self._alloc_prefix()
+                w.prefix_gen = self._prefix_gen
+                if w.prefix is None:
+                    self._send(w, {"id": req_id, "result": None, "error": [20, "代理下游连接数已满", None]})
+                    return
+            w.subscribed = True
+            sid = f"{w.session_id:08x}"
+            self._send(w, {
+                "id": req_id,
+                "result": [
+                    [["mining.set_difficulty", sid], ["mining.notify", sid]],
+                    self._worker_extranonce1(w),
+                    self._worker_extranonce2_size(),
+                ],
+                "error": None,
+            })
+            if self._difficulty is not None:
+                self._send(w, {"id": None, "method": "mining.set_difficulty", "params": self._difficulty})
+            if self._notify is not None:
+                self._send(w, {"id": None, "method": "mining.notify", "params": self._notify})
+
+        elif method == "mining.authorize":
+            w.name = str(params[0]) if params else f"worker-{w.session_id}"
+            self._send(w, {"id": req_id, "result": True, "error": None})
+
+        elif method == "mining.extranonce.subscribe":
+            w.extranonce_subscribed = True
+            self._send(w, {"id": req_id, "result": True, "error": None})
+
+        elif method == "mining.submit":
+            # 转发不阻塞这个矿工的后续消息
+            asyncio.ensure_future(self._forward_submit(w, req_id, params))
+
+        else:
+            self._send(w, {"id": req_id, "result": None, "error": [20, f"不支持的方法: {method}", None]})
+
+    async def _forward_submit(self, w: _Worker, req_id, params: list):
+        """[worker, job_id, extranonce2, ntime, nonce, ...] → 拼上前缀用代理账号提交。"""
+        error = None
+        ok = False
+        if len(params) < 5 or not w.subscribed:
+            error = [20, "参数错误", None]
+        else:
+            en2 = str(params[2])
+            if self._prefix_len:
+                en2 = f"{w.prefix:0{self._prefix_len * 2}x}" + en2
+            up_params = [self.user, params[1], en2, params[3], params[4], *params[5:]]
+            try:
+                ok = await self._call("mining.submit", up_params) is True
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                error = [20, f"上游不可用: {e}", None]
+            except RuntimeError as e:
+                error = [23, str(e), None]
+
+        with self._stats_lock:
+            w.last_share_at = time.time()
+            if ok:
+                w.accepted += 1
+                self._accepted += 1
+            else:
+                w.rejected += 1
+                self._rejected += 1
+        self._send(w, {"id": req_id, "result": ok, "error": error})
+
+
+def proxy_applies(cfg: dict, proxy: Optional[StratumProxy]) -> bool:
+    """这个实例能否走代理：只有 cpuminer，且钱包和代理的上游账号一致。"""
+    if proxy is None:
+        return False
+    mcfg = cfg.get("miner", {}) or {}
+    if mcfg.get("impl", "cpuminer") != "cpuminer":
+        return False
+    return (cfg.get("wallet") or "") == proxy.user
+
+
+def build_proxy(cfg: dict) -> Optional[StratumProxy]:
+    """按配置的 proxy 块创建代理；未启用或不适用时返回 None。"""
+    pcfg = cfg.get("proxy", {}) or {}
+    mcfg = cfg.get("miner", {}) or {}
+    if not pcfg.get("enabled"):
+        return None
+    upstreams = list(pcfg.get("upstreams") or []) or pool_list(mcfg)
+    wallet = cfg.get("wallet") or ""
+    if not upstreams or not wallet:
+        return None
+    host, port = _parse_hostport(pcfg.get("listen") or "127.0.0.1:3334")
+    return StratumProxy(
+        upstreams,
+        user=wallet,
+        listen_host=host,
+        listen_port=port,
+        prefix_bytes=pcfg.get("prefix_bytes", 1),
+    )
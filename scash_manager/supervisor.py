@@ -0,0 +1,481 @@
+# scash_manager/supervisor.py
+import logging
+import threading
+from copy import deepcopy
+
+from .config import config_ready
+from .health import HealthMonitor
+from .logarchive import LogArchive
+from .logring import DEFAULT_MAX_BYTES as DEFAULT_RING_BYTES, LogRing
+from .miner import Miner
+from .miner_api import MinerApiPoller, api_enabled, api_port
+from .pools import PoolSelector, pool_list
+from .stats import humanize_hs
+from .stratum_proxy import proxy_applies
+from .topology import recommend_layout
+from .watchdog import Watchdog
+
+
+"""
+supervisor.py
+
+多 Miner 实例管理：
+
+- 每个实例有自己的配置块、Miner、Watchdog、卡死检测、日志环形缓冲和（可选的）本地 API 轮询；
+- "default" 实例就是向导里配置的那一个（直接用顶层配置）；
+- 其它实例来自配置里的 instances 列表，例如每个 NUMA 节点一个实例，
+  或者 cpuminer + SRBMiner 各跑一个；
+- Supervisor 负责按名字查找实例，并汇总所有实例的算力 / 份额。
+"""
+
+
+DEFAULT_INSTANCE = "default"
+
+
+def instance_config(base_cfg: dict, block: dict) -> dict:
+    """
+    用顶层配置做底，叠加实例自己的配置块：
+    {"name": "node1", "wallet"?: ..., "coin"?: ..., "miner": {...}, "watchdog": {...},
+     "health": {...}, "host_tuning": {...}}
+    logging 只有顶层一份（日志文件 / 内存缓冲大小对所有实例生效），不进实例配置。
+    """
+    keys = ("wallet", "coin", "miner", "watchdog", "health", "log_archive", "host_tuning")
+    cfg = deepcopy({k: base_cfg.get(k) for k in keys})
+    cfg["miner"] = cfg.get("miner") or {}
+    cfg["watchdog"] = cfg.get("watchdog") or {}
+    cfg["health"] = cfg.get("health") or {}
+    cfg["host_tuning"] = cfg.get("host_tuning") or {}
+
+    for key in ("wallet", "coin"):
+        if block.get(key):
+            cfg[key] = block[key]
+    if isinstance(block.get("miner"), dict):
+        cfg["miner"].update(block["miner"])
+        # 钱包没有单独配置时，user 跟着钱包走
+        if "user" not in block["miner"] and block.get("wallet"):
+            cfg["miner"]["user"] = block["wallet"]
+    if isinstance(block.get("watchdog"), dict):
+        cfg["watchdog"].update(block["watchdog"])
+    if isinstance(block.get("health"), dict):
+        cfg["health"].update(block["health"])
+    if isinstance(block.get("host_tuning"), dict):
+        cfg["host_tuning"].update(block["host_tuning"])
+    return cfg
+
+
+class MinerInstance:
+    """
+    单个 Miner 实例：配置 + Miner + Watchdog + 日志缓冲。
+
+    log_cb 默认写入自己的 ring；default 实例会传入 webapp.push_log，
+    这样日志还能推送给 /api/stream。
+    """
+
+    def __init__(self, name: str, cfg: dict, ring: LogRing | None = None, log_cb=None):
+        self.name = name
+        self.cfg = cfg
+        # 额外实例自己的配置块（instance_config 的 block），default 实例为 None
+        self.block: dict | None = None
+        # LogRing 定义了 __len__，空缓冲为假值，不能用 `ring or ...`
+        self.ring = ring if ring is not None else LogRing(prefix=name)
+        self.log_cb = log_cb or self.ring.push
+        # 日志持久化归档（按时间 / 关键字查询历史日志）
+        self.archive = LogArchive.from_config(cfg.get("log_archive"), name)
+        if self.archive is not None:
+            self.archive.start()
+            self.ring.archive = self.archive
+
+        self.miner: Miner | None = None
+        self.watchdog: Watchdog | None = None
+        self.api_poller: MinerApiPoller | None = None
+        self.health: HealthMonitor | None = None
+        # 本地 stratum 代理（webapp 统一创建），不适用于本实例时忽略
+        self.proxy = None
+        self.pool_selector: PoolSelector | None = None
+        # Miner 状态变化时回调 cb(name, state)（webapp 推送给 /api/stream）
+        self.state_observer = None
+
+        self._lock = threading.RLock()
+
+    # =========================================================
+    # 生命周期
+    # =========================================================
+
+    def ensure(self, force: bool = False):
+        """
+        在配置完整的前提下，懒加载 Miner / Watchdog / API 轮询。
+        force=True 时会先重建对象（例如 /api/setup 之后）。
+        """
+        with self._lock:
+            if not config_ready(self.cfg):
+                return
+
+            if force:
+                self.miner = None
+                self.watchdog = None
+                self._stop_api_poller()
+                self._stop_pool_selector()
+                self._stop_health()
+
+            if self.miner is None:
+                self.miner = Miner(self.cfg, log_cb=self.log_cb)
+                self.miner.add_state_listener(self._on_miner_state)
+            # 下次启动时生效；本地矿工用实例名区分，方便代理按实例统计份额
+            if proxy_applies(self.cfg, self.proxy):
+                self.miner.pool_override = {"url": self.proxy.url, "user": self.name}
+            else:
+                self.miner.pool_override = None
+
+            # 多个矿池：探测延迟，启动时选最优（走代理时由代理负责上游切换）
+            mcfg = self.cfg.get("miner", {}) or {}
+            # 日志解析器跟着 miner.impl 走（setup 里可能换了实现）
+            self.ring.set_parser(mcfg.get("impl", "cpuminer"))
+            pools = pool_list(mcfg)
+            if self.miner.pool_override is None and len(pools) > 1:
+                if self.pool_selector is None:
+                    self.pool_selector = PoolSelector(
+                        pools, probe_interval=mcfg.get("pool_probe_interval", 300)
+                    )
+                    self.pool_selector.start()
+            else:
+                self._stop_pool_selector()
+            self.miner.pool_selector = self.pool_selector
+
+            mcfg = self.cfg.get("miner", {}) or {}
+            if self.api_poller is None and api_enabled(mcfg):
+                acfg = mcfg.get("api", {}) or {}
+                self.api_poller = MinerApiPoller(
+                    mcfg.get("impl", "cpuminer"),
+                    api_port(mcfg),
+                    interval=acfg.get("poll_interval", 5),
+                )
+                self.api_poller.start()
+
+            if self.watchdog is None:
+                self.watchdog = self._new_watchdog()
+                self.watchdog.start()
+
+            if self.health is None:
+                self.health = HealthMonitor(
+                    self.ring, self.miner, self.cfg, on_trigger=self._on_health
+                )
+                self.health.start()
+
+    def _new_watchdog(self) -> Watchdog:
+        watchdog = Watchdog(self.miner, self.cfg, on_conn_failure=self._on_conn_failure)
+        # 连接错误由 LogRing 在解析日志时直接通知，不用轮询
+        self.ring.conn_error_observer = watchdog.note_conn_error
+        return watchdog
+
+    def _on_conn_failure(self) -> bool:
+        """Watchdog 回调：有备用矿池时切换并让 Watchdog 重启 Miner。"""
+        selector = self.pool_selector
+        if selector is None:
+            return False
+        old = selector.current()
+        new = selector.failover("矿工输出中连续出现连接错误")
+        if new and new != old:
+            self.log_cb(f"矿池连接异常，切换矿池: {old} → {new}")
+            return True
+        return False
+
+    def _on_miner_state(self, state: str):
+        if self.state_observer is not None:
+            self.state_observer(self.name, state)
+
+    def _on_health(self, rule: str, action: str, detail: str):
+        """HealthMonitor 回调：写一行日志（前端能看到），需要重启 / 切矿池的交给 Watchdog。"""
+        self.log_cb(f"[健康检查] {rule}: {detail}，动作={action}")
+        watchdog = self.watchdog
+        if watchdog is not None:
+            watchdog.note_health(rule, action, detail)
+
+    def start(self) -> bool:
+        """启动 Miner；之前手动停过的话 Watchdog 也一起重新拉起来。"""
+        with self._lock:
+            self.ensure()
+            if self.miner is None:
+                return False
+            if self.watchdog is None or not self.watchdog.is_running():
+                self.watchdog = self._new_watchdog()
+                self.watchdog.start()
+            else:
+                # 手动启动：清掉退避 / 熔断状态
+                self.watchdog.reset()
+        self.miner.start()
+        return True
+
+    def stop(self):
+        """手动停止：Watchdog 也要停掉，防止自动拉起。"""
+        with self._lock:
+            watchdog, miner = self.watchdog, self.miner
+
+        if watchdog is not None:
+            try:
+                watchdog.stop()
+            except Exception as e:
+                logging.error("[%s] 停止 Watchdog 时出错: %s", self.name, e)
+
+        if miner is not None:
+            try:
+                miner.stop()
+            except Exception as e:
+                logging.error("[%s] 停止 Miner 时出错: %s", self.name, e)
+
+    def teardown(self):
+        """停掉并丢弃 Miner / Watchdog / API 轮询（重新配置或删除实例时用）。"""
+        with self._lock:
+            if self.watchdog:
+                self.watchdog.stop()
+            if self.miner and self.miner.is_running():
+                self.miner.stop()
+            self.watchdog = None
+            self.miner = None
+            self._stop_api_poller()
+            self._stop_pool_selector()
+            self._stop_health()
+
+    def reconfigure(self, cfg: dict) -> bool:
+        """
+        换成新的配置并重建 Miner / Watchdog 等对象；原来在运行的话用新配置重新启动。
+        会等旧进程退出，调用方应放在后台任务里。返回是否重新启动了。
+        """
+        with self._lock:
+            was_running = self.is_running()
+            self.teardown()
+            self.cfg = cfg
+            self.ensure()
+            return self.start() if was_running else False
+
+    def _stop_health(self):
+        if self.health is not None:
+            self.health.stop()
+            self.health = None
+
+    def _stop_pool_selector(self):
+        if self.pool_selector is not None:
+            self.pool_selector.stop()
+            self.pool_selector = None
+
+    def _stop_api_poller(self):
+        if self.api_poller is not None:
+            self.api_poller.stop()
+            self.api_poller = None
+
+    # =========================================================
+    # 状态
+    # =========================================================
+
+    def is_running(self) -> bool:
+        miner = self.miner
+        return miner.is_running() if miner else False
+
+    def state(self) -> str:
+        """Miner 生命周期状态（见 miner.STATES），还没创建 Miner 时为 stopped。"""
+        miner = self.miner
+        return miner.state if miner else "stopped"
+
+    def restart_count(self) -> int:
+        watchdog = self.watchdog
+        return watchdog.restart_count if watchdog else 0
+
+    def pool_url(self) -> str | None:
+        """当前使用的矿池：运行中为实际连接的地址，否则为即将使用的地址。"""
+        miner = self.miner
+        if miner is not None and miner.is_running() and miner.pool_url:
+            return miner.pool_url
+        if self.pool_selector is not None:
+            return self.pool_selector.current()
+        return (self.cfg.get("miner", {}) or {}).get("url")
+
+    def cpu_layout(self) -> dict:
+        """运行中返回启动时实际使用的线程 / 绑核方案，否则按当前配置给出推荐方案。"""
+        miner = self.miner
+        if miner is not None and miner.is_running() and miner.layout:
+            return miner.layout
+        mcfg = self.cfg.get("miner", {}) or {}
+        return recommend_layout(
+            mcfg.get("algorithm"), threads=mcfg.get("threads"), node=mcfg.get("numa_node")
+        )
+
+    def hugepages_active(self) -> bool | None:
+        """
+        矿工这次运行是否用上了大页：
+        优先看矿工自己的输出（100% → True，0% → False，部分分配算不清 → None），
+        没有输出时看启动前是否预留成功。没在运行返回 None。
+        """
+        miner = self.miner
+        if miner is None or not miner.is_running():
+            return None
+        reported = self.ring.huge_pages()
+        if reported:
+            pcts = [v["percent"] for v in reported.values()]
+            if all(p >= 100 for p in pcts):
+                return True
+            if all(p == 0 for p in pcts):
+                return False
+            return None
+        tuning = miner.tuning
+        if tuning and tuning["pages_needed"]:
+            return tuning["use_hugepages"]
+        return None
+
+    def watchdog_status(self) -> dict | None:
+        watchdog = self.watchdog
+        return watchdog.status() if watchdog else None
+
+    def health_status(self) -> dict | None:
+        health = self.health
+        return health.status() if health else None
+
+    def api_metrics(self):
+        """矿工本地 API 的最新指标（未启用 / 已过期返回 None）。"""
+        poller = self.api_poller
+        return poller.latest() if poller else None
+
+    def current_hashrate(self):
+        """当前算力 {"raw", "hs", "source"}，优先 API，其次日志；都没有返回 None。"""
+        m = self.api_metrics()
+        if m and m["hashrate_hs"] is not None:
+            return {"raw": humanize_hs(m["hashrate_hs"]), "hs": m["hashrate_hs"], "source": "api"}
+        hr = self.ring.hashrate()
+        if hr:
+            return {**hr, "source": "log"}
+        return None
+
+    def current_shares(self) -> tuple[int, int]:
+        """(accepted, rejected)，优先 API。"""
+        m = self.api_metrics()
+        if m and m["accepted"] is not None:
+            return m["accepted"], m["rejected"] or 0
+        return self.ring.shares()
+
+    def stream_status(self) -> dict:
+        """
+        /api/stream 推送用的精简状态：只读 Miner 状态和 LogRing / API 的统计，
+        不算 CPU 布局、Watchdog / 健康检查详情（每批日志都可能调用）。
+        """
+        hr = self.current_hashrate()
+        submit_info = self.ring.last_submit()
+        accepted, rejected = self.current_shares()
+        return {
+            "running": self.is_running(),
+            "state": self.state(),
+            "hashrate": hr["raw"] if hr else None,
+            "hashrate_hs": hr["hs"] if hr else None,
+            "hashrate_source": hr["source"] if hr else None,
+            "restart_count": self.restart_count(),
+            "last_submit": submit_info["time_str"] if submit_info else None,
+            "accepted": accepted,
+            "rejected": rejected,
+        }
+
+    def status(self) -> dict:
+        mcfg = self.cfg.get("miner", {}) or {}
+        return {
+            "name": self.name,
+            "configured": config_ready(self.cfg),
+            "coin": self.cfg.get("coin", "scash"),
+            "impl": mcfg.get("impl", "cpuminer"),
+            "pool_url": self.pool_url(),
+            "threads": mcfg.get("threads"),
+            "algorithm": mcfg.get("algorithm"),
+            "cpu_layout": self.cpu_layout(),
+            "watchdog": self.watchdog_status(),
+            "health": self.health_status(),
+            **self.stream_status(),
+            "shares": self.ring.share_stats(),
+        }
+
+
+class Supervisor:
+    """按名字管理多个 MinerInstance，并汇总统计。"""
+
+    def __init__(self):
+        self._instances: dict[str, MinerInstance] = {}
+        self._lock = threading.Lock()
+
+    def add(self, inst: MinerInstance) -> MinerInstance:
+        with self._lock:
+            if inst.name in self._instances:
+                raise ValueError(f"实例名重复: {inst.name}")
+            self._instances[inst.name] = inst
+        return inst
+
+    def get(self, name: str) -> MinerInstance | None:
+        with self._lock:
+            return self._instances.get(name)
+
+    def remove(self, name: str):
+        with self._lock:
+            inst = self._instances.pop(name, None)
+        if inst is not None:
+            inst.teardown()
+            if inst.archive is not None:
+                inst.archive.stop()
+
+    def instances(self) -> list[MinerInstance]:
+        with self._lock:
+            return list(self._instances.values())
+
+    def ensure_all(self):
+        for inst in self.instances():
+            inst.ensure()
+
+    def aggregate(self) -> dict:
+        """所有实例的汇总：总算力 / 运行数 / 份额 / 重启次数。"""
+        total_hs = 0.0
+        have_hs = False
+        running = 0
+        accepted = rejected = restarts = 0
+        insts = self.instances()
+        for inst in insts:
+            if inst.is_running():
+                running += 1
+                hr = inst.current_hashrate()
+                if hr:
+                    total_hs += hr["hs"]
+                    have_hs = True
+            a, r = inst.current_shares()
+            accepted += a
+            rejected += r
+            restarts += inst.restart_count()
+        return {
+            "instances": len(insts),
+            "running": running,
+            "hashrate_hs": total_hs if have_hs else None,
+            "hashrate": humanize_hs(total_hs) if have_hs else None,
+            "accepted": accepted,
+            "rejected": rejected,
+            "restart_count": restarts,
+        }
+
+    def stale_configs(self, base_cfg: dict) -> list[tuple[MinerInstance, dict]]:
+        """顶层配置变了之后，沿用顶层字段、需要换配置的额外实例及其新配置。"""
+        out = []
+        for inst in self.instances():
+            if inst.block is None:
+                continue
+            cfg = instance_config(base_cfg, inst.block)
+            if cfg != inst.cfg:
+                out.append((inst, cfg))
+        return out
+
+    def load_instances(self, base_cfg: dict, lock_observer=None, lines_observer=None):
+        """从配置的 instances 列表创建额外实例（跳过没名字或重名的块）。"""
+        ring_bytes = (base_cfg.get("logging") or {}).get("ring_bytes", DEFAULT_RING_BYTES)
+        for block in base_cfg.get("instances") or []:
+            if not isinstance(block, dict):
+                continue
+            name = str(block.get("name") or "").strip()
+            if not name or name == DEFAULT_INSTANCE or self.get(name):
+                logging.warning("[Supervisor] 忽略无效或重复的实例配置: %r", name)
+                continue
+            ring = LogRing(
+                prefix=name, lock_observer=lock_observer, lines_observer=lines_observer,
+                max_bytes=ring_bytes,
+            )
+            inst = MinerInstance(name, instance_config(base_cfg, block), ring)
+            inst.block = deepcopy(block)
+            self.add(inst)
+            logging.info("[Supervisor] 已加载实例: %s", name)
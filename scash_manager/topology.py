@@ -0,0 +1,295 @@
+# scash_manager/topology.py
+import logging
+import os
+from functools import lru_cache
+
+
+"""
+topology.py
+
+读取 CPU 拓扑（/sys/devices/system/cpu、/sys/devices/system/node），
+给 RandomX 系矿工推荐线程数和 CPU 亲和性：
+
+- RandomX 每个线程需要约 2 MB L3 缓存（scratchpad），线程数超过
+  L3 容量后算力不升反降，所以按「每个 L3 缓存域」分别计算可用线程；
+- 优先每个物理核心一个线程，L3 还有余量时才用上 SMT 兄弟线程；
+- 线程在各个 L3 域 / NUMA 节点之间均匀分布；
+- 只考虑当前进程允许使用的 CPU（容器 cpuset / taskset 限制）。
+
+读不到 sysfs（非 Linux、权限受限等）时退化为 os.cpu_count() - 1 的老逻辑。
+"""
+
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+SYSFS_NODE = "/sys/devices/system/node"
+
+# RandomX 系算法每线程 scratchpad 大小；不在表里的算法（astrobwt 等）不按 L3 限制
+RANDOMX_L3_PER_THREAD = 2 * 1024 * 1024
+L3_PER_THREAD = {
+    "rx/wow": 1024 * 1024,
+    "randomx": RANDOMX_L3_PER_THREAD,
+    "randomscash": RANDOMX_L3_PER_THREAD,
+    "rx/": RANDOMX_L3_PER_THREAD,
+}
+
+
+def parse_cpu_list(text: str) -> list[int]:
+    """'0-3,8,10-11' → [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in (text or "").strip().split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def parse_size(text: str) -> int:
+    """'32768K' / '32M' / '1024' → 字节数"""
+    text = (text or "").strip().upper()
+    if not text:
+        return 0
+    mul = 1
+    if text[-1] in "KMG":
+        mul = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[text[-1]]
+        text = text[:-1]
+    return int(text) * mul
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _allowed_cpus() -> set[int]:
+    try:
+        return set(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return set(range(os.cpu_count() or 1))
+
+
+def _read_l3(cpu: int, root: str) -> tuple[str, int, list[int]] | None:
+    """返回 cpu 所在 L3 的 (域 key, 字节数, 共享 CPU 列表)，没有 L3 返回 None。"""
+    cache_dir = os.path.join(root, f"cpu{cpu}", "cache")
+    try:
+        indexes = sorted(d for d in os.listdir(cache_dir) if d.startswith("index"))
+    except OSError:
+        return None
+    for idx in indexes:
+        base = os.path.join(cache_dir, idx)
+        if _read(os.path.join(base, "level")) != "3":
+            continue
+        if (_read(os.path.join(base, "type")) or "Unified") not in ("Unified", "Data"):
+            continue
+        shared = parse_cpu_list(_read(os.path.join(base, "shared_cpu_list")) or str(cpu))
+        # 有的内核没有 id 文件，用共享 CPU 列表当 key
+        key = _read(os.path.join(base, "id")) or ",".join(map(str, shared))
+        return key, parse_size(_read(os.path.join(base, "size")) or ""), shared
+    return None
+
+
+def read_topology(cpu_root: str = SYSFS_CPU, node_root: str = SYSFS_NODE) -> dict | None:
+    """
+    读取拓扑：
+    {
+      "cpus":    [{"cpu", "core", "package", "node", "l3", "smt_rank"}, ...],
+      "l3":      [{"id", "size_bytes", "cpus"}, ...],
+      "nodes":   [{"id", "cpus"}, ...],
+      "threads_per_core": 2,
+    }
+    只包含当前进程允许使用的 CPU；读不到 sysfs 返回 None。
+    """
+    online = _read(os.path.join(cpu_root, "online"))
+    if online is None:
+        return None
+    allowed = _allowed_cpus()
+    cpu_ids = [c for c in parse_cpu_list(online) if c in allowed]
+    if not cpu_ids:
+        return None
+
+    # cpu → NUMA 节点
+    cpu_node = {}
+    try:
+        node_dirs = [d for d in os.listdir(node_root) if d.startswith("node") and d[4:].isdigit()]
+    except OSError:
+        node_dirs = []
+    for d in node_dirs:
+        for c in parse_cpu_list(_read(os.path.join(node_root, d, "cpulist")) or ""):
+            cpu_node[c] = int(d[4:])
+
+    cpus = []
+    l3_domains: dict[str, dict] = {}
+    threads_per_core = 1
+    for c in cpu_ids:
+        topo = os.path.join(cpu_root, f"cpu{c}", "topology")
+        siblings = parse_cpu_list(_read(os.path.join(topo, "thread_siblings_list")) or str(c))
+        threads_per_core = max(threads_per_core, len(siblings))
+        core = int(_read(os.path.join(topo, "core_id")) or c)
+        package = int(_read(os.path.join(topo, "physical_package_id")) or 0)
+
+        l3 = _read_l3(c, cpu_root)
+        if l3 is None:
+            l3_key, l3_size = f"pkg{package}", 0
+        else:
+            l3_key, l3_size, _ = l3
+        dom = l3_domains.setdefault(l3_key, {"id": l3_key, "size_bytes": l3_size, "cpus": []})
+        dom["cpus"].append(c)
+
+        cpus.append({
+            "cpu": c,
+            "core": core,
+            "package": package,
+            "node": cpu_node.get(c, 0),
+            "l3": l3_key,
+            # 0 = 物理核心的第一个线程，1+ = SMT 兄弟线程
+            "smt_rank": sorted(siblings).index(c) if c in siblings else 0,
+        })
+
+    nodes: dict[int, list[int]] = {}
+    for info in cpus:
+        nodes.setdefault(info["node"], []).append(info["cpu"])
+
+    return {
+        "cpus": cpus,
+        "l3": list(l3_domains.values()),
+        "nodes": [{"id": n, "cpus": cs} for n, cs in sorted(nodes.items())],
+        "threads_per_core": threads_per_core,
+    }
+
+
+@lru_cache(maxsize=1)
+def get_topology() -> dict | None:
+    """拓扑在进程生命周期内不会变，读一次缓存起来。"""
+    try:
+        return read_topology()
+    except Exception as e:
+        logging.warning("[Topology] 读取 CPU 拓扑失败: %s", e)
+        return None
+
+
+def l3_per_thread(algorithm: str | None) -> int:
+    """每线程需要的 L3 字节数，0 表示该算法不按 L3 限制线程数。"""
+    algo = (algorithm or "randomx").lower()
+    for prefix, size in L3_PER_THREAD.items():
+        if algo.startswith(prefix):
+            return size
+    return 0
+
+
+def _ordered_cpus(topo: dict, node: int | None = None) -> list[list[int]]:
+    """
+    每个 L3 域里按「物理核心优先、SMT 兄弟其后」排好序的 CPU 列表。
+    node 不为 None 时只保留该 NUMA 节点上的 CPU。
+    """
+    by_cpu = {info["cpu"]: info for info in topo["cpus"]}
+    domains = []
+    for dom in topo["l3"]:
+        cs = [c for c in dom["cpus"] if node is None or by_cpu[c]["node"] == node]
+        if cs:
+            cs.sort(key=lambda c: (by_cpu[c]["smt_rank"], by_cpu[c]["core"], c))
+            domains.append(cs)
+    return domains
+
+
+def recommend_layout(algorithm: str | None = None, threads: int | None = None,
+                     node: int | None = None, topo: dict | None = None) -> dict:
+    """
+    推荐线程数 + 绑核方案：
+    {
+      "threads": 6,                 # 实际线程数
+      "recommended_threads": 6,     # 按拓扑推荐的线程数
+      "cpus": [0, 1, 2, ...],       # 绑定的 CPU（None = 不绑核）
+      "l3_domains": [{"id", "size_bytes", "threads", "cpus"}, ...],
+      "nodes": [0],
+      "source": "topology" / "cpu_count",
+    }
+    threads 为 None 时用推荐值；node 指定时只用该 NUMA 节点上的 CPU。
+    """
+    if topo is None:
+        topo = get_topology()
+
+    if not topo:
+        n = max(1, (os.cpu_count() or 2) - 1)
+        return {
+            "threads": int(threads or n),
+            "recommended_threads": n,
+            "cpus": None,
+            "l3_domains": [],
+            "nodes": [],
+            "source": "cpu_count",
+        }
+
+    domains = _ordered_cpus(topo, node)
+    if not domains:
+        # 指定的 NUMA 节点不存在 / 不可用，退回全部 CPU
+        domains = _ordered_cpus(topo)
+    sizes = {dom["id"]: dom["size_bytes"] for dom in topo["l3"]}
+    by_cpu = {info["cpu"]: info for info in topo["cpus"]}
+
+    # 每个 L3 域能放下的线程数
+    per_thread = l3_per_thread(algorithm)
+    caps = []
+    for cs in domains:
+        size = sizes.get(by_cpu[cs[0]]["l3"], 0)
+        if per_thread and size > 0:
+            caps.append(max(1, min(len(cs), size // per_thread)))
+        else:
+            caps.append(len(cs))
+
+    total_cpus = sum(len(cs) for cs in domains)
+    recommended = sum(caps)
+    if recommended >= total_cpus and total_cpus > 1:
+        # 和以前一样给系统 / 管理进程留一个 CPU
+        recommended = total_cpus - 1
+
+    want = max(1, int(threads or recommended))
+
+    # 轮流从各个 L3 域取 CPU：先取推荐容量以内的，超出部分再按顺序补
+    picked: list[list[int]] = [[] for _ in domains]
+    remaining = want
+    for limit_pass in (True, False):
+        progress = True
+        while remaining > 0 and progress:
+            progress = False
+            for i, cs in enumerate(domains):
+                if remaining <= 0:
+                    break
+                limit = caps[i] if limit_pass else len(cs)
+                if len(picked[i]) < limit:
+                    picked[i].append(cs[len(picked[i])])
+                    remaining -= 1
+                    progress = True
+
+    cpus = sorted(c for p in picked for c in p)
+    return {
+        "threads": want,
+        "recommended_threads": recommended,
+        # 线程数超过可用 CPU 时绑核没有意义，交给系统调度
+        "cpus": cpus if remaining == 0 else None,
+        "l3_domains": [
+            {
+                "id": by_cpu[cs[0]]["l3"],
+                "size_bytes": sizes.get(by_cpu[cs[0]]["l3"], 0),
+                "threads": len(p),
+                "cpus": sorted(p),
+            }
+            for cs, p in zip(domains, picked)
+        ],
+        "nodes": sorted({by_cpu[c]["node"] for c in cpus}),
+        "source": "topology",
+    }
+
+
+def affinity_mask(cpus: list[int]) -> str:
+    """[0, 1, 4] → '0x13'（XMRig --cpu-affinity 用）"""
+    mask = 0
+    for c in cpus:
+        mask |= 1 << c
+    return hex(mask)
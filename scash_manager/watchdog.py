@@ -1,26 +1,57 @@
 # scash_manager/watchdog.py
 import time
 import logging
+import queue
+import random
 import threading
+from collections import deque
 
 
 class Watchdog:
     """
-    负责监控 Miner：
-    - Miner 异常退出 => 自动重启
-    - 前端点击停止（manual_stop）=> 不自动重启
+    负责监控 Miner（事件驱动，不再定时轮询）：
+    - Miner 进程退出时由 Miner 的等待线程通知（Popen.wait），立刻处理；
+    - 异常退出 => 自动重启：刚稳定运行过的第一次崩溃立即重启，
+      连续快速崩溃按指数退避（带随机抖动）延后重启；
+    - 短时间内重启太多次 => 熔断，冷却一段时间后再试（避免配置错误时无限重启）；
+    - 前端点击停止（manual_stop）=> 不自动重启；
+    - 矿工输出里短时间内出现多次矿池连接错误 => 调用 on_conn_failure 切换矿池并重启；
+    - HealthMonitor 发现进程还在但卡死（见 health.py）=> 按规则重启 / 切换矿池。
+
+    on_conn_failure: 连接错误超过阈值时调用，返回 True 表示已切换矿池、需要重启 Miner
     """
 
-    def __init__(self, miner, cfg):
+    def __init__(self, miner, cfg, on_conn_failure=None):
         self.miner = miner
         self.cfg = cfg
         wcfg = cfg.get("watchdog", {}) or {}
 
-        self.interval = int(wcfg.get("interval", 5))         # 每 5 秒检查一次
-        self.restart_delay = int(wcfg.get("restart_delay", 10))
+        # 退避：第 n 次连续快速崩溃后等 restart_delay * 2^(n-2) 秒，最多 backoff_max 秒
+        self.restart_delay = float(wcfg.get("restart_delay", 5))
+        self.backoff_max = float(wcfg.get("backoff_max", 300))
+        # 运行超过 stable_after 秒再退出，视为「稳定运行后的偶发崩溃」，退避清零
+        self.stable_after = float(wcfg.get("stable_after", 60))
+        # 熔断：crash_loop_window 秒内自动重启超过 crash_loop_max 次
+        self.crash_loop_max = int(wcfg.get("crash_loop_max", 5))
+        self.crash_loop_window = float(wcfg.get("crash_loop_window", 300))
+        self.crash_loop_cooldown = float(wcfg.get("crash_loop_cooldown", 600))
         self.restart_count = 0
 
-        self._stop_flag = False
+        self.on_conn_failure = on_conn_failure
+        self.conn_error_threshold = int(wcfg.get("conn_error_threshold", 5))
+        self.conn_error_window = int(wcfg.get("conn_error_window", 120))
+        self._conn_errors: deque = deque()    # 最近连接错误的时间
+
+        self.history: deque = deque(maxlen=50)    # 重启记录
+        self.state = "idle"      # idle / watching / backoff / tripped / stopped
+        self.consecutive_failures = 0
+        self.next_restart_at: float | None = None
+        self.tripped_until: float | None = None
+        self._restart_times: deque = deque()
+
+        self._events: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
         self._running = False
         self._thread: threading.Thread | None = None
 
@@ -34,7 +65,9 @@ class Watchdog:
             return
 
         self._running = True
-        self._stop_flag = False
+        self._stop_event.clear()
+        self.state = "watching"
+        self.miner.add_exit_listener(self._on_exit)
 
         self._thread = threading.Thread(
             target=self.run,
@@ -42,50 +75,239 @@ class Watchdog:
         )
         self._thread.start()
 
+        # Miner 还没在跑（第一次配置好 / 重建对象后）：直接拉起来，不算重启
+        if not self.miner.is_running():
+            self._events.put(("boot", None))
+
         logging.info("[Watchdog] 已启动")
 
+    def is_running(self) -> bool:
+        """start() 之后、stop() 之前返回 True"""
+        return self._running
+
     def stop(self):
         """停止 Watchdog"""
         logging.info("[Watchdog] 收到 stop 信号")
-        self._stop_flag = True
         self._running = False
+        self._stop_event.set()
+        self.state = "stopped"
+        self.miner.remove_exit_listener(self._on_exit)
+        self._events.put(("stop", None))
+
+    def reset(self):
+        """手动启动时调用：清掉退避 / 熔断状态。"""
+        with self._lock:
+            self.consecutive_failures = 0
+            self.tripped_until = None
+            self.next_restart_at = None
+            self._restart_times.clear()
+            if self._running:
+                self.state = "watching"
+
+    def note_conn_error(self):
+        """LogRing 每解析到一行矿池连接错误就调用一次（见 MinerInstance）。"""
+        if self.on_conn_failure is None or not self._running:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn_errors.append(now)
+            while self._conn_errors and now - self._conn_errors[0] > self.conn_error_window:
+                self._conn_errors.popleft()
+            if len(self._conn_errors) < self.conn_error_threshold:
+                return
+            count = len(self._conn_errors)
+            self._conn_errors.clear()
+        logging.warning(
+            "[Watchdog] %d 秒内出现 %d 次矿池连接错误，尝试切换矿池",
+            self.conn_error_window, count,
+        )
+        self._events.put(("conn_failure", None))
+
+    def note_health(self, rule: str, action: str, detail: str = ""):
+        """HealthMonitor 规则触发时调用；restart / switch_pool 在 Watchdog 线程里执行。"""
+        if not self._running or action not in ("restart", "switch_pool"):
+            return
+        self._events.put(("health", (rule, action)))
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "state": self.state,
+                "restart_count": self.restart_count,
+                "consecutive_failures": self.consecutive_failures,
+                "next_restart_in": (
+                    max(0.0, self.next_restart_at - now) if self.next_restart_at else None
+                ),
+                "tripped_for": (
+                    max(0.0, self.tripped_until - now) if self.tripped_until else None
+                ),
+                "history": list(self.history)[-10:],
+            }
 
     # =========================================================
     # Watchdog 主逻辑
     # =========================================================
 
-    def run(self):
-        """守护线程：定期检查 Miner 状态"""
-        while not self._stop_flag:
-            time.sleep(self.interval)
+    def _on_exit(self, exit_code):
+        """Miner 等待线程回调（进程刚退出）。"""
+        self._events.put(("exit", exit_code))
 
-            if self._stop_flag:
+    def run(self):
+        """守护线程：阻塞等待 Miner 退出 / 连接错误事件，没有事件时不占用任何唤醒。"""
+        while not self._stop_event.is_set():
+            kind, arg = self._events.get()
+            if self._stop_event.is_set():
                 break
 
-            running = self.miner.is_running()
+            if kind == "boot":
+                self._handle_boot()
+            elif kind == "exit":
+                self._handle_exit(arg)
+            elif kind == "conn_failure":
+                self._handle_conn_failure()
+            elif kind == "health":
+                self._handle_health(*arg)
 
-            if running:
-                # 正常运行
-                continue
+        logging.info("[Watchdog] run() 线程已退出")
 
-            # Miner 不在运行，检查是否允许自动重启
-            if not self.miner.should_restart():
-                logging.info(
-                    "[Watchdog] 检测到 Miner 是前端手动停止，不执行自动重启。"
-                )
-                continue
+    def _handle_boot(self):
+        if self.miner.is_running() or not self.miner.should_restart():
+            return
+        try:
+            self.miner.start()
+        except Exception as e:
+            logging.error(f"[Watchdog] 启动 Miner 失败: {e}")
+        if not self.miner.is_running():
+            # 没起来：按异常退出走退避 / 熔断流程
+            self._events.put(("exit", None))
 
-            # 自动重启逻辑
-            logging.warning("[Watchdog] 检测到 Miner 异常退出，准备自动重启...")
-            time.sleep(self.restart_delay)
+    def _handle_exit(self, exit_code):
+        if self.miner.is_running():
+            # 旧进程的退出通知来晚了，新进程已经在跑
+            return
 
-            try:
-                self.miner.start()
-                self.restart_count += 1
-                logging.info(
-                    f"[Watchdog] 自动重启成功，当前重启次数={self.restart_count}"
-                )
-            except Exception as e:
-                logging.error(f"[Watchdog] 自动重启失败: {e}")
+        # Miner 不在运行，检查是否允许自动重启
+        if not self.miner.should_restart():
+            logging.info(
+                "[Watchdog] 检测到 Miner 是前端手动停止，不执行自动重启。"
+            )
+            return
 
-        logging.info("[Watchdog] run() 线程已退出")
+        uptime = self.miner.last_uptime
+        with self._lock:
+            if uptime is not None and uptime >= self.stable_after:
+                self.consecutive_failures = 0
+            self.consecutive_failures += 1
+            n = self.consecutive_failures
+
+        logging.warning(
+            "[Watchdog] 检测到 Miner 异常退出（退出码=%s，运行 %s 秒），准备自动重启...",
+            exit_code, f"{uptime:.0f}" if uptime is not None else "?",
+        )
+
+        if self._crash_loop_tripped():
+            logging.error(
+                "[Watchdog] %.0f 秒内已自动重启 %d 次，判定为崩溃循环，暂停 %.0f 秒后再试",
+                self.crash_loop_window, self.crash_loop_max, self.crash_loop_cooldown,
+            )
+            with self._lock:
+                self.state = "tripped"
+                self.tripped_until = time.time() + self.crash_loop_cooldown
+            if self._stop_event.wait(self.crash_loop_cooldown):
+                return
+            with self._lock:
+                self.tripped_until = None
+                self._restart_times.clear()
+        else:
+            delay = self._backoff_delay(n)
+            if delay > 0:
+                with self._lock:
+                    self.state = "backoff"
+                    self.next_restart_at = time.time() + delay
+                # 可被 stop() 打断的等待
+                if self._stop_event.wait(delay):
+                    return
+
+        if self.miner.is_running() or not self.miner.should_restart():
+            # 等待期间被手动启动 / 停止过
+            self._set_watching()
+            return
+        self._restart("crash", exit_code, uptime)
+
+    def _switch_pool(self) -> bool:
+        if self.on_conn_failure is None:
+            return False
+        try:
+            return bool(self.on_conn_failure())
+        except Exception as e:
+            logging.error(f"[Watchdog] 切换矿池失败: {e}")
+            return False
+
+    def _handle_conn_failure(self):
+        if not self.miner.is_running():
+            return
+        if not self._switch_pool():
+            return
+        self._stop_and_restart("pool_failover")
+
+    def _handle_health(self, rule: str, action: str):
+        if not self.miner.is_running() or not self.miner.should_restart():
+            return
+        # 没有备用矿池可切时退化为原地重启
+        if action == "switch_pool" and self._switch_pool():
+            self._stop_and_restart(f"stall:{rule}:pool_failover")
+            return
+        self._stop_and_restart(f"stall:{rule}")
+
+    def _stop_and_restart(self, reason: str):
+        uptime = self.miner.uptime()
+        # 不算手动停止：大页留给马上重启的进程
+        self.miner.stop(release_tuning=False)
+        self._restart(reason, None, uptime)
+
+    def _backoff_delay(self, n: int) -> float:
+        """第一次崩溃立即重启；之后指数退避，±20% 随机抖动（多实例时错开重启）。"""
+        if n <= 1:
+            return 0.0
+        delay = min(self.backoff_max, self.restart_delay * (2 ** (n - 2)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _crash_loop_tripped(self) -> bool:
+        now = time.time()
+        with self._lock:
+            while self._restart_times and now - self._restart_times[0] > self.crash_loop_window:
+                self._restart_times.popleft()
+            return len(self._restart_times) >= self.crash_loop_max
+
+    def _set_watching(self):
+        with self._lock:
+            self.next_restart_at = None
+            if self._running:
+                self.state = "watching"
+
+    def _restart(self, reason: str, exit_code, uptime):
+        self._set_watching()
+        try:
+            self.miner.start()
+            ok = self.miner.is_running()
+        except Exception as e:
+            logging.error(f"[Watchdog] 自动重启失败: {e}")
+            ok = False
+
+        now = time.time()
+        with self._lock:
+            self.restart_count += 1
+            self._restart_times.append(now)
+            self.history.append({
+                "ts": now,
+                "reason": reason,
+                "exit_code": exit_code,
+                "uptime": uptime,
+                "ok": ok,
+            })
+        if ok:
+            logging.info(f"[Watchdog] 自动重启成功，当前重启次数={self.restart_count}")
+        else:
+            # 起都没起来（例如二进制不存在）：不会再有退出通知，自己补一个
+            self._events.put(("exit", None))
@@ -3,14 +3,27 @@ import logging
 import threading
 import time
 import os
+import json
 import re
-from collections import deque
 
-from flask import Flask, jsonify, request, render_template
-
-from .config import load_config, save_config, setup_logging
-from .miner import Miner
-from .watchdog import Watchdog
+from flask import Flask, Response, g, jsonify, request, render_template, stream_with_context
+
+from .config import config_ready, load_config, save_config, setup_logging
+from .events import EventBroadcaster, format_sse
+from .jobs import JobManager
+from .metrics import REGISTRY
+from . import logfiles
+from .logarchive import DEFAULT_LIMIT as ARCHIVE_DEFAULT_LIMIT, parse_time as parse_log_time
+from .logring import DEFAULT_MAX_BYTES as DEFAULT_RING_BYTES, LogRing
+from .stats import RollingHashrate, humanize_hs
+from .supervisor import DEFAULT_INSTANCE, MinerInstance, Supervisor
+from .history_store import HistoryStore, parse_range
+from .topology import recommend_layout
+from .host_tuning import HugePagesImpact, host_state, mem_margin, pages_needed, reserve_pages
+from .stratum_proxy import build_proxy
+from .benchmark import BenchmarkJob, DEFAULT_RESULTS_PATH, apply_best, best_result, load_results, plan_runs
+from .sampler import MetricsSampler
+from .artifacts import configure as configure_downloads
 from .miner_downloader import ensure_cpuminer_binary, ensure_srbminer, ensure_xmrig_binary  # <-- 保留
 
 # ===== 币种预设：默认算法 + 示例矿池（可用） =====
@@ -84,189 +97,131 @@ def _normalize_pool_for_cpuminer(pool_url: str) -> str:
     return f"stratum+tcp://{pool_url}"
 
 
-def _config_ready(cfg: dict) -> bool:
-    """只看钱包 + 矿池是否填了，用来决定是否进入向导。"""
-    wallet = (cfg.get("wallet") or "").strip()
-    mcfg = cfg.get("miner", {}) or {}
-    url = (mcfg.get("url") or "").strip()
-    return bool(wallet and url)
-
-
-# ===== 简单日志缓冲，供前端 /api/logs 使用 =====
-log_buffer = deque(maxlen=500)
-log_lock = threading.Lock()
+# ===== 管理器自身的热路径指标（/metrics） =====
+_m_log_lines = REGISTRY.counter(
+    "scash_manager_log_lines_total", "push_log 写入的日志行数"
+)
+_m_log_lock_hold = REGISTRY.histogram(
+    "scash_manager_log_lock_hold_seconds",
+    "push_log 每次持有 log_lock 的时长",
+    buckets=(1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1),
+)
+_m_http_latency = REGISTRY.histogram(
+    "scash_manager_http_request_duration_seconds",
+    "Flask 路由处理耗时",
+    labels=("route", "method", "status"),
+)
 
-# 检测「已经带时间戳」的行，例如：[2025-12-01 11:36:55] ...
-TS_PREFIX_RE = re.compile(r"^\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\]")
-ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
-# 解析 accepted 行中的时间戳
-TIME_RE = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]")
+# ===== 简单日志缓冲，供前端 /api/logs 使用（default 实例） =====
+# 每个元素是 LogRecord，按字节数限制大小（logging.ring_bytes），seq 单调递增，前端用它做增量游标。
+_log_ring = LogRing(
+    lock_observer=_m_log_lock_hold.observe,
+    lines_observer=_m_log_lines.inc,
+)
+log_buffer = _log_ring.buffer
+log_lock = _log_ring.lock
 
-# 匹配 accepted 行
-SUBMIT_LINE_RE = re.compile(r"accepted:\s*\d+/\d+", re.IGNORECASE)
+# ===== 实时推送（/api/stream，SSE） =====
+event_bus = EventBroadcaster(max_queue=256)
+STREAM_KEEPALIVE = 5  # 秒：无事件时发心跳，并顺带检查一次状态变化
+_last_status = {}     # 最近一次推送出去的状态，用来计算增量
+_last_status_lock = threading.Lock()
 
+# ===== 后台任务：启停 / 重新配置 Miner 不阻塞 HTTP 请求（/api/jobs/<id> 查进度） =====
+_jobs = JobManager(on_update=lambda job: event_bus.publish("job", job))
 
-def push_log(raw_msg: str):
+def push_log(raw_msg: str, source: str = "manager"):
     """
-    写 Python 日志 + 写入内存缓冲：
-    - 支持 msg 里自带的 \n / \r\n；
-    - 每一行都会加上统一时间戳；
-    - 如果 Miner 输出本身已经是 [YYYY-MM-DD HH:MM:SS] 前缀，就不再重复加第二个时间戳。
-    - 同时去掉 ANSI 颜色控制码，避免影响正则匹配算力 / accepted。
+    写 default 实例的日志缓冲（格式化 / 解析见 LogRing.push），
+    并把新行推送给 /api/stream 的订阅者。
     """
-    if raw_msg is None:
-        return
-
-    msg = str(raw_msg).replace("\r\n", "\n").replace("\r", "\n")
-    msg = msg.replace("\\n", "\n")
-
-    with log_lock:
-        for line in msg.split("\n"):
-            line = line.strip()
-            # 去掉 ANSI 颜色码
-            line = ANSI_RE.sub("", line)
-            if not line:
-                continue
-
-            if TS_PREFIX_RE.match(line):
-                entry = line
-            else:
-                ts = time.strftime("%Y-%m-%d %H:%M:%S")
-                entry = f"[{ts}] {line}"
+    new_records, last_seq = _log_ring.push(raw_msg, source)
+
+    # 锁外推送给 SSE 订阅者，没人订阅时直接跳过（也就不用格式化）
+    if new_records and event_bus.subscriber_count():
+        event_bus.publish(
+            "log",
+            {
+                "logs": "\n".join(r.format() for r in new_records),
+                "first": last_seq - len(new_records) + 1,
+                "next": last_seq,
+            },
+        )
+        _publish_status_delta(throttle=True)
 
-            logging.info(entry)
-            log_buffer.append(entry)
 
+def _status_snapshot() -> dict:
+    """实时推送用的精简状态：运行状态 / 算力 / 重启次数 / 最后提交（default 实例）。"""
+    st = _default.stream_status()
+    return {k: st[k] for k in _STREAM_STATUS_KEYS}
 
-# ===== 从日志里解析算力，用于前端展示 =====
 
-# 支持 "0.11 khash/s"、"12.3 H/s"、"1.5 MH/s" 等
-HASHRATE_RE = re.compile(
-    r"(?P<val>\d+(\.\d+)?)\s*(?P<unit>([kKmMgGtT]?hash/s|[kKmMgGtT]?H/s))"
+_STREAM_STATUS_KEYS = (
+    "running", "state", "hashrate", "hashrate_hs", "restart_count",
+    "last_submit", "accepted", "rejected",
 )
 
-UNIT_MAP = {
-    "H/s": 1,
-    "hash/s": 1,
-    "kh/s": 1_000,
-    "khash/s": 1_000,
-    "mh/s": 1_000_000,
-    "mhash/s": 1_000_000,
-    "gh/s": 1_000_000_000,
-    "ghash/s": 1_000_000_000,
-    "th/s": 1_000_000_000_000,
-    "thash/s": 1_000_000_000_000,
-}
-
-
-def _parse_hashrate_from_logs():
-    """
-    从当前内存日志中解析最近一次算力信息。
-    返回:
-        {"raw": "0.11 khash/s", "hs": 110.0}
-        如果没找到则返回 None。
-    """
-    with log_lock:
-        text = "\n".join(log_buffer)
 
-    matches = list(HASHRATE_RE.finditer(text))
-    if not matches:
-        return None
-
-    last = matches[-1]
-    val = float(last.group("val"))
-    unit = last.group("unit")
-    key = unit.lower()
-    mul = UNIT_MAP.get(key, UNIT_MAP.get(unit, 1))
-    return {
-        "raw": f"{val} {unit}",
-        "hs": val * mul,
-    }
+# 日志触发的状态推送最多每秒一次（剩下的变化由下一批日志或心跳补上）
+STATUS_DELTA_INTERVAL = 1.0
+_last_status_check = 0.0
 
 
-def _parse_last_submit_from_logs():
+def _publish_status_delta(throttle: bool = False):
     """
-    查找最近一条 accepted: 行，并提取其中的时间戳，作为“最后提交”。
-    优先使用行里最后一个 [YYYY-MM-DD HH:MM:SS]。
+    和上一次推送的状态比较，只把变化的字段推给订阅者。
+    throttle=True（Miner 读线程每批日志调用）时距上次检查不到 STATUS_DELTA_INTERVAL 秒直接跳过。
     """
-    with log_lock:
-        lines = list(log_buffer)
-
-    last_line = None
-    for line in lines:
-        if SUBMIT_LINE_RE.search(line):
-            last_line = line
-
-    if not last_line:
-        return None
-
-    times = TIME_RE.findall(last_line)
-    ts_str = times[-1] if times else None
-    return {"line": last_line, "time_str": ts_str}
-
-
-def _humanize_hs(v: float | None) -> str | None:
-    """把 H/s 数值格式化为 '123.45 H/s'，如果为 None 则返回 None。"""
-    if v is None:
-        return None
-    return f"{v:.2f} H/s"
+    global _last_status_check
+    now = time.monotonic()
+    with _last_status_lock:
+        if throttle and now - _last_status_check < STATUS_DELTA_INTERVAL:
+            return
+        _last_status_check = now
+    snap = _status_snapshot()
+    with _last_status_lock:
+        delta = {k: v for k, v in snap.items() if _last_status.get(k, object()) != v}
+        if not delta:
+            return
+        _last_status.update(delta)
+    event_bus.publish("status", delta)
 
 
 # ===== 算力历史，用于折线图（3 分钟一个点，保留最近 24h 左右） =====
-HASH_HISTORY = []  # list[(ts:int, hs:float)]
-HASH_HISTORY_LOCK = threading.Lock()
 HISTORY_MIN_INTERVAL = 180  # 每 3 分钟最多记录一个点
 HISTORY_MAX_POINTS = 600  # 大约 24h 级别
+HASH_HISTORY = RollingHashrate(
+    maxlen=HISTORY_MAX_POINTS,
+    min_interval=HISTORY_MIN_INTERVAL,
+    alpha=0.3,
+)
 
 
-def _update_hashrate_history(current_hs: float):
-    """把当前算力写入历史（>=3 分钟才追加一个点）。"""
-    now = int(time.time())
-    with HASH_HISTORY_LOCK:
-        if HASH_HISTORY:
-            last_ts, _ = HASH_HISTORY[-1]
-            if now - last_ts < HISTORY_MIN_INTERVAL:
-                HASH_HISTORY[-1] = (last_ts, current_hs)
-            else:
-                HASH_HISTORY.append((now, current_hs))
-        else:
-            HASH_HISTORY.append((now, current_hs))
-
-        if len(HASH_HISTORY) > HISTORY_MAX_POINTS:
-            HASH_HISTORY[:] = HASH_HISTORY[-HISTORY_MAX_POINTS:]
-
+def _update_hashrate_history(ts: int, metrics: dict):
+    """采样线程的 sink：把当前算力写入内存历史（>=3 分钟才追加一个点）。"""
+    hs = metrics.get("hs")
+    if hs is not None:
+        HASH_HISTORY.add(hs, now=ts)
 
-def _compute_history_stats():
-    """
-    基于 HASH_HISTORY 计算：
-    - 简单平均算力 (avg_hs)
-    - EWMA 平滑算力 (ewma_hs)
-    - 每个点对应的 EWMA，用于曲线。
-    """
-    with HASH_HISTORY_LOCK:
-        pts = list(HASH_HISTORY)
 
-    if not pts:
-        return None
+# 大页收益：按「是否用上大页」分组统计算力
+HUGEPAGES_IMPACT = HugePagesImpact()
 
-    vals = [hs for _, hs in pts]
 
-    alpha = 0.3
-    ewma_list: list[float] = []
-    cur = None
-    for v in vals:
-        if cur is None:
-            cur = v
-        else:
-            cur = alpha * v + (1 - alpha) * cur
-        ewma_list.append(cur)
+def _update_hugepages_impact(ts: int, metrics: dict):
+    """采样线程的 sink：default 实例的算力按大页状态累计。"""
+    if _default.is_running():
+        hr = _default.current_hashrate()
+        HUGEPAGES_IMPACT.observe(hr["hs"] if hr else None, _default.hugepages_active())
 
-    avg = sum(vals) / len(vals)
-    points = []
-    for (ts, hs), ew in zip(pts, ewma_list):
-        points.append({"ts": ts, "hs": hs, "ewma_hs": ew})
 
-    return {"avg_hs": avg, "ewma_hs": ewma_list[-1], "points": points}
+def _compute_history_stats():
+    """
+    返回 HASH_HISTORY 的滚动统计（O(1)，不展开历史点）：
+    avg_hs / ewma_hs / min_hs / max_hs / stddev_hs 等，没有数据时返回 None。
+    曲线用的点请用 HASH_HISTORY.points()。
+    """
+    return HASH_HISTORY.summary()
 
 
 # ===== Flask App 初始化（模板 + 静态文件目录） =====
@@ -281,46 +236,219 @@ app = Flask(
     static_folder=STATIC_DIR,
 )
 
+@app.before_request
+def _metrics_before_request():
+    g.metrics_t0 = time.perf_counter()
+
+
+@app.after_request
+def _metrics_after_request(resp):
+    t0 = getattr(g, "metrics_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        _m_http_latency.observe(
+            time.perf_counter() - t0, route, request.method, str(resp.status_code)
+        )
+    return resp
+
+
 # 初始化全局状态
 _cfg = load_config(allow_missing=True)
 if _cfg is None:
     _cfg = {}
 setup_logging(_cfg or {})
+_log_ring.set_max_bytes(((_cfg or {}).get("logging") or {}).get("ring_bytes", DEFAULT_RING_BYTES))
 logging.info("SCASH Manager WebApp 启动中...")
 push_log("SCASH Manager Web 控制台已启动。")
 
 miner_cfg = _cfg.get("miner", {}) or {}
 _cfg["miner"] = miner_cfg  # 确保存在
+configure_downloads(_cfg.get("downloads"))
 
 # 默认币种，如果配置里没写就视为 scash
 if "coin" not in _cfg:
     _cfg["coin"] = "scash"
 
-_miner: Miner | None = None
-_watchdog: Watchdog | None = None
+# ===== Miner 实例：default（向导配置的那一个）+ 配置里 instances 列表的额外实例 =====
+supervisor = Supervisor()
+_default = supervisor.add(
+    MinerInstance(DEFAULT_INSTANCE, _cfg, ring=_log_ring, log_cb=push_log)
+)
+supervisor.load_instances(
+    _cfg,
+    lock_observer=_m_log_lock_hold.observe,
+    lines_observer=_m_log_lines.inc,
+)
 
 
-def ensure_objects(force: bool = False):
+def _on_instance_state(name: str, state: str):
+    """Miner 状态机变化（starting / running / stopping / stopped / failed）推给 /api/stream。"""
+    event_bus.publish("state", {"instance": name, "state": state})
+    if name == DEFAULT_INSTANCE and event_bus.subscriber_count():
+        _publish_status_delta()
+
+
+for _inst in supervisor.instances():
+    _inst.state_observer = _on_instance_state
+
+
+# ===== 后台采样：内存 24h 曲线 + 持久化算力历史（/data/history.db） =====
+# HTTP 接口只读这里产出的数据，不再顺带写历史。
+
+def _collect_metrics():
     """
-    在配置完整的前提下，懒加载 Miner / Watchdog。
-    force=True 时会先重建对象（例如 /api/setup 之后）。
+    采样线程调用，数据来自 push_log 时增量解析的结果。
+    Miner 没在跑时算力记 0，方便在曲线上看出停机时间；
+    还没解析到过算力时 hs 为 None（内存曲线不记点）。
+    多实例时记录所有实例的合计。
     """
-    global _cfg, _miner, _watchdog
+    hs = None
+    for inst in supervisor.instances():
+        hr = inst.current_hashrate()
+        if hr is None:
+            continue
+        hs = (hs or 0.0) + (hr["hs"] if inst.is_running() else 0.0)
+
+    agg = supervisor.aggregate()
+    return {
+        "hs": hs,
+        "accepted": agg["accepted"],
+        "rejected": agg["rejected"],
+        "restarts": agg["restart_count"],
+    }
+
+
+_history_store: HistoryStore | None = None
+
+_hcfg = _cfg.get("history", {}) or {}
+if _hcfg.get("enabled", True):
+    try:
+        _history_store = HistoryStore(_hcfg.get("db") or "/data/history.db")
+    except Exception as e:
+        # 磁盘不可写等情况：只用内存里的 24h 曲线
+        logging.error("初始化算力历史库失败，只保留内存历史: %s", e)
+        _history_store = None
+
+_sampler = MetricsSampler(
+    _collect_metrics,
+    interval=int(_hcfg.get("sample_interval", 10)),
+    store=_history_store,
+    sinks=[_update_hashrate_history, _update_hugepages_impact],
+)
+_sampler.start()
+
+
+# ===== 本地 stratum 代理（可选，见 stratum_proxy.py） =====
+_proxy = None
 
-    if not _config_ready(_cfg):
-        return
 
+def _setup_proxy():
+    """按当前配置（重新）创建代理，并挂到能用它的实例上。"""
+    global _proxy
+    if _proxy is not None:
+        _proxy.stop()
+        _proxy = None
+    try:
+        _proxy = build_proxy(_cfg)
+        if _proxy is not None:
+            _proxy.start()
+    except Exception as e:
+        logging.error("启动 stratum 代理失败，Miner 将直连矿池: %s", e)
+        _proxy = None
+    for inst in supervisor.instances():
+        inst.proxy = _proxy
+
+
+_setup_proxy()
+
+
+def ensure_objects(force: bool = False):
+    """
+    在配置完整的前提下，懒加载各实例的 Miner / Watchdog。
+    force=True 时会先重建 default 实例的对象（例如 /api/setup 之后）。
+    """
     if force:
-        _miner = None
-        _watchdog = None
+        # 钱包 / 矿池可能变了，代理也要按新配置重建
+        _setup_proxy()
+        _default.ensure(force=True)
+    supervisor.ensure_all()
+
 
-    if _miner is None:
-        _miner = Miner(_cfg, log_cb=push_log)
+def _refresh_instance_configs():
+    """
+    顶层配置保存后（/api/setup、/api/reset-config、应用跑分结果），额外实例里沿用顶层的
+    钱包 / 矿池 / watchdog 等字段要跟着变：按新配置重建，在各实例的任务队列里做。
+    """
+    for inst, cfg in supervisor.stale_configs(_cfg):
+        def _reconfigure(job, inst=inst, cfg=cfg):
+            job.step(f"按新的顶层配置重建实例 {inst.name}")
+            restarted = inst.reconfigure(cfg)
+            return {"state": inst.state(), "restarted": restarted}
 
-    if _watchdog is None:
-        _watchdog = Watchdog(_miner, _cfg)
-        t = threading.Thread(target=_watchdog.run, daemon=True)
-        t.start()
+        _jobs.submit("reconfigure", _reconfigure, key=inst.name)
+
+
+def _collect_prometheus():
+    """/metrics 抓取时现算的指标：每个实例的状态 / 算力 / 份额 / 进程资源。"""
+    stats = _compute_history_stats()
+    out = [
+        ("scash_miner_hashrate_ewma_hs", "EWMA 平滑算力（H/s，所有实例合计）", "gauge",
+         stats["ewma_hs"] if stats else None, {}),
+        ("scash_miner_hashrate_avg_hs", "历史平均算力（H/s，所有实例合计）", "gauge",
+         stats["avg_hs"] if stats else None, {}),
+        ("scash_manager_stream_subscribers", "/api/stream 在线订阅数", "gauge",
+         event_bus.subscriber_count(), {}),
+    ]
+    for stream, n in logfiles.dropped().items():
+        out.append(("scash_manager_log_dropped_total", "日志队列满被丢弃的记录数", "counter",
+                    n, {"stream": stream}))
+
+    total_hs = None
+    for inst in supervisor.instances():
+        lb = {"instance": inst.name}
+        hr = inst.current_hashrate()
+        if hr and hr["hs"] is not None:
+            total_hs = (total_hs or 0.0) + hr["hs"]
+        accepted, rejected = inst.current_shares()
+        out += [
+            ("scash_miner_up", "Miner 进程是否在运行", "gauge", 1 if inst.is_running() else 0, lb),
+            ("scash_miner_hashrate_hs", "当前算力（H/s）", "gauge",
+             hr["hs"] if hr else None, {**lb, "source": hr["source"] if hr else "none"}),
+            ("scash_miner_shares_accepted_total", "矿工统计的 accepted 份额", "counter", accepted, lb),
+            ("scash_miner_shares_rejected_total", "矿工统计的 rejected 份额", "counter", rejected, lb),
+            ("scash_watchdog_restarts_total", "Watchdog 自动重启次数", "counter",
+             inst.restart_count(), lb),
+            ("scash_manager_log_buffer_lines", "内存日志缓冲行数", "gauge", len(inst.ring), lb),
+            ("scash_manager_log_buffer_bytes", "内存日志缓冲估算占用（字节）", "gauge",
+             inst.ring.memory_bytes(), lb),
+        ]
+        if inst.archive is not None:
+            out.append(("scash_manager_log_archive_dropped_total",
+                        "日志归档队列满被丢弃的行数", "counter", inst.archive.dropped, lb))
+
+        miner = inst.miner
+        if miner is None:
+            continue
+        uptime = miner.uptime()
+        if uptime is not None:
+            out.append(("scash_miner_uptime_seconds", "Miner 本次运行时长", "gauge", uptime, lb))
+        backlog = miner.stdout_backlog()
+        if backlog is not None:
+            out.append(("scash_manager_reader_backlog_bytes",
+                        "Miner stdout 管道中尚未读取的字节数", "gauge", backlog, lb))
+        ps = miner.process_stats()
+        if ps:
+            out.append(("scash_miner_process_cpu_seconds_total",
+                        "Miner 进程树累计 CPU 时间", "counter", ps["cpu_seconds"], lb))
+            out.append(("scash_miner_process_resident_memory_bytes",
+                        "Miner 进程树常驻内存", "gauge", ps["rss_bytes"], lb))
+    # 各实例 scash_miner_hashrate_hs 之和（都还没有算力时为 NaN）
+    out.append(("scash_miner_hashrate_total_hs", "当前算力（H/s，所有实例合计）", "gauge",
+                total_hs, {}))
+    return out
+
+
+REGISTRY.register_collector(_collect_prometheus)
 
 
 # ===== 路由部分 =====
@@ -331,97 +459,425 @@ def index():
     return render_template("index.html")
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus 文本格式指标。"""
+    # content_type 原样输出；用 mimetype 的话 Flask 会再补一个 charset
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/status")
 def api_status():
-    global _cfg, _miner, _watchdog
-
     ensure_objects()
 
-    needs_setup = not _config_ready(_cfg)
+    needs_setup = not config_ready(_cfg)
     mcfg = _cfg.get("miner", {}) or {}
     wcfg = _cfg.get("watchdog", {}) or {}
 
-    running = _miner.is_running() if _miner else False
-    hr = _parse_hashrate_from_logs()
+    running = _default.is_running()
+    hr = _default.current_hashrate()
 
     avg_hs = None
     ewma_hs = None
-    if hr:
-        _update_hashrate_history(hr["hs"])
-        stats = _compute_history_stats()
-        if stats:
-            avg_hs = stats["avg_hs"]
-            ewma_hs = stats["ewma_hs"]
+    stats = _compute_history_stats()
+    if stats:
+        avg_hs = stats["avg_hs"]
+        ewma_hs = stats["ewma_hs"]
 
-    submit_info = _parse_last_submit_from_logs()
+    submit_info = _log_ring.last_submit()
+    accepted, rejected = _default.current_shares()
 
     return jsonify(
         {
             "ok": True,
             "needs_setup": needs_setup,
             "running": running,
+            "state": _default.state(),
             "coin": _cfg.get("coin", "scash"),  # <-- 返回币种给前端
             "wallet": _cfg.get("wallet"),
-            "pool_url": mcfg.get("url"),
+            "pool_url": _default.pool_url(),
+            "pools": mcfg.get("pools") or [],
             "threads": mcfg.get("threads"),
             "bin_path": mcfg.get("bin_path"),
             "algorithm": mcfg.get("algorithm"),
             "impl": mcfg.get("impl", "cpuminer"),
-            "restart_count": _watchdog.restart_count if _watchdog else 0,
+            "restart_count": _default.restart_count(),
             "restart_delay": wcfg.get("restart_delay", 5),
+            "watchdog": _default.watchdog_status(),
+            "health": _default.health_status(),
+            # 线程 / 绑核方案（运行中为实际方案，否则为推荐方案）
+            "cpu_layout": _default.cpu_layout(),
             # 算力：
             "hashrate": hr["raw"] if hr else None,
             "hashrate_hs": hr["hs"] if hr else None,
+            "hashrate_source": hr["source"] if hr else None,
             "hashrate_avg_hs": avg_hs,
             "hashrate_ewma_hs": ewma_hs,
-            "hashrate_avg": _humanize_hs(avg_hs),
-            "hashrate_ewma": _humanize_hs(ewma_hs),
-            # 最近 accepted 时间
+            "hashrate_avg": humanize_hs(avg_hs),
+            "hashrate_ewma": humanize_hs(ewma_hs),
+            "hashrate_min_hs": stats["min_hs"] if stats else None,
+            "hashrate_max_hs": stats["max_hs"] if stats else None,
+            "hashrate_stddev_hs": stats["stddev_hs"] if stats else None,
+            # 最近 accepted 时间 / 份额统计
             "last_submit": submit_info["time_str"] if submit_info else None,
+            "accepted": accepted,
+            "rejected": rejected,
         }
     )
 
 
+@app.get("/api/miner-metrics")
+def api_miner_metrics():
+    """
+    矿工本地 API 的完整指标（10s/60s/15m 窗口、每线程算力、难度、矿池延迟等）。
+    未启用 API 或暂时拉不到时，退回日志解析出的算力 / 份额，source=log。
+    """
+    m = _default.api_metrics()
+    if m is None:
+        mcfg = _cfg.get("miner", {}) or {}
+        hr = _log_ring.hashrate()
+        accepted, rejected = _log_ring.shares()
+        m = {
+            "source": "log",
+            "impl": mcfg.get("impl", "cpuminer"),
+            "hashrate_hs": hr["hs"] if hr else None,
+            "accepted": accepted,
+            "rejected": rejected,
+        }
+    return jsonify({"ok": True, "metrics": m})
+
+
+def _hugepages_needed() -> int:
+    mcfg = _cfg.get("miner", {}) or {}
+    layout = _default.cpu_layout()
+    return pages_needed(layout["threads"], mcfg.get("algorithm"))
+
+
+@app.get("/api/host-tuning")
+def api_host_tuning():
+    """
+    宿主机调优状态：
+    - host：/proc/meminfo + 各大页池 + MSR 是否可用；
+    - pages_needed：当前配置（数据集 + 线程数）需要的 2 MB 大页数；
+    - plan：最近一次启动时实际采用的方案（预留结果 / 参数）；
+    - miner_reported：矿工输出里报告的大页分配；
+    - impact：开 / 不开大页时的平均算力对比。
+    """
+    miner = _default.miner
+    return jsonify(
+        {
+            "ok": True,
+            "host": host_state(),
+            "pages_needed": _hugepages_needed(),
+            "plan": miner.tuning if miner else None,
+            "miner_reported": _default.ring.huge_pages(),
+            "active": _default.hugepages_active(),
+            "impact": HUGEPAGES_IMPACT.summary(),
+        }
+    )
+
+
+@app.post("/api/host-tuning/reserve")
+def api_host_tuning_reserve():
+    """立即按当前配置预留大页（需要特权，失败时返回原因），下次启动 Miner 生效。"""
+    margin = mem_margin(_cfg.get("host_tuning"))
+    result = reserve_pages(_hugepages_needed(), mem_margin=margin)
+    return jsonify({"ok": result["ok"], "reserve": result, "error": result["error"]})
+
+
+# ===== 离线跑分（见 benchmark.py），同一时间只允许一个任务 =====
+_benchmark_job: BenchmarkJob | None = None
+_benchmark_lock = threading.Lock()
+
+
+def _benchmark_results_path() -> str:
+    return (_cfg.get("benchmark", {}) or {}).get("results") or DEFAULT_RESULTS_PATH
+
+
+def _apply_benchmark_best(best: dict):
+    """写入最优配置，在 default 实例的任务队列里重建并用新配置启动。返回 Job。"""
+    apply_best(_cfg, best)
+    save_config(_cfg)
+    _refresh_instance_configs()
+    push_log(
+        f"已应用跑分结果：impl={best['impl']}, 线程={best['threads']}, "
+        f"绑核={best['affinity']}（{humanize_hs(best['hs'])}）"
+    )
+
+    def _rebuild_and_start(job):
+        job.step("用跑分最优配置重建 Miner / Watchdog")
+        _default.teardown()
+        ensure_objects(force=True)
+        job.step("启动实例 default")
+        if not _default.start():
+            raise RuntimeError("内部错误：Miner 未初始化")
+        return {"applied": best, "state": _default.state()}
+
+    return _jobs.submit("benchmark-apply", _rebuild_and_start, key=DEFAULT_INSTANCE)
+
+
+@app.get("/api/benchmark")
+def api_benchmark_status():
+    """当前 / 最近一次跑分任务的进度和结果（服务重启后读 benchmark.json）。"""
+    job = _benchmark_job
+    snap = job.snapshot() if job else load_results(_benchmark_results_path())
+    return jsonify({"ok": True, "benchmark": snap})
+
+
+@app.post("/api/benchmark")
+def api_benchmark_start():
+    """
+    body: {impls?, threads?, affinity?, warmup?, duration?, apply?}
+    跑分期间会停掉所有正在运行的实例（避免抢 CPU），结束后恢复；
+    apply=true 时自动把最优结果写入配置并用新配置启动。
+    停止 / 恢复都走各实例的任务队列，接口立即返回 202 + 任务 ID。
+    """
+    global _benchmark_job
+
+    data = request.get_json(silent=True) or {}
+    bcfg = _cfg.get("benchmark", {}) or {}
+    try:
+        threads = [int(t) for t in data.get("threads") or []] or None
+        warmup = float(data.get("warmup", bcfg.get("warmup", 30)))
+        duration = float(data.get("duration", bcfg.get("duration", 60)))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "threads / warmup / duration 参数格式不正确"}), 400
+
+    affinity = data.get("affinity") or ["auto", "off"]
+    runs = plan_runs(_cfg, data.get("impls"), threads, tuple(affinity))
+    if not runs:
+        return jsonify({"ok": False, "error": "没有可跑分的矿工（需要已安装的 cpuminer / XMRig）"}), 400
+
+    with _benchmark_lock:
+        if _benchmark_job is not None and _benchmark_job.is_running():
+            return jsonify({"ok": False, "error": "已有跑分任务在进行中"}), 409
+
+        was_running = [inst for inst in supervisor.instances() if inst.is_running()]
+        stop_jobs = [_stop_instance_job(inst) for inst in was_running]
+
+        def _on_finish(job: BenchmarkJob):
+            best = job.best() if job.state == "done" else None
+            resume = was_running
+            if data.get("apply") and best:
+                # 重建 default 的任务里会启动它
+                _apply_benchmark_best(best)
+                resume = [inst for inst in was_running if inst is not _default]
+            for inst in resume:
+                _start_instance_job(inst)
+            push_log(
+                f"跑分结束（{job.state}），最优："
+                + (f"{best['impl']} 线程={best['threads']} {humanize_hs(best['hs'])}" if best else "无")
+            )
+
+        bench = _benchmark_job = BenchmarkJob(
+            runs,
+            warmup=warmup,
+            duration=duration,
+            results_path=_benchmark_results_path(),
+            on_finish=_on_finish,
+        )
+
+    def _run_benchmark(job):
+        job.step(f"等待 {len(stop_jobs)} 个实例停止")
+        for stop_job in stop_jobs:
+            stop_job.wait()
+        job.step(f"开始跑分：共 {len(runs)} 轮")
+        bench.start()
+        return {"runs": len(runs)}
+
+    push_log(f"开始跑分：共 {len(runs)} 轮，每轮约 {warmup + duration:.0f} 秒，期间 Miner 暂停。")
+    return _job_response(
+        _jobs.submit("benchmark", _run_benchmark, key="benchmark"),
+        benchmark=bench.snapshot(),
+    )
+
+
+@app.post("/api/benchmark/cancel")
+def api_benchmark_cancel():
+    job = _benchmark_job
+    if job is None or not job.is_running():
+        return jsonify({"ok": False, "error": "没有正在进行的跑分任务"}), 400
+    job.cancel()
+    return jsonify({"ok": True})
+
+
+@app.post("/api/benchmark/apply")
+def api_benchmark_apply():
+    """把最近一次跑分的最优结果写入配置，并在后台任务里用新配置重启 Miner。"""
+    job = _benchmark_job
+    if job is not None and job.is_running():
+        return jsonify({"ok": False, "error": "跑分任务还没结束"}), 409
+    snap = job.snapshot() if job else load_results(_benchmark_results_path())
+    best = best_result((snap or {}).get("results") or [])
+    if best is None:
+        return jsonify({"ok": False, "error": "没有可用的跑分结果"}), 400
+
+    return _job_response(
+        _apply_benchmark_best(best), "已应用跑分结果，正在用新配置重启 Miner", applied=best
+    )
+
+
+@app.get("/api/pools")
+def api_pools():
+    """多矿池状态：当前矿池、各矿池最近一次探测的延迟、冷却剩余时间、切换次数。"""
+    selector = _default.pool_selector
+    if selector is None:
+        return jsonify({"ok": True, "pools": None, "current": _default.pool_url()})
+    return jsonify({"ok": True, **selector.status()})
+
+
+@app.post("/api/pools/probe")
+def api_pools_probe():
+    """立即探测一次所有矿池（下次启动 Miner 时按新结果选择）。"""
+    selector = _default.pool_selector
+    if selector is None:
+        return jsonify({"ok": False, "error": "只配置了一个矿池"}), 400
+    return jsonify({"ok": True, "results": selector.probe_now()})
+
+
+@app.get("/api/proxy")
+def api_proxy():
+    """本地 stratum 代理状态：当前上游、故障切换次数、每个本地矿工的份额统计。"""
+    if _proxy is None:
+        return jsonify({"ok": True, "enabled": False, "proxy": None})
+    return jsonify({"ok": True, "enabled": True, "proxy": _proxy.stats()})
+
+
 @app.get("/api/hashrate-history")
 def api_hashrate_history():
     """
     返回折线图所需的算力历史。
     points: [{ts, hs, ewma_hs}, ...]
+
+    可选参数（需要启用 history 持久化）：
+    - range：时间范围，例如 6h / 7d / 4w，或秒数；
+    - resolution：1m / 15m / 1h / auto（默认 auto，按范围自动选层）。
+    不带 range 时返回内存里最近 24h 的曲线。
     """
-    hr = _parse_hashrate_from_logs()
-    if hr:
-        _update_hashrate_history(hr["hs"])
-    stats = _compute_history_stats()
-    if not stats:
-        return jsonify({"ok": True, "points": []})
-    return jsonify({"ok": True, "points": stats["points"]})
+    range_raw = request.args.get("range")
+    if range_raw:
+        if _history_store is None:
+            return jsonify({"ok": False, "error": "未启用算力历史持久化"}), 400
+        try:
+            range_sec = parse_range(range_raw)
+            tier, points = _history_store.query(
+                range_sec, request.args.get("resolution")
+            )
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        # 曲线上的平滑线按返回的点重新算一遍 EWMA
+        ewma = None
+        for p in points:
+            ewma = p["hs"] if ewma is None else 0.3 * p["hs"] + 0.7 * ewma
+            p["ewma_hs"] = ewma
+        return jsonify({"ok": True, "resolution": tier, "points": points})
+
+    return jsonify({"ok": True, "points": HASH_HISTORY.points()})
+
+
+_ARCHIVE_QUERY_KEYS = ("from", "to", "grep", "limit")
+
+
+def _archive_logs(inst):
+    """
+    查询实例的日志归档：
+    - from / to：unix 时间、"2025-01-10 03:00" 或相对时间（"6h" = 6 小时前）；
+    - grep：正则，不区分大小写；
+    - limit：最多返回多少行（默认 500）。给了 from 时取 from 之后最早的 limit 行，
+      否则取 to（默认现在）之前最近的 limit 行。
+    返回 {logs, count, limit_reached}。
+    """
+    if inst.archive is None:
+        return jsonify({"ok": False, "error": "未启用日志归档"}), 400
+    args = request.args
+    try:
+        start = parse_log_time(args["from"]) if args.get("from") else None
+        end = parse_log_time(args["to"]) if args.get("to") else None
+        limit = int(args.get("limit") or ARCHIVE_DEFAULT_LIMIT)
+        result = inst.archive.query(start, end, args.get("grep") or None, limit)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify(
+        {
+            "ok": True,
+            "logs": "\n".join(result["lines"]),
+            "count": len(result["lines"]),
+            "limit_reached": result["limit_reached"],
+        }
+    )
 
 
 @app.get("/api/logs")
 def api_logs():
-    with log_lock:
-        text = "\n".join(log_buffer)
-    return jsonify({"logs": text, "ok": True})
+    """
+    返回日志。
+    - 不带参数：返回整个缓冲；
+    - ?since=<seq>：只返回该序号之后的新行。
+    返回 {logs, next, truncated}，next 作为下一次的 since。
+    - 带 from / to / grep / limit 任意一个时查询持久化归档（见 _archive_logs）。
+    """
+    if any(request.args.get(k) for k in _ARCHIVE_QUERY_KEYS):
+        return _archive_logs(_default)
+
+    return _ring_logs(_log_ring)
+
+
+@app.get("/api/stream")
+def api_stream():
+    """
+    SSE 实时推送：
+    - event: status  —— 状态增量（连接时先发一次完整状态）
+    - event: log     —— 新日志行 {logs, first, next}，和 /api/logs 的游标一致
+    - event: state   —— Miner 状态机变化 {instance, state}
+    - event: job     —— 后台任务状态 / 进度（和 /api/jobs/<id> 一致）
+    - event: resync  —— 该客户端太慢丢过事件，需要重新全量拉取
+    """
+    ensure_objects()
+
+    def gen():
+        sub = event_bus.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            yield format_sse("status", json.dumps(_status_snapshot(), ensure_ascii=False))
+            while True:
+                item = sub.get(timeout=STREAM_KEEPALIVE)
+                if item is None:
+                    # 进程崩溃这类不产生日志的变化，靠心跳时检查补推
+                    _publish_status_delta()
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(*item)
+        finally:
+            sub.close()
+
+    return Response(
+        stream_with_context(gen()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/setup")
 def api_setup():
     """
     body: {coin, impl, wallet, pool_url, bin_path, threads?}
+    pool_url 可以写多个矿池（逗号 / 空格分隔），第一个为主矿池，
+    其余作为备用：启动时按延迟挑选，连接出错时自动切换。
 
     统一流程：
     1. 更新并保存配置
     2. 下载 / 校验 miner 二进制（cpuminer / SRBMiner / XMRig）
     3. 成功后重建 Miner / Watchdog 并启动 Miner
+    2、3 可能要几十秒，在后台任务里执行：接口立即返回任务 ID（见 /api/jobs/<id>）。
     """
-    global _cfg, _miner, _watchdog
-
     try:
         data = request.get_json(force=True) or {}
         coin = (data.get("coin") or "scash").strip().lower()  # 新增：币种
         impl = (data.get("impl") or "cpuminer").strip()
         wallet = (data.get("wallet") or "").strip()
-        pool_url_raw = (data.get("pool_url") or "").strip()
+        pool_urls_raw = [p for p in re.split(r"[,\s]+", data.get("pool_url") or "") if p]
+        pool_url_raw = pool_urls_raw[0] if pool_urls_raw else ""
         bin_path = (data.get("bin_path") or "").strip()
         threads = data.get("threads")
 
@@ -430,10 +886,11 @@ def api_setup():
         if not pool_url_raw:
             return jsonify({"ok": False, "error": "矿池地址不能为空"}), 400
 
-        # 基本线程检查
+        # 基本线程检查：没填就按 CPU 拓扑（L3 缓存 / SMT）推荐
         if threads is None:
-            auto_threads = max(1, (os.cpu_count() or 2) - 1)
-            threads = auto_threads
+            preset = COIN_PRESETS.get(coin, COIN_PRESETS["scash"])
+            algo_hint = preset.get("algo_xmrig" if impl == "xmrig" else "algo_cpuminer")
+            threads = recommend_layout(algo_hint or "randomx")["recommended_threads"]
 
         try:
             threads = int(threads)
@@ -456,7 +913,7 @@ def api_setup():
         if (
             coin == "scash"
             and impl == "xmrig"
-            and "pool.scash.pro" in pool_url_raw
+            and any("pool.scash.pro" in p for p in pool_urls_raw)
         ):
             return jsonify(
                 {
@@ -467,10 +924,11 @@ def api_setup():
 
         # 根据 impl 规范化矿池地址
         if impl in ("cpuminer", "xmrig"):
-            pool_url = _normalize_pool_for_cpuminer(pool_url_raw)
+            pools = [_normalize_pool_for_cpuminer(p) for p in pool_urls_raw]
         else:
             # SRBMiner 用 host:port，extra_args 里单独处理
-            pool_url = pool_url_raw
+            pools = list(pool_urls_raw)
+        pool_url = pools[0]
 
         # 1) 更新配置（全局 coin）
         _cfg["coin"] = coin
@@ -478,6 +936,7 @@ def api_setup():
         mcfg = _cfg.get("miner", {}) or {}
         mcfg["impl"] = impl
         mcfg["url"] = pool_url
+        mcfg["pools"] = pools if len(pools) > 1 else []
         mcfg["user"] = wallet
         mcfg["threads"] = threads
 
@@ -545,88 +1004,123 @@ def api_setup():
             f"已保存配置：coin={coin}, impl={impl}, 线程={threads}。正在准备矿工程序..."
         )
 
-        # 2) 下载 / 校验 miner
-        try:
-            if impl == "cpuminer":
-                ensure_cpuminer_binary(mcfg["bin_path"])
+        # 2) 下载 / 校验 miner + 3) 启动：可能要几十秒，放到后台任务里
+        def _prepare_and_start(job):
+            try:
+                job.step("准备矿工程序")
+                _prepare_miner_binary(impl, mcfg)
+                job.step("重建 Miner / Watchdog 并启动")
+                _default.teardown()
+                ensure_objects(force=True)
+                if _default.miner:
+                    _default.miner.start()
+                return {"state": _default.state()}
+            finally:
+                # 额外实例沿用的顶层字段（含上面可能更新的 bin_path），下载失败也要更新
+                _refresh_instance_configs()
+
+        return _job_response(_jobs.submit("setup", _prepare_and_start, key=DEFAULT_INSTANCE))
 
-            elif impl == "srbminer":
-                exe_path = ensure_srbminer(
-                    os.path.dirname(mcfg["bin_path"]) or "/opt/SRBMiner-Multi"
-                )
-                mcfg["bin_path"] = exe_path
-                _cfg["miner"] = mcfg
-                save_config(_cfg)
+    except Exception as e:
+        logging.exception("api_setup 处理失败")
+        push_log(f"api_setup 处理失败: {e}")
+        return jsonify({"ok": False, "error": f"内部错误: {e}"}), 500
 
-            elif impl == "xmrig":
-                ensure_xmrig_binary(mcfg["bin_path"])
 
-            else:
-                raise RuntimeError(f"未知的 miner impl: {impl}")
+def _prepare_miner_binary(impl: str, mcfg: dict):
+    """下载 / 校验 miner 二进制；失败时停掉 default 实例并抛出给前端看的错误。"""
+    try:
+        if impl == "cpuminer":
+            ensure_cpuminer_binary(mcfg["bin_path"])
 
-            # 最终二次兜底校验
-            if not os.path.isfile(mcfg["bin_path"]):
-                raise FileNotFoundError(mcfg["bin_path"])
+        elif impl == "srbminer":
+            exe_path = ensure_srbminer(
+                os.path.dirname(mcfg["bin_path"]) or "/opt/SRBMiner-Multi"
+            )
+            mcfg["bin_path"] = exe_path
+            _cfg["miner"] = mcfg
+            save_config(_cfg)
 
-        except Exception as e:
-            logging.error("配置后准备 miner 失败: %s", e)
-            push_log(f"矿工程序不存在或下载失败: {e}")
+        elif impl == "xmrig":
+            ensure_xmrig_binary(mcfg["bin_path"])
 
-            if _watchdog:
-                _watchdog.stop()
-            if _miner and _miner.is_running():
-                _miner.stop()
+        else:
+            raise RuntimeError(f"未知的 miner impl: {impl}")
 
-            _watchdog = None
-            _miner = None
+        # 最终二次兜底校验
+        if not os.path.isfile(mcfg["bin_path"]):
+            raise FileNotFoundError(mcfg["bin_path"])
 
-            return jsonify(
-                {
-                    "ok": False,
-                    "error": (
-                        "矿工程序不存在或下载失败："
-                        "常见原因是无法连接 GitHub 或下载中途被重置，"
-                        "请检查网络，或者手动把 cpuminer / SRBMiner / XMRig "
-                        "放到容器内指定路径后重试。"
-                        f"（详细错误：{e}）"
-                    ),
-                }
-            )
+    except Exception as e:
+        logging.error("配置后准备 miner 失败: %s", e)
+        push_log(f"矿工程序不存在或下载失败: {e}")
+
+        _default.teardown()
+
+        raise RuntimeError(
+            "矿工程序不存在或下载失败："
+            "常见原因是无法连接 GitHub 或下载中途被重置，"
+            "请检查网络，或者手动把 cpuminer / SRBMiner / XMRig "
+            "放到容器内指定路径后重试。"
+            f"（详细错误：{e}）"
+        ) from e
+
+
+def _job_response(job, message: str | None = None, **extra):
+    """提交后台任务后的统一返回：202 + 任务信息（+ extra 字段），前端轮询 job_url 看结果。"""
+    body = {"ok": True, "job": job.to_dict(), "job_url": f"/api/jobs/{job.id}"}
+    if message:
+        body["message"] = message
+    body.update(extra)
+    return jsonify(body), 202
+
+
+def _ring_logs(ring):
+    """/api/logs 和 /api/instances/<name>/logs 的实时部分：按 ?since=<seq> 增量读取 LogRing。"""
+    since_raw = request.args.get("since")
+    since = None
+    if since_raw not in (None, ""):
+        try:
+            since = int(since_raw)
+        except ValueError:
+            return jsonify({"ok": False, "error": "since 必须是整数"}), 400
+
+    lines, next_seq, truncated = ring.read_since(since)
+    return jsonify(
+        {
+            "ok": True,
+            "logs": "\n".join(lines),
+            "next": next_seq,
+            "truncated": truncated,
+        }
+    )
 
-        # 3) 一切正常，重建 Miner / Watchdog 并启动
-        if _watchdog:
-            _watchdog.stop()
-            _watchdog = None
-        if _miner and _miner.is_running():
-            _miner.stop()
-        _miner = None
 
-        ensure_objects(force=True)
+def _start_instance_job(inst):
+    def _start(job):
+        job.step(f"启动实例 {inst.name}")
+        if not inst.start():
+            raise RuntimeError("内部错误：Miner 未初始化")
+        return {"state": inst.state()}
 
-        if _miner:
-            _miner.start()
+    return _jobs.submit("start", _start, key=inst.name)
 
-        return jsonify({"ok": True})
 
-    except Exception as e:
-        logging.exception("api_setup 处理失败")
-        push_log(f"api_setup 处理失败: {e}")
-        return jsonify({"ok": False, "error": f"内部错误: {e}"}), 500
+def _stop_instance_job(inst):
+    def _stop(job):
+        job.step(f"停止实例 {inst.name}")
+        inst.stop()
+        return {"state": inst.state()}
+
+    return _jobs.submit("stop", _stop, key=inst.name)
 
 
 @app.post("/api/start")
 def api_start():
-    global _cfg, _miner
-    if not _config_ready(_cfg):
+    if not config_ready(_cfg):
         return jsonify({"ok": False, "error": "配置未完成，请先在向导中填写钱包和矿池。"}), 400
 
-    ensure_objects()
-
-    if not _miner:
-        return jsonify({"ok": False, "error": "内部错误：Miner 未初始化"}), 500
-
-    _miner.start()
-    return jsonify({"ok": True, "message": "已请求启动 Miner"})
+    return _job_response(_start_instance_job(_default), "已请求启动 Miner")
 
 
 @app.post("/api/stop")
@@ -634,25 +1128,12 @@ def api_stop():
     """
     前端点击“停止”：
     - Watchdog 也要停掉，防止自动拉起
+    - 等进程退出可能要好几秒，放到后台任务里
     """
-    global _miner, _watchdog
-
     logging.info("收到 /api/stop 请求，准备停止 Miner 和 Watchdog。")
     push_log("前端请求停止 Miner，正在停止 Miner + Watchdog。")
 
-    if _watchdog is not None:
-        try:
-            _watchdog.stop()
-        except Exception as e:
-            logging.error("停止 Watchdog 时出错: %s", e)
-
-    if _miner is not None:
-        try:
-            _miner.stop()
-        except Exception as e:
-            logging.error("停止 Miner 时出错: %s", e)
-
-    return jsonify({"ok": True})
+    return _job_response(_stop_instance_job(_default), "正在停止 Miner")
 
 
 @app.post("/api/reset-config")
@@ -660,17 +1141,8 @@ def api_reset_config():
     """
     清空钱包和矿池配置，停掉 Miner 和 Watchdog，
     让前端重新回到首次配置向导。
+    配置立即清空，停止 / 清理放到后台任务里。
     """
-    global _cfg, _miner, _watchdog
-
-    if _watchdog:
-        _watchdog.stop()
-        _watchdog = None
-
-    if _miner and _miner.is_running():
-        _miner.stop()
-    _miner = None
-
     _cfg["wallet"] = ""
     _cfg["coin"] = "scash"
     mcfg = _cfg.get("miner", {}) or {}
@@ -679,15 +1151,99 @@ def api_reset_config():
     _cfg["miner"] = mcfg
 
     save_config(_cfg)
+    _refresh_instance_configs()
     logging.info("已通过 /api/reset-config 清空钱包和矿池配置。")
     push_log("已清空钱包和矿池配置，现在可以重新运行向导。")
 
-    return jsonify({"ok": True, "message": "配置已清空，现在可以重新运行向导。"})
+    def _teardown(job):
+        job.step("停止并清理 Miner / Watchdog")
+        _default.teardown()
+
+    return _job_response(
+        _jobs.submit("reset-config", _teardown, key=DEFAULT_INSTANCE),
+        "配置已清空，现在可以重新运行向导。",
+    )
+
+
+@app.get("/api/jobs")
+def api_jobs():
+    """最近的后台任务（新的在前）。"""
+    return jsonify({"ok": True, "jobs": _jobs.list()})
+
+
+@app.get("/api/jobs/<job_id>")
+def api_job(job_id):
+    """单个后台任务：state 为 queued / running / succeeded / failed，progress 为进度记录。"""
+    job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": f"任务不存在: {job_id}"}), 404
+    return jsonify({"ok": True, **job.to_dict()})
+
+
+# ===== 多实例：按名字查看 / 启停，以及汇总统计 =====
+
+def _get_instance(name: str):
+    inst = supervisor.get(name)
+    if inst is None:
+        return None, (jsonify({"ok": False, "error": f"实例不存在: {name}"}), 404)
+    return inst, None
+
+
+@app.get("/api/instances")
+def api_instances():
+    """所有实例的状态 + 汇总（总算力 / 运行数 / 份额 / 重启次数）。"""
+    ensure_objects()
+    return jsonify(
+        {
+            "ok": True,
+            "instances": [inst.status() for inst in supervisor.instances()],
+            "aggregate": supervisor.aggregate(),
+        }
+    )
+
+
+@app.get("/api/instances/<name>/status")
+def api_instance_status(name):
+    inst, err = _get_instance(name)
+    if err:
+        return err
+    return jsonify({"ok": True, **inst.status()})
+
+
+@app.post("/api/instances/<name>/start")
+def api_instance_start(name):
+    inst, err = _get_instance(name)
+    if err:
+        return err
+    if not config_ready(inst.cfg):
+        return jsonify({"ok": False, "error": "该实例配置未完成（缺少钱包或矿池）"}), 400
+    return _job_response(_start_instance_job(inst), f"已请求启动实例 {name}")
+
+
+@app.post("/api/instances/<name>/stop")
+def api_instance_stop(name):
+    inst, err = _get_instance(name)
+    if err:
+        return err
+    inst.log_cb(f"前端请求停止实例 {name}，正在停止 Miner + Watchdog。")
+    return _job_response(_stop_instance_job(inst), f"正在停止实例 {name}")
+
+
+@app.get("/api/instances/<name>/logs")
+def api_instance_logs(name):
+    """和 /api/logs 一样支持 ?since=<seq> 增量读取，以及 from / to / grep / limit 查询归档。"""
+    inst, err = _get_instance(name)
+    if err:
+        return err
+    if any(request.args.get(k) for k in _ARCHIVE_QUERY_KEYS):
+        return _archive_logs(inst)
+    return _ring_logs(inst.ring)
 
 
 def main():
     logging.info("SCASH Manager Web 控制台已启动：http://0.0.0.0:8080")
-    app.run(host="0.0.0.0", port=8080)
+    # SSE 长连接各占一个线程，必须开 threaded
+    app.run(host="0.0.0.0", port=8080, threaded=True)
 
 
 if __name__ == "__main__":
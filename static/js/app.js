@@ -18,6 +18,11 @@ document.addEventListener("DOMContentLoaded", () => {
   const btnStop = document.getElementById("btn-stop");
   const btnRefresh = document.getElementById("btn-refresh");
   const dashMsg = document.getElementById("dash-msg");
+  const logFromInput = document.getElementById("log-from");
+  const logToInput = document.getElementById("log-to");
+  const logGrepInput = document.getElementById("log-grep");
+  const btnLogSearch = document.getElementById("btn-log-search");
+  const btnLogLive = document.getElementById("btn-log-live");
 
   const statusBadge = document.getElementById("status-badge");
   const statusText = document.getElementById("status-text");
@@ -159,8 +164,13 @@ document.addEventListener("DOMContentLoaded", () => {
 
   async function loadHashrateHistory() {
     try {
-      const resp = await fetch("/api/hashrate-history");
-      const data = await resp.json();
+      // 优先读磁盘上的历史（重启不丢），未启用时退回内存曲线
+      let resp = await fetch("/api/hashrate-history?range=24h");
+      let data = await resp.json();
+      if (!data.ok) {
+        resp = await fetch("/api/hashrate-history");
+        data = await resp.json();
+      }
       if (!data.ok) return;
       const pts = data.points || [];
 
@@ -179,15 +189,42 @@ document.addEventListener("DOMContentLoaded", () => {
 
   // ================== 状态 / 日志 ==================
 
-  function setStatusBadge(running) {
-    if (running) {
+  // Miner 状态机（后端 miner.STATES）
+  const STATE_LABELS = {
+    starting: "启动中",
+    running: "运行中",
+    stopping: "停止中",
+    stopped: "已停止",
+    failed: "异常退出"
+  };
+  let lastRunning = false;
+  let lastState = null;
+
+  function setStatusBadge(running, state) {
+    if (typeof running === "boolean") lastRunning = running;
+    if (state) lastState = state;
+    if (lastRunning) {
       statusBadge.classList.remove("off");
       statusBadge.classList.add("on");
-      statusText.textContent = "运行中";
     } else {
       statusBadge.classList.remove("on");
       statusBadge.classList.add("off");
-      statusText.textContent = "已停止";
+    }
+    statusText.textContent =
+      STATE_LABELS[lastState] || (lastRunning ? "运行中" : "已停止");
+  }
+
+  // 启停 / 配置是后台任务：轮询 /api/jobs/<id> 直到结束，返回任务信息
+  async function waitJob(data, onProgress) {
+    if (!data.job_url) return data;
+    for (;;) {
+      const resp = await fetch(data.job_url);
+      const job = await resp.json();
+      if (!job.ok) throw new Error(job.error || "查询任务失败");
+      const steps = job.progress || [];
+      if (onProgress && steps.length) onProgress(steps[steps.length - 1].message);
+      if (job.state === "succeeded" || job.state === "failed") return job;
+      await new Promise(r => setTimeout(r, 500));
     }
   }
 
@@ -211,7 +248,7 @@ document.addEventListener("DOMContentLoaded", () => {
         dashSection.classList.remove("hidden");
       }
 
-      setStatusBadge(data.running);
+      setStatusBadge(data.running, data.state);
 
       coinText.textContent = data.coin || "-";
       implText.textContent = data.impl || "-";
@@ -237,18 +274,77 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  // 增量日志游标：只拉取 logCursor 之后的新行
+  const LOG_MAX_LINES = 500;
+  let logCursor = null;
+  let logLines = [];
+
+  // 正在看历史查询结果时，实时日志只记进 logLines，不刷新日志框
+  let logSearchMode = false;
+
+  function appendLogLines(text, reset) {
+    const lines = text ? text.split("\n") : [];
+    if (reset) {
+      logLines = lines;
+    } else if (lines.length) {
+      logLines = logLines.concat(lines);
+    } else {
+      return;
+    }
+    if (logLines.length > LOG_MAX_LINES) {
+      logLines = logLines.slice(-LOG_MAX_LINES);
+    }
+    if (logSearchMode) return;
+    logBox.textContent = logLines.join("\n");
+    logBox.scrollTop = logBox.scrollHeight;
+  }
+
   async function loadLogs() {
     try {
-      const resp = await fetch("/api/logs");
+      const url =
+        logCursor === null ? "/api/logs" : `/api/logs?since=${logCursor}`;
+      const resp = await fetch(url);
       const data = await resp.json();
       if (!data.ok) return;
-      logBox.textContent = data.logs || "";
-      logBox.scrollTop = logBox.scrollHeight;
+      // 首次加载 / 落环（truncated）时整屏重绘，否则只追加新行
+      appendLogLines(data.logs || "", logCursor === null || data.truncated);
+      logCursor = data.next;
     } catch (e) {
       console.error("loadLogs error:", e);
     }
   }
 
+  async function searchLogs() {
+    const params = new URLSearchParams();
+    if (logFromInput.value.trim()) params.set("from", logFromInput.value.trim());
+    if (logToInput.value.trim()) params.set("to", logToInput.value.trim());
+    if (logGrepInput.value.trim()) params.set("grep", logGrepInput.value.trim());
+    params.set("limit", "2000");
+    dashMsg.textContent = "正在查询历史日志...";
+    try {
+      const resp = await fetch(`/api/logs?${params}`);
+      const data = await resp.json();
+      if (!data.ok) {
+        dashMsg.textContent = "查询失败：" + (data.error || "未知错误");
+        return;
+      }
+      logSearchMode = true;
+      logBox.textContent = data.logs || "（没有匹配的日志）";
+      logBox.scrollTop = 0;
+      dashMsg.textContent =
+        `历史日志 ${data.count} 行` + (data.limit_reached ? "（已截断，可缩小时间范围）" : "");
+    } catch (e) {
+      dashMsg.textContent = "查询失败：" + e;
+    }
+  }
+
+  function showLiveLogs() {
+    logSearchMode = false;
+    logBox.textContent = logLines.join("\n");
+    logBox.scrollTop = logBox.scrollHeight;
+    dashMsg.textContent = "";
+  }
+
   async function refreshAll() {
     await loadStatus();
     await loadLogs();
@@ -309,6 +405,12 @@ document.addEventListener("DOMContentLoaded", () => {
         return;
       }
 
+      const job = await waitJob(data, m => (setupMsg.textContent = m + "..."));
+      if (job.state === "failed") {
+        setupMsg.textContent = job.error || "准备 Miner 失败";
+        return;
+      }
+
       setupMsg.textContent = "配置已保存，Miner 正在启动...";
       await refreshAll();
     } catch (e) {
@@ -345,6 +447,11 @@ document.addEventListener("DOMContentLoaded", () => {
         dashMsg.textContent = data.error || "启动失败";
         return;
       }
+      const job = await waitJob(data);
+      if (job.state === "failed") {
+        dashMsg.textContent = job.error || "启动失败";
+        return;
+      }
       dashMsg.textContent = data.message || "已请求启动 Miner";
       await refreshAll();
     } catch (e) {
@@ -361,6 +468,11 @@ document.addEventListener("DOMContentLoaded", () => {
         dashMsg.textContent = data.error || "停止失败";
         return;
       }
+      const job = await waitJob(data);
+      if (job.state === "failed") {
+        dashMsg.textContent = job.error || "停止失败";
+        return;
+      }
       dashMsg.textContent = "Miner 已停止";
       await refreshAll();
     } catch (e) {
@@ -368,6 +480,9 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
+  btnLogSearch.addEventListener("click", searchLogs);
+  btnLogLive.addEventListener("click", showLiveLogs);
+
   btnRefresh.addEventListener("click", () => {
     dashMsg.textContent = "正在刷新状态...";
     refreshAll().then(() => {
@@ -376,8 +491,70 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
-  // ================== 定时刷新 ==================
+  // ================== 实时推送（SSE）+ 轮询兜底 ==================
+
+  function applyStatusDelta(d) {
+    if ("running" in d || "state" in d) setStatusBadge(d.running, d.state);
+    if ("hashrate" in d) hashrateText.textContent = d.hashrate || "未知";
+    if ("hashrate_hs" in d) {
+      hashrateHsText.textContent =
+        typeof d.hashrate_hs === "number" ? d.hashrate_hs.toFixed(2) : "-";
+    }
+    if ("restart_count" in d) restartCountText.textContent = d.restart_count ?? 0;
+    if ("last_submit" in d) lastSubmitText.textContent = d.last_submit || "-";
+  }
+
+  function applyLogEvent(d) {
+    if (logCursor === null || d.first > logCursor + 1) {
+      // 还没拿到初始日志，或者中间漏了：走一次增量接口补齐
+      loadLogs();
+      return;
+    }
+    if (d.next <= logCursor) return; // 已经通过 /api/logs 拿到过
+    const lines = d.logs.split("\n").slice(logCursor + 1 - d.first);
+    appendLogLines(lines.join("\n"), false);
+    logCursor = d.next;
+  }
+
+  let pollTimer = null;
+
+  function startPolling() {
+    if (!pollTimer) pollTimer = setInterval(refreshAll, 15_000); // 每 15 秒刷新一次
+  }
+
+  function stopPolling() {
+    if (pollTimer) {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    }
+  }
+
+  function connectStream() {
+    if (!window.EventSource) {
+      startPolling();
+      return;
+    }
+    const stream = new EventSource("/api/stream");
+    stream.addEventListener("open", () => {
+      stopPolling();
+      loadLogs();
+    });
+    stream.addEventListener("status", e => applyStatusDelta(JSON.parse(e.data)));
+    stream.addEventListener("log", e => applyLogEvent(JSON.parse(e.data)));
+    stream.addEventListener("state", e => {
+      const d = JSON.parse(e.data);
+      if (d.instance === "default") setStatusBadge(undefined, d.state);
+    });
+    stream.addEventListener("resync", () => refreshAll());
+    // 断线时 EventSource 会自动重连，期间先用轮询兜底
+    stream.addEventListener("error", () => startPolling());
+  }
 
   refreshAll();
-  setInterval(refreshAll, 15_000); // 每 15 秒刷新一次
+  connectStream();
+  // 平均 / EWMA 算力和曲线变化慢，低频刷新即可
+  setInterval(() => {
+    loadStatus();
+    loadHashrateHistory();
+  }, 60_000);
 });
@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scash_manager import artifacts
+from scash_manager.artifacts import ChecksumError, configure, fetch, stream
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileServer:
+    """
+    本地 http.server：按路径返回 files 里的内容。
+    - ranges=False：HEAD 不带 Accept-Ranges，GET 忽略 Range；
+    - ignore_range=True：声称支持 Range，但 GET 总是整包 200；
+    - truncate={path: n}：该路径下一次 GET 只写 n 字节就断开连接。
+    """
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.ranges = True
+        self.ignore_range = False
+        self.truncate: dict[str, int] = {}
+        self.requests: list[tuple[str, str, str | None]] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                server.requests.append(("HEAD", self.path, None))
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+            def do_GET(self):
+                rng = self.headers.get("Range")
+                server.requests.append(("GET", self.path, rng))
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                m = re.match(r"bytes=(\d+)-(\d+)", rng or "")
+                if m and server.ranges and not server.ignore_range:
+                    start, end = int(m.group(1)), int(m.group(2))
+                    body = data[start:end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    body = data
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                cut = server.truncate.pop(self.path, None)
+                self.wfile.write(body if cut is None else body[:cut])
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def gets(self, path: str) -> list[str | None]:
+        return [rng for method, p, rng in self.requests if method == "GET" and p == path]
+
+
+@pytest.fixture
+def server():
+    srv = FileServer()
+    yield srv
+    srv.httpd.shutdown()
+    srv.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def options(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts.time, "sleep", lambda s: None)
+    monkeypatch.setattr(artifacts, "MIN_SEGMENT_SIZE", 64 * 1024)
+    configure({"cache_dir": str(tmp_path / "cache"), "retries": 2, "timeout": 5})
+    yield
+    configure(None)
+
+
+def test_segmented_download_is_cached(server, tmp_path):
+    data = os.urandom(300 * 1024)
+    server.files["/pkg.tgz"] = data
+    path = fetch(server.base + "/pkg.tgz", sha256=_sha(data))
+    with open(path, "rb") as f:
+        assert f.read() == data
+    # 4 段并行，都是 Range 请求
+    assert len(server.gets("/pkg.tgz")) == 4
+    assert all(rng for rng in server.gets("/pkg.tgz"))
+
+    # 第二次直接命中缓存，不再请求
+    server.requests.clear()
+    assert fetch(server.base + "/pkg.tgz", sha256=_sha(data)) == path
+    assert server.requests == []
+
+
+def test_resume_after_truncation(server):
+    configure({"cache_dir": artifacts._options["cache_dir"], "segments": 1, "retries": 2})
+    data = os.urandom(600 * 1024)
+    server.files["/pkg.tgz"] = data
+    server.truncate["/pkg.tgz"] = 300 * 1024
+
+    path = fetch(server.base + "/pkg.tgz", sha256=_sha(data))
+    with open(path, "rb") as f:
+        assert f.read() == data
+    first, second = server.gets("/pkg.tgz")
+    assert first == f"bytes=0-{len(data) - 1}"
+    start = int(re.match(r"bytes=(\d+)-", second).group(1))
+    # 第二次从断点续传，而不是从头再下
+    assert 0 < start <= 300 * 1024
+
+
+def test_rangeless_server_downloads_whole_file(server):
+    server.ranges = False
+    data = os.urandom(300 * 1024)
+    server.files["/pkg.tgz"] = data
+    path = fetch(server.base + "/pkg.tgz", sha256=_sha(data))
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert server.gets("/pkg.tgz") == [None]
+
+
+def test_server_ignoring_range_is_rejected(server):
+    server.ignore_range = True
+    data = os.urandom(300 * 1024)
+    server.files["/pkg.tgz"] = data
+    with pytest.raises(RuntimeError, match="HTTP 200"):
+        fetch(server.base + "/pkg.tgz", sha256=_sha(data))
+
+
+def test_checksum_mismatch(server):
+    server.files["/pkg.tgz"] = b"tampered" * 1000
+    cache_dir = artifacts._options["cache_dir"]
+    with pytest.raises(RuntimeError, match="SHA-256 不匹配"):
+        fetch(server.base + "/pkg.tgz", sha256=_sha(b"original"))
+    # 内容不对：不重试同一个来源，也不留分段
+    assert len(server.gets("/pkg.tgz")) == 1
+    assert not os.listdir(os.path.join(cache_dir, "partial"))
+
+
+def test_mirror_falls_back_to_origin(server):
+    data = os.urandom(100 * 1024)
+    server.files["/origin/pkg.tgz"] = data
+    server.files["/mirror/pkg.tgz"] = b"stale mirror copy"
+    configure({
+        "cache_dir": artifacts._options["cache_dir"],
+        "mirror": server.base + "/mirror",
+        "sha256": {"pkg.tgz": _sha(data)},
+    })
+    path = fetch(server.base + "/origin/pkg.tgz")
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert server.gets("/mirror/pkg.tgz") and server.gets("/origin/pkg.tgz")
+
+
+def test_missing_mirror_falls_back_to_origin(server):
+    data = os.urandom(10 * 1024)
+    server.files["/origin/pkg.tgz"] = data
+    configure({"cache_dir": artifacts._options["cache_dir"], "mirror": server.base + "/mirror",
+               "retries": 1})
+    path = fetch(server.base + "/origin/pkg.tgz", sha256=_sha(data))
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_stream_verify(server):
+    data = os.urandom(200 * 1024)
+    server.files["/pkg.tgz"] = data
+
+    def consume(reader, verify):
+        head = reader.read(1024)
+        verify()
+        return head
+
+    assert stream(server.base + "/pkg.tgz", consume, sha256=_sha(data)) == data[:1024]
+
+    with pytest.raises(RuntimeError, match="SHA-256 不匹配"):
+        stream(server.base + "/pkg.tgz", consume, sha256=_sha(b"other"))
+    # ChecksumError 不在同一来源重试
+    assert len(server.gets("/pkg.tgz")) == 2
+
+
+def test_stream_checksum_error_propagates_to_consume(server):
+    server.files["/pkg.tgz"] = b"payload"
+    seen = []
+
+    def consume(reader, verify):
+        try:
+            verify()
+        except ChecksumError as e:
+            seen.append(e)
+            raise
+
+    with pytest.raises(RuntimeError):
+        stream(server.base + "/pkg.tgz", consume, sha256=_sha(b"other"))
+    assert len(seen) == 1
+
+
+def test_unpinned_package_warns(server, caplog):
+    server.files["/pkg.tgz"] = b"payload"
+    with caplog.at_level(logging.WARNING):
+        fetch(server.base + "/pkg.tgz")
+    assert "没有固定 SHA-256" in caplog.text
+
+
+def test_require_sha256_refuses_unpinned(server):
+    server.files["/pkg.tgz"] = b"payload"
+    configure({"cache_dir": artifacts._options["cache_dir"], "require_sha256": True})
+    with pytest.raises(artifacts.PackageError, match="require_sha256"):
+        fetch(server.base + "/pkg.tgz")
+    assert server.requests == []
@@ -0,0 +1,134 @@
+import os
+import stat
+
+import pytest
+
+from scash_manager import benchmark
+from scash_manager.benchmark import apply_best, parse_sample, plan_runs, run_one
+
+
+@pytest.mark.parametrize("line, hs", [
+    ("[2024-05-01 12:00:10.000]  miner    speed 10s/60s/15m 1234.5 1230.1 n/a H/s max 1240.0 H/s", 1234.5),
+    ("[2024-05-01 12:00:10.000]  miner    speed 10s/60s/15m 16.84 16.83 16.81 kH/s max 16.9 kH/s", 16840.0),
+    ("\x1b[1;37m[2024-05-01 12:00:10.000]\x1b[0m  \x1b[1;36mminer\x1b[0m    speed 10s/60s/15m "
+     "\x1b[1;36m2345.6\x1b[0m \x1b[0;36mn/a\x1b[0m \x1b[0;36mn/a\x1b[0m \x1b[1;36mH/s\x1b[0m max 2400.0 H/s",
+     2345.6),
+])
+def test_parse_sample_xmrig(line, hs):
+    assert parse_sample("xmrig", line) == pytest.approx(hs)
+
+
+def test_parse_sample_xmrig_ignores_other_lines():
+    assert parse_sample("xmrig", "[2024-05-01 12:00:10.000]  cpu      accepted (1/0) diff 1000") is None
+    # 测试阶段的 n/a 没有数值
+    assert parse_sample("xmrig", " miner    speed 10s/60s/15m n/a n/a n/a H/s max n/a H/s") is None
+
+
+@pytest.mark.parametrize("line, hs", [
+    ("[2024-05-01 12:00:10] Total: 1.23 khash/s", 1230.0),
+    ("[2024-05-01 12:00:10] Benchmark: 456.7 hash/s", 456.7),
+    ("\x1b[32m[2024-05-01 12:00:10] Total: 2.5 kH/s\x1b[0m", 2500.0),
+])
+def test_parse_sample_cpuminer(line, hs):
+    assert parse_sample("cpuminer", line) == pytest.approx(hs)
+
+
+def test_parse_sample_cpuminer_skips_per_thread_lines():
+    assert parse_sample("cpuminer", "[2024-05-01 12:00:10] CPU #3: 310.50 hash/s") is None
+
+
+@pytest.fixture
+def fake_host(monkeypatch):
+    """4 个 CPU：线程数不超过 4 时按 L3 绑核，超过时 recommend_layout 给 cpus=None。"""
+    monkeypatch.setattr(benchmark, "installed_miners",
+                        lambda cfg: {"cpuminer": "/bin/minerd", "xmrig": "/bin/xmrig"})
+
+    def layout(algo, threads=None, node=None):
+        threads = threads or 3
+        return {"threads": threads, "recommended_threads": 3,
+                "cpus": list(range(threads)) if threads <= 4 else None}
+
+    monkeypatch.setattr(benchmark, "recommend_layout", layout)
+
+
+def test_plan_runs_dedupes_unpinnable_layouts(fake_host):
+    cfg = {"coin": "xmr", "miner": {"url": "stratum+tcp://pool:3333", "algorithm": "rx/0"}}
+    runs = plan_runs(cfg, impls=["xmrig"], threads=[2, 4, 6])
+    assert [(r["threads"], r["affinity"], r["cpus"]) for r in runs] == [
+        (2, "auto", [0, 1]), (2, "off", None),
+        (4, "auto", [0, 1, 2, 3]), (4, "off", None),
+        # 6 线程超过 CPU 数：auto 和 off 是同一种布局，只跑一次
+        (6, "off", None),
+    ]
+    assert all(r["algorithm"] == "rx/0" and r["bin_path"] == "/bin/xmrig" for r in runs)
+
+
+def test_plan_runs_maps_randomscash_and_filters_impls(fake_host):
+    cfg = {"coin": "scash", "miner": {"url": "stratum+tcp://pool.scash.pro:8888",
+                                      "algorithm": "randomscash"}}
+    runs = plan_runs(cfg, threads=[2], affinities=("off",))
+    # 官方矿池不支持 XMRig；SRBMiner 的算法名换成 randomx
+    assert [(r["impl"], r["algorithm"]) for r in runs] == [("cpuminer", "randomx")]
+
+
+def _script(tmp_path, body: str) -> str:
+    path = tmp_path / "fake-xmrig"
+    path.write_text("#!/bin/sh\n" + body)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def _xmrig_line(hs):
+    return f"echo ' miner    speed 10s/60s/15m {hs} n/a n/a H/s max {hs} H/s'"
+
+
+def test_run_one_discards_warmup_samples(tmp_path):
+    body = "\n".join([
+        _xmrig_line(100.0),
+        _xmrig_line(150.0),
+        "sleep 0.6",
+        _xmrig_line(1000.0),
+        "sleep 0.2",
+        _xmrig_line(1200.0),
+        "sleep 30",
+    ])
+    run = {"impl": "xmrig", "bin_path": _script(tmp_path, body), "algorithm": "rx/0",
+           "threads": 1, "affinity": "off", "cpus": None, "hugepages": False}
+    res = run_one(run, warmup=0.4, duration=0.8)
+    assert res["error"] is None
+    assert res["samples"] == 2
+    assert res["hs"] == pytest.approx(1100.0)
+    assert res["stddev"] == pytest.approx(100.0)
+
+
+def test_run_one_falls_back_to_last_sample_when_miner_exits(tmp_path):
+    body = "\n".join([_xmrig_line(900.0), _xmrig_line(950.0), "exit 0"])
+    run = {"impl": "xmrig", "bin_path": _script(tmp_path, body), "algorithm": "rx/0",
+           "threads": 1, "affinity": "off", "cpus": None, "hugepages": False}
+    res = run_one(run, warmup=5, duration=5)
+    assert res["hs"] == 950.0 and res["samples"] == 1
+
+
+def test_run_one_reports_missing_binary(tmp_path):
+    run = {"impl": "xmrig", "bin_path": os.fspath(tmp_path / "missing"), "algorithm": "rx/0",
+           "threads": 1, "affinity": "off", "cpus": None}
+    res = run_one(run, warmup=0, duration=0)
+    assert res["hs"] is None and res["error"].startswith("启动失败")
+
+
+BEST = {"impl": "cpuminer", "bin_path": "/usr/local/bin/minerd", "threads": 6,
+        "affinity": "auto", "algorithm": "randomx"}
+
+
+def test_apply_best_replaces_srbminer_algorithm():
+    cfg = {"miner": {"impl": "srbminer", "algorithm": "randomscash", "url": "stratum+tcp://p:1"}}
+    apply_best(cfg, BEST)
+    assert cfg["miner"] == {"impl": "cpuminer", "bin_path": "/usr/local/bin/minerd", "threads": 6,
+                            "affinity": "auto", "algorithm": "randomx", "url": "stratum+tcp://p:1"}
+
+
+def test_apply_best_keeps_other_algorithms():
+    cfg = {"miner": {"impl": "xmrig", "algorithm": "rx/wow"}}
+    apply_best(cfg, {**BEST, "impl": "xmrig", "affinity": "off", "algorithm": "rx/0"})
+    assert cfg["miner"]["algorithm"] == "rx/wow"
+    assert cfg["miner"]["affinity"] == "off"
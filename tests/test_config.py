@@ -0,0 +1,34 @@
+import json
+
+from scash_manager.config import DEFAULT_CONFIG, load_config
+
+
+def _load(tmp_path, monkeypatch, data):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    monkeypatch.setenv("SCASH_MANAGER_CONFIG", str(path))
+    return load_config()
+
+
+def test_logging_block_without_miner_output(tmp_path, monkeypatch):
+    cfg = _load(tmp_path, monkeypatch, {
+        "logging": {"file": "/tmp/x.log", "level": "DEBUG"},
+        "log_archive": {"dir": "/tmp/archive"},
+        "history": {"sample_interval": 5},
+    })
+    assert cfg["logging"]["file"] == "/tmp/x.log"
+    assert cfg["logging"]["level"] == "DEBUG"
+    assert cfg["logging"]["miner_output"] == DEFAULT_CONFIG["logging"]["miner_output"]
+    # logging 之后的子项照常合并
+    assert cfg["log_archive"]["dir"] == "/tmp/archive"
+    assert cfg["history"]["sample_interval"] == 5
+
+
+def test_logging_miner_output_partial(tmp_path, monkeypatch):
+    cfg = _load(tmp_path, monkeypatch, {"logging": {"miner_output": {"level": "WARNING"}}})
+    mo = cfg["logging"]["miner_output"]
+    assert mo["level"] == "WARNING"
+    assert mo["file"] == DEFAULT_CONFIG["logging"]["miner_output"]["file"]
+    assert cfg["logging"]["file"] == DEFAULT_CONFIG["logging"]["file"]
+    # 不能改到默认配置本身
+    assert DEFAULT_CONFIG["logging"]["miner_output"]["level"] != "WARNING"
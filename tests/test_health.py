@@ -0,0 +1,154 @@
+from scash_manager.health import HealthMonitor, rule_config
+
+T0 = 10_000.0
+
+
+class FakeRing:
+    def __init__(self):
+        self.act = {"hs": None, "hashrate_at": None, "accepted": 0, "accepted_at": None}
+
+    def activity(self):
+        return dict(self.act)
+
+    def hashrate(self, hs, at):
+        self.act.update(hs=hs, hashrate_at=at)
+
+    def accepted(self, at):
+        self.act.update(accepted=self.act["accepted"] + 1, accepted_at=at)
+
+
+class FakeMiner:
+    def __init__(self, started_at=T0):
+        self.started_at = started_at
+
+    def is_running(self):
+        return True
+
+
+def _monitor(**health):
+    ring, fired = FakeRing(), []
+    cfg = {"health": {"grace": 0, **health}}
+    monitor = HealthMonitor(ring, FakeMiner(), cfg, on_trigger=lambda *a: fired.append(a))
+    return monitor, ring, fired
+
+
+def _rules(fired):
+    return [(rule, action) for rule, action, _ in fired]
+
+
+def test_rule_config_defaults_and_invalid_action():
+    assert rule_config({}, "no_share")["action"] == "alert"
+    rule = rule_config({"no_share": {"min": 60, "action": "reboot"}}, "no_share")
+    assert rule["min"] == 60 and rule["factor"] == 10 and rule["action"] == "alert"
+
+
+def test_no_share_uses_min_when_shares_are_frequent():
+    monitor, ring, fired = _monitor(no_share={"factor": 10, "min": 600, "action": "restart"},
+                                    no_hashrate={"action": "off"})
+    # 份额间隔 30 秒：factor × 间隔 = 300 秒，低于 min，按 600 秒算
+    for t in (T0 + 10, T0 + 40, T0 + 70):
+        ring.accepted(t)
+        monitor.check(now=t)
+    assert monitor.share_interval == 30
+    monitor.check(now=T0 + 70 + 599)
+    assert fired == []
+    monitor.check(now=T0 + 70 + 600)
+    assert _rules(fired) == [("no_share", "restart")]
+
+
+def test_no_share_scales_with_share_interval():
+    monitor, ring, fired = _monitor(no_share={"factor": 10, "min": 60, "action": "switch_pool"},
+                                    no_hashrate={"action": "off"})
+    for t in (T0 + 100, T0 + 400):
+        ring.accepted(t)
+        monitor.check(now=t)
+    # 平均 300 秒一个份额：阈值 3000 秒
+    monitor.check(now=T0 + 400 + 2999)
+    assert fired == []
+    monitor.check(now=T0 + 400 + 3000)
+    assert _rules(fired) == [("no_share", "switch_pool")]
+
+
+def test_low_hashrate_fires_after_sustained_drop():
+    monitor, ring, fired = _monitor(low_hashrate={"ratio": 0.5, "for": 120, "action": "restart"},
+                                    no_share={"action": "off"})
+    t = T0
+    for _ in range(20):
+        t += 10
+        ring.hashrate(1000.0, t)
+        monitor.check(now=t)
+    assert monitor.ewma_hs == 1000.0
+
+    # 掉到 40%：低点不进 EWMA，持续 120 秒后触发
+    drop_at = t + 10
+    for t in range(int(drop_at), int(drop_at) + 130, 10):
+        ring.hashrate(400.0, t)
+        monitor.check(now=t)
+    assert monitor.ewma_hs == 1000.0
+    assert _rules(fired) == [("low_hashrate", "restart")]
+
+
+def test_brief_drop_does_not_fire():
+    monitor, ring, fired = _monitor(low_hashrate={"ratio": 0.5, "for": 120, "action": "restart"},
+                                    no_share={"action": "off"})
+    ring.hashrate(1000.0, T0 + 10)
+    monitor.check(now=T0 + 10)
+    ring.hashrate(400.0, T0 + 20)
+    monitor.check(now=T0 + 20)
+    ring.hashrate(1000.0, T0 + 100)
+    monitor.check(now=T0 + 100)
+    ring.hashrate(1000.0, T0 + 200)
+    monitor.check(now=T0 + 200)
+    assert fired == []
+
+
+def test_fires_once_until_recovered():
+    monitor, ring, fired = _monitor(no_hashrate={"after": 60, "action": "restart"},
+                                    no_share={"action": "off"})
+    monitor.check(now=T0 + 60)
+    monitor.check(now=T0 + 70)
+    assert _rules(fired) == [("no_hashrate", "restart")]
+    assert monitor.status()["rules"]["no_hashrate"]["state"] == "firing"
+
+    # 恢复之后再卡住会再次触发
+    ring.hashrate(1000.0, T0 + 80)
+    monitor.check(now=T0 + 80)
+    assert monitor.status()["rules"]["no_hashrate"]["state"] == "ok"
+    monitor.check(now=T0 + 140)
+    assert _rules(fired) == [("no_hashrate", "restart")] * 2
+
+
+def test_off_rules_are_not_dispatched_and_grace_is_respected():
+    monitor, ring, fired = _monitor(grace=120, no_hashrate={"after": 60, "action": "off"},
+                                    no_share={"min": 60, "action": "alert"})
+    monitor.check(now=T0 + 100)
+    assert fired == []
+    monitor.check(now=T0 + 130)
+    assert _rules(fired) == [("no_share", "alert")]
+    assert monitor.status()["rules"]["no_hashrate"]["detail"]
+
+
+def test_restart_clears_firing_state():
+    monitor, ring, fired = _monitor(no_hashrate={"after": 60, "action": "restart"},
+                                    no_share={"action": "off"})
+    monitor.check(now=T0 + 60)
+    monitor.miner.started_at = T0 + 100
+    monitor.check(now=T0 + 110)
+    assert monitor.status()["rules"]["no_hashrate"]["state"] == "ok"
+    monitor.check(now=T0 + 160)
+    assert len(fired) == 2
+
+
+def test_watchdog_only_queues_restart_and_switch_pool():
+    from scash_manager.watchdog import Watchdog
+
+    class Miner:
+        def add_exit_listener(self, cb):
+            pass
+
+    wd = Watchdog(Miner(), {})
+    wd._running = True
+    for action in ("alert", "off", "restart", "switch_pool"):
+        wd.note_health("no_share", action)
+    queued = [wd._events.get_nowait() for _ in range(wd._events.qsize())]
+    assert queued == [("health", ("no_share", "restart")), ("health", ("no_share", "switch_pool"))]
@@ -0,0 +1,102 @@
+import pytest
+
+from scash_manager.history_store import HistoryStore, TIERS, parse_range
+
+# 对齐到 1 小时边界，方便算每层的桶
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = HistoryStore(str(tmp_path / "history" / "hashrate.db"))
+    yield s
+    s.close()
+
+
+def _by_ts(points):
+    return {p["ts"]: p for p in points}
+
+
+def test_tiers_roll_up_across_bucket_boundaries(store):
+    # 跨过 1m / 15m / 1h 边界的几次采样
+    samples = [
+        (T0 + 0, 100.0, 1, 0, 0),
+        (T0 + 30, 300.0, 2, 0, 0),
+        (T0 + 60, 200.0, 3, 1, 0),       # 下一个 1m 桶
+        (T0 + 900, 400.0, 4, 1, 1),      # 下一个 15m 桶
+        (T0 + 3600, 50.0, 5, 1, 1),      # 下一个 1h 桶
+        (T0 + 3610, 150.0, 6, 2, 1),
+    ]
+    for s in samples:
+        store.record(*s)
+    now = T0 + 3700
+
+    tier, points = store.query(7200, "1m", now=now)
+    assert tier == "1m"
+    m = _by_ts(points)
+    assert sorted(m) == [T0, T0 + 60, T0 + 900, T0 + 3600]
+    assert (m[T0]["hs"], m[T0]["min_hs"], m[T0]["max_hs"]) == (200.0, 100.0, 300.0)
+    # 份额 / 重启取桶内最新一次
+    assert (m[T0]["accepted"], m[T0]["rejected"]) == (2, 0)
+    assert m[T0 + 3600]["hs"] == 100.0 and m[T0 + 3600]["accepted"] == 6
+
+    _, points = store.query(7200, "15m", now=now)
+    q = _by_ts(points)
+    assert sorted(q) == [T0, T0 + 900, T0 + 3600]
+    assert q[T0]["hs"] == pytest.approx(200.0)
+    assert (q[T0]["min_hs"], q[T0]["max_hs"], q[T0]["accepted"], q[T0]["rejected"]) == (100.0, 300.0, 3, 1)
+    assert (q[T0 + 900]["hs"], q[T0 + 900]["restarts"]) == (400.0, 1)
+
+    _, points = store.query(7200, "1h", now=now)
+    h = _by_ts(points)
+    assert sorted(h) == [T0, T0 + 3600]
+    assert h[T0]["hs"] == pytest.approx(250.0)
+    assert (h[T0]["min_hs"], h[T0]["max_hs"], h[T0]["accepted"]) == (100.0, 400.0, 4)
+    assert (h[T0 + 3600]["min_hs"], h[T0 + 3600]["max_hs"]) == (50.0, 150.0)
+
+
+def test_query_range_excludes_older_buckets(store):
+    store.record(T0, 100.0, 0, 0, 0)
+    store.record(T0 + 600, 200.0, 0, 0, 0)
+    _, points = store.query(300, "1m", now=T0 + 700)
+    assert [p["ts"] for p in points] == [T0 + 600]
+
+
+def test_prune_uses_each_tier_retention(store):
+    retention = {name: keep for name, _, keep in TIERS}
+    old = T0
+    store.record(old, 100.0, 0, 0, 0)
+    # 过了 1m 层的保留期，但还在 15m / 1h 层的保留期内
+    now = old + retention["1m"] + 3600
+    store.prune(now=now)
+    span = now - old + 1
+    assert store.query(span, "1m", now=now)[1] == []
+    assert len(store.query(span, "15m", now=now)[1]) == 1
+    assert len(store.query(span, "1h", now=now)[1]) == 1
+
+    now = old + retention["15m"] + 3600
+    store.prune(now=now)
+    span = now - old + 1
+    assert store.query(span, "15m", now=now)[1] == []
+    assert len(store.query(span, "1h", now=now)[1]) == 1
+
+
+def test_pick_tier():
+    assert HistoryStore.pick_tier(3600) == "1m"
+    assert HistoryStore.pick_tier(7 * 86400) == "15m"
+    assert HistoryStore.pick_tier(90 * 86400) == "1h"
+    assert HistoryStore.pick_tier(3600, "1h") == "1h"
+    with pytest.raises(ValueError):
+        HistoryStore.pick_tier(3600, "5m")
+
+
+@pytest.mark.parametrize("text, seconds", [("90m", 5400), ("6h", 21600), ("7d", 604800),
+                                           ("2w", 1209600), ("3600", 3600)])
+def test_parse_range(text, seconds):
+    assert parse_range(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "0h", "abc", "5y"])
+def test_parse_range_rejects(text):
+    with pytest.raises(ValueError):
+        parse_range(text)
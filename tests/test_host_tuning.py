@@ -0,0 +1,91 @@
+from scash_manager import host_tuning
+from scash_manager.host_tuning import PAGE_2M, prepare, release_pages, reserve_pages
+
+MB = 1024 * 1024
+
+
+def _fake_host(tmp_path, total=0, free=0, available_mb=8192):
+    pool = tmp_path / "hugepages" / "hugepages-2048kB"
+    pool.mkdir(parents=True)
+    (pool / "nr_hugepages").write_text(str(total))
+    (pool / "free_hugepages").write_text(str(free))
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_text(f"MemTotal: 16000000 kB\nMemAvailable: {available_mb * 1024} kB\n")
+    return str(tmp_path / "hugepages"), str(meminfo), pool / "nr_hugepages"
+
+
+def test_reserve_capped_by_mem_available(tmp_path):
+    root, meminfo, nr = _fake_host(tmp_path, available_mb=1024)
+    result = reserve_pages(1170, PAGE_2M, root=root, meminfo_path=meminfo)
+    assert not result["ok"] and result["added"] == 0
+    assert "可用内存不足" in result["error"]
+    assert nr.read_text() == "0"
+
+
+def test_reserve_respects_margin(tmp_path):
+    # 1170 页 = 2340 MB；可用 2600 MB，留 512 MB 余量就不够了
+    root, meminfo, nr = _fake_host(tmp_path, available_mb=2600)
+    assert reserve_pages(1170, root=root, meminfo_path=meminfo)["error"]
+    result = reserve_pages(1170, root=root, meminfo_path=meminfo, mem_margin=0)
+    assert nr.read_text() == "1170"
+    assert result["added"] == 1170
+
+
+def test_reserve_only_adds_missing_pages(tmp_path):
+    root, meminfo, nr = _fake_host(tmp_path, total=100, free=60)
+    result = reserve_pages(100, root=root, meminfo_path=meminfo)
+    assert nr.read_text() == "140"
+    assert result["added"] == 40
+
+
+def test_release_only_frees_free_pages(tmp_path):
+    root, _, nr = _fake_host(tmp_path, total=1200, free=1000)
+    result = release_pages(1170, root=root)
+    assert result["ok"] and result["released"] == 1000
+    assert nr.read_text() == "200"
+
+
+def test_prepare_skips_reserve_without_hugepage_flag(monkeypatch):
+    calls = []
+    monkeypatch.setattr(host_tuning, "reserve_pages", lambda *a, **kw: calls.append(a))
+    mcfg = {"impl": "cpuminer", "algorithm": "randomscash"}
+    plan = prepare(mcfg, 4, {"reserve": True})
+    assert calls == [] and plan["reserve"] is None and plan["flags"] == []
+
+
+def test_prepare_does_not_reserve_by_default(monkeypatch):
+    calls = []
+    monkeypatch.setattr(host_tuning, "reserve_pages", lambda *a, **kw: calls.append(a))
+    plan = prepare({"impl": "xmrig", "algorithm": "rx/0"}, 4, {})
+    assert calls == [] and plan["reserve"] is None
+
+
+def test_crash_restart_keeps_reserved_count_for_release(tmp_path, monkeypatch):
+    root, meminfo, nr = _fake_host(tmp_path)
+    free = nr.parent / "free_hugepages"
+    reserve, release = host_tuning.reserve_pages, host_tuning.release_pages
+
+    def fake_reserve(count, page_size=PAGE_2M, **kw):
+        result = reserve(count, page_size, root=root, meminfo_path=meminfo, **kw)
+        # 矿工进程退出后页都空着：free 跟着 nr 走
+        free.write_text(nr.read_text())
+        return result
+
+    monkeypatch.setattr(host_tuning, "reserve_pages", fake_reserve)
+    monkeypatch.setattr(host_tuning, "release_pages",
+                        lambda count, page_size=PAGE_2M: release(count, page_size, root))
+    mcfg, tcfg = {"impl": "xmrig", "algorithm": "rx/0"}, {"reserve": True}
+
+    first = prepare(mcfg, 4, tcfg)
+    need = first["pages_needed"]
+    assert nr.read_text() == str(need) and first["added"] == {PAGE_2M: need}
+
+    # 崩溃重启：页还在，这次什么都没加，但累计数要带下来
+    second = prepare(mcfg, 4, tcfg, previous=first)
+    assert second["reserve"]["added"] == 0
+    assert second["added"] == {PAGE_2M: need}
+
+    # 手动停止：把第一次加的页全部还回去
+    host_tuning.release(second, tcfg)
+    assert nr.read_text() == "0"
+    assert second["added"] == {PAGE_2M: 0}
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from scash_manager.jobs import JobManager
+
+
+def _wait(jobs, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(j.done() for j in jobs):
+            return
+        time.sleep(0.01)
+    raise AssertionError("任务没有按时完成")
+
+
+def test_same_key_runs_in_submit_order():
+    manager = JobManager()
+    order = []
+    gate = threading.Event()
+    before = threading.active_count()
+
+    def make(i):
+        def fn(job):
+            if i == 0:
+                gate.wait(2)
+            order.append(i)
+            return i
+        return fn
+
+    jobs = [manager.submit("t", make(i), key="inst") for i in range(20)]
+    # 第一个任务卡住时，后面的任务只排队，不额外开线程
+    assert all(j.state == "queued" for j in jobs[1:])
+    assert threading.active_count() <= before + 1
+    gate.set()
+    _wait(jobs)
+    assert order == list(range(20))
+    assert [j.result for j in jobs] == list(range(20))
+    assert manager._queues == {}
+
+
+def test_failed_job_does_not_block_queue():
+    manager = JobManager()
+
+    def boom(job):
+        raise RuntimeError("boom")
+
+    first = manager.submit("t", boom, key="inst")
+    second = manager.submit("t", lambda job: "ok", key="inst")
+    _wait([first, second])
+    assert first.state == "failed" and first.error == "boom"
+    assert second.state == "succeeded" and second.result == "ok"
+
+
+def test_different_keys_run_concurrently():
+    manager = JobManager()
+    started = threading.Barrier(2, timeout=2)
+
+    def fn(job):
+        started.wait()
+        return job.key
+
+    jobs = [manager.submit("t", fn, key=k) for k in ("a", "b")]
+    _wait(jobs)
+    assert all(j.state == "succeeded" for j in jobs)
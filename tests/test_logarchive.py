@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from scash_manager import logarchive
+from scash_manager.logarchive import LogArchive
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """约 5 个 64 KB 分段、每 4 KB 一个索引点；每秒一行。"""
+    arc = LogArchive(str(tmp_path), segment_bytes=64 * 1024, max_bytes=1 << 30, index_every=4096)
+    lines = []
+    for i in range(5000):
+        line = f"[ts {i}] {'accepted' if i % 7 == 0 else 'speed'} line {i:05d} " + "x" * 20
+        lines.append((T0 + i, line))
+    arc._write_batch([(ts, [line]) for ts, line in lines], final=True)
+    yield arc, lines
+    arc._close_files()
+
+
+def _expected(lines, lo=float("-inf"), hi=float("inf"), grep=None):
+    pattern = re.compile(grep, re.IGNORECASE) if grep else None
+    return [line for ts, line in lines if lo <= ts <= hi and (pattern is None or pattern.search(line))]
+
+
+def test_latest_lines(archive):
+    arc, lines = archive
+    assert arc.status()["segments"] > 3
+    res = arc.query(limit=10)
+    assert res == {"lines": _expected(lines)[-10:], "limit_reached": True}
+
+
+@pytest.mark.parametrize("end_offset, grep, limit", [
+    (4999, None, 1),
+    (2500, None, 300),
+    (2500, "accepted", 50),
+    (4999, "line 0012[0-9]", 20),
+    (100, None, 500),
+])
+def test_latest_before_end_matches_full_scan(archive, end_offset, grep, limit):
+    arc, lines = archive
+    end = T0 + end_offset
+    want = _expected(lines, hi=end, grep=grep)
+    res = arc.query(end=end, grep=grep, limit=limit)
+    assert res["lines"] == want[-limit:]
+    assert res["limit_reached"] == (len(want) > limit)
+
+
+def test_range_from_start(archive):
+    arc, lines = archive
+    res = arc.query(start=T0 + 1000, end=T0 + 1100, limit=500)
+    assert res == {"lines": _expected(lines, T0 + 1000, T0 + 1100), "limit_reached": False}
+
+
+def test_latest_query_scans_only_the_tail(archive, monkeypatch):
+    arc, _ = archive
+    scanned = []
+    real = logarchive._scan_window
+
+    def counting(mm, pos, stop, *args):
+        scanned.append(stop - pos)
+        return real(mm, pos, stop, *args)
+
+    monkeypatch.setattr(logarchive, "_scan_window", counting)
+    assert len(arc.query(limit=10)["lines"]) == 10
+    # 只读最后一两个索引窗口，而不是整个段
+    assert sum(scanned) <= 2 * arc.index_every + 256
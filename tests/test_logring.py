@@ -0,0 +1,96 @@
+import logging
+
+from scash_manager.logfiles import MINER_LOGGER
+from scash_manager.logring import LogRing
+
+
+def test_only_miner_output_goes_to_miner_logger(caplog):
+    ring = LogRing(prefix="node1")
+    with caplog.at_level(logging.INFO, logger=MINER_LOGGER):
+        ring.push("启动 Miner 进程: /usr/local/bin/minerd", "manager")
+        ring.push("[2024-05-01 12:00:00] accepted: 1/1 (100.00%), 1.12 kH/s yes!", "miner")
+    miner_records = [r for r in caplog.records if r.name == MINER_LOGGER]
+    assert len(miner_records) == 1
+    assert "accepted: 1/1" in miner_records[0].getMessage()
+    assert miner_records[0].getMessage().startswith("[node1] ")
+    # 两条都在内存缓冲里
+    assert len(ring.read_since(None)[0]) == 2
+
+
+def _fill(ring, n, start=0):
+    ring.push("\n".join(f"line {i:04d}" for i in range(start, start + n)), "manager")
+
+
+def test_evicts_by_bytes_not_lines():
+    ring = LogRing(max_bytes=20_000)
+    _fill(ring, 1000)
+    assert ring.seq == 1000
+    assert ring.bytes <= 20_000
+    assert ring.bytes == sum(r.size() for r in ring.buffer)
+    # 最新的行都还在，最旧的被挤掉
+    kept = [r.message for r in ring.buffer]
+    assert kept[-1] == "line 0999" and len(kept) < 1000
+    assert kept == [f"line {i:04d}" for i in range(1000 - len(kept), 1000)]
+
+    # 行越长，能留下的行越少
+    long_ring = LogRing(max_bytes=20_000)
+    long_ring.push("\n".join("x" * 500 for _ in range(1000)), "manager")
+    assert len(long_ring.buffer) < len(kept)
+
+
+def test_eviction_keeps_at_least_one_record():
+    ring = LogRing(max_bytes=1)
+    ring.push("a very long line " * 100, "manager")
+    assert len(ring.buffer) == 1 and ring.seq == 1
+
+
+def test_set_max_bytes_shrinks_buffer():
+    ring = LogRing(max_bytes=100_000)
+    _fill(ring, 500)
+    before = len(ring.buffer)
+    ring.set_max_bytes(5_000)
+    assert ring.bytes <= 5_000 and len(ring.buffer) < before
+    assert ring.buffer[-1].message == "line 0499"
+
+
+def test_read_since_returns_only_new_lines():
+    ring = LogRing()
+    _fill(ring, 3)
+    lines, cursor, truncated = ring.read_since(None)
+    assert len(lines) == 3 and cursor == 3 and not truncated
+
+    _fill(ring, 2, start=3)
+    lines, cursor, truncated = ring.read_since(3)
+    assert [line.split("] ", 1)[1] for line in lines] == ["line 0003", "line 0004"]
+    assert cursor == 5 and not truncated
+
+    # 没有新行
+    assert ring.read_since(5) == ([], 5, False)
+
+
+def test_read_since_cursor_older_than_buffer_is_truncated():
+    ring = LogRing(max_bytes=5_000)
+    _fill(ring, 500)
+    first_seq = ring.seq - len(ring.buffer) + 1
+    assert first_seq > 1
+
+    # 正好接在最旧一条之前：不算落环
+    lines, cursor, truncated = ring.read_since(first_seq - 1)
+    assert len(lines) == len(ring.buffer) and not truncated
+
+    # 再旧一条：中间有行被挤掉了，返回整个缓冲并标记 truncated
+    lines, cursor, truncated = ring.read_since(first_seq - 2)
+    assert len(lines) == len(ring.buffer) and cursor == 500 and truncated
+    assert lines[-1].endswith("line 0499")
+
+
+def test_read_since_cursor_from_the_future_is_truncated():
+    ring = LogRing()
+    _fill(ring, 3)
+    lines, cursor, truncated = ring.read_since(1000)
+    assert len(lines) == 3 and cursor == 3 and truncated
+
+
+def test_read_since_on_empty_ring():
+    assert LogRing().read_since(None) == ([], 0, False)
+    assert LogRing().read_since(7) == ([], 0, False)
@@ -0,0 +1,98 @@
+import re
+
+import pytest
+
+from scash_manager.metrics import Registry
+from scash_manager.supervisor import MinerInstance
+
+SAMPLE_RE = re.compile(r"^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?P<labels>\{[^}]*\})? (?P<value>\S+)$")
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_exposition(text: str) -> dict:
+    """
+    按 Prometheus 文本格式逐行校验并解析：
+    返回 {name: {"help", "type", "samples": [(labels, value)]}}。
+    """
+    assert text.endswith("\n")
+    families: dict[str, dict] = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help_text = line[7:].split(" ", 1)
+            assert name not in families, f"{name} 的 HELP 出现了两次"
+            families[name] = current = {"help": help_text, "type": None, "samples": []}
+            current["name"] = name
+            continue
+        if line.startswith("# TYPE "):
+            name, type_name = line[7:].split(" ", 1)
+            assert current is not None and current["name"] == name
+            assert type_name in ("counter", "gauge", "histogram")
+            current["type"] = type_name
+            continue
+        m = SAMPLE_RE.match(line)
+        assert m, f"不合法的样本行: {line!r}"
+        name = m.group("name")
+        base = re.sub(r"_(bucket|sum|count)$", "", name) if current["type"] == "histogram" else name
+        # 同一个指标的样本必须紧跟在自己的 HELP / TYPE 后面
+        assert base == current["name"], f"{name} 不在自己的指标族里"
+        labels = dict(LABEL_RE.findall(m.group("labels") or ""))
+        value = m.group("value")
+        if value not in ("NaN", "+Inf", "-Inf"):
+            value = float(value)
+        current["samples"].append((labels, value))
+    return families
+
+
+def test_registry_render_groups_collector_samples():
+    reg = Registry()
+    reg.counter("c_total", "计数").inc(2)
+    reg.register_collector(lambda: [
+        ("g", "按实例", "gauge", 1, {"instance": "a"}),
+        ("other", "别的", "gauge", None, {}),
+        ("g", "按实例", "gauge", 2.5, {"instance": 'b"q'}),
+    ])
+    fams = parse_exposition(reg.render())
+    assert fams["c_total"]["samples"] == [({}, 2.0)]
+    assert fams["g"]["samples"] == [({"instance": "a"}, 1.0), ({"instance": 'b\\"q'}, 2.5)]
+    assert fams["other"]["samples"] == [({}, "NaN")]
+
+
+@pytest.fixture
+def webapp():
+    from scash_manager import webapp as module
+
+    extra = MinerInstance("node1", {"miner": {"impl": "xmrig"}, "log_archive": {"enabled": False}})
+    module.supervisor.add(extra)
+    yield module
+    module.supervisor.remove("node1")
+
+
+def _speed(hs):
+    return f"[2024-05-01 12:00:10.000]  miner    speed 10s/60s/15m {hs} n/a n/a H/s max {hs} H/s\n"
+
+
+def test_metrics_endpoint(webapp):
+    webapp._default.ring.set_parser("xmrig")
+    webapp._default.ring.push(_speed(1500.5), "miner")
+    node1 = webapp.supervisor.get("node1")
+    node1.ring.set_parser("xmrig")
+    node1.ring.push(_speed(2499.5), "miner")
+
+    resp = webapp.app.test_client().get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+    fams = parse_exposition(resp.get_data(as_text=True))
+    for name, fam in fams.items():
+        assert fam["help"] and fam["type"], name
+
+    per_instance = {labels["instance"]: v for labels, v in fams["scash_miner_hashrate_hs"]["samples"]}
+    assert per_instance == {"default": 1500.5, "node1": 2499.5}
+    assert all(labels["source"] == "log" for labels, _ in fams["scash_miner_hashrate_hs"]["samples"])
+    (labels, total), = fams["scash_miner_hashrate_total_hs"]["samples"]
+    assert labels == {} and total == sum(per_instance.values())
+
+    assert fams["scash_miner_up"]["type"] == "gauge"
+    assert fams["scash_miner_shares_accepted_total"]["type"] == "counter"
+    assert fams["scash_manager_http_request_duration_seconds"]["type"] == "histogram"
@@ -0,0 +1,181 @@
+import json
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scash_manager.miner_api import MinerApiPoller, api_cmd_args
+from scash_manager.supervisor import MinerInstance
+
+XMRIG_SUMMARY = {
+    "uptime": 120,
+    "connection": {"pool": "pool.example:3333", "ping": 43, "diff": 120001},
+    "results": {"diff_current": 120001, "shares_good": 5, "shares_total": 7},
+    "hashrate": {
+        "total": [16840.5, 16830.1, None],
+        "threads": [[4210.1, 4200.0, None], [None, 4100.0, None]],
+    },
+}
+
+SRBMINER_SUMMARY = {
+    "mining_time": 300,
+    "algorithms": [{
+        "name": "randomx",
+        "hashrate": {"cpu": {"thread0": 1100.5, "thread1": 1120.0, "total": 4501.0}, "now": 4400},
+        "shares": {"accepted": 3, "rejected": 2},
+        "pool": {"pool": "pool.example:3334", "difficulty": 12000, "latency_ms": 44},
+    }],
+}
+
+CPUMINER_REPLIES = {
+    "summary": "NAME=cpuminer-opt;VER=3.0.9;ALGO=randomscash;CPUS=2;KHS=1.12;ACC=3;REJ=1;"
+               "DIFF=0.01;UPTIME=300;TS=1700000000|\x00",
+    "threads": "CPU=0;KHS=0.56|CPU=1;KHS=0.56|\x00",
+}
+
+
+def _dead_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def http_api():
+    """按路径返回 JSON 的本地 HTTP 桩：routes={path: dict}。"""
+    routes = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path not in routes:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps(routes[self.path]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield routes, httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cpuminer_api():
+    """cpuminer --api-bind 的 TCP 桩：收到命令，回一段文本，然后关闭连接。"""
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            command = self.request.recv(64).decode().strip("\x00 \n")
+            self.request.sendall(CPUMINER_REPLIES.get(command, "").encode())
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_xmrig_summary(http_api):
+    routes, port = http_api
+    routes["/2/summary"] = XMRIG_SUMMARY
+    m = MinerApiPoller("xmrig", port).poll_once()
+    assert m["source"] == "api" and m["impl"] == "xmrig"
+    assert m["hashrate_hs"] == 16840.5
+    assert (m["hashrate_10s"], m["hashrate_60s"], m["hashrate_15m"]) == (16840.5, 16830.1, None)
+    assert m["threads_hs"] == [4210.1, 4100.0]
+    assert (m["accepted"], m["rejected"]) == (5, 2)
+    assert m["difficulty"] == 120001
+    assert m["ping_ms"] == 43 and m["pool"] == "pool.example:3333"
+    assert m["uptime"] == 120
+
+
+def test_srbminer_summary(http_api):
+    routes, port = http_api
+    routes["/"] = SRBMINER_SUMMARY
+    m = MinerApiPoller("srbminer", port).poll_once()
+    assert m["impl"] == "srbminer"
+    assert m["hashrate_hs"] == m["hashrate_10s"] == 4501.0
+    assert m["threads_hs"] == [1100.5, 1120.0]
+    assert (m["accepted"], m["rejected"]) == (3, 2)
+    assert m["difficulty"] == 12000 and m["ping_ms"] == 44
+    assert m["pool"] == "pool.example:3334" and m["uptime"] == 300
+
+
+def test_cpuminer_summary(cpuminer_api):
+    m = MinerApiPoller("cpuminer", cpuminer_api).poll_once()
+    assert m["impl"] == "cpuminer"
+    assert m["hashrate_hs"] == pytest.approx(1120.0)
+    assert m["threads_hs"] == [pytest.approx(560.0), pytest.approx(560.0)]
+    assert (m["accepted"], m["rejected"]) == (3, 1)
+    assert m["difficulty"] == 0.01 and m["uptime"] == 300
+
+
+@pytest.mark.parametrize("impl", ["xmrig", "srbminer", "cpuminer"])
+def test_api_down_returns_none(impl):
+    poller = MinerApiPoller(impl, _dead_port(), timeout=0.5)
+    assert poller.poll_once() is None
+    assert poller.latest() is None
+
+
+def test_http_error_is_not_cached(http_api):
+    routes, port = http_api
+    poller = MinerApiPoller("xmrig", port)
+    routes["/2/summary"] = XMRIG_SUMMARY
+    assert poller.poll_once() is not None
+    routes.clear()
+    # 404：这次拉取失败，latest() 仍是上一次成功的结果（过期前）
+    assert poller.poll_once() is None
+    assert poller.latest()["hashrate_hs"] == 16840.5
+    assert poller.latest(max_age=-1) is None
+
+
+def test_api_cmd_args_bind():
+    assert api_cmd_args("xmrig", 18092) == ["--http-host", "127.0.0.1", "--http-port", "18092"]
+    assert api_cmd_args("cpuminer", 4048) == ["--api-bind", "127.0.0.1:4048"]
+    # SRBMiner 没有监听地址参数：只能打开 API + 端口
+    assert api_cmd_args("srbminer", 21550) == ["--api-enable", "--api-port", "21550"]
+    assert api_cmd_args("unknown", 1) == []
+
+
+def _instance(poller) -> MinerInstance:
+    inst = MinerInstance("api-test", {"miner": {"impl": "xmrig"}, "log_archive": {"enabled": False}})
+    inst.ring.set_parser("xmrig")
+    inst.api_poller = poller
+    return inst
+
+
+def test_falls_back_to_log_when_api_down():
+    inst = _instance(MinerApiPoller("xmrig", _dead_port(), timeout=0.5))
+    inst.api_poller.poll_once()
+    inst.ring.push(
+        "[2024-05-01 12:00:10.000]  miner    speed 10s/60s/15m 16840.0 16830.0 16810.0 H/s max 16900.0 H/s\n"
+        "[2024-05-01 12:00:11.000]  cpu      accepted (5/2) diff 120001 (43 ms)\n",
+        "miner",
+    )
+    hr = inst.current_hashrate()
+    assert hr["source"] == "log" and hr["hs"] == 16840.0
+    assert inst.current_shares() == (5, 2)
+
+
+def test_prefers_api_over_log(http_api):
+    routes, port = http_api
+    routes["/2/summary"] = {**XMRIG_SUMMARY, "hashrate": {"total": [20000.0, None, None]}}
+    inst = _instance(MinerApiPoller("xmrig", port))
+    inst.api_poller.poll_once()
+    inst.ring.push("[2024-05-01 12:00:10.000]  miner    speed 10s/60s/15m 16840.0 n/a n/a H/s max 16900.0 H/s\n",
+                   "miner")
+    hr = inst.current_hashrate()
+    assert hr["source"] == "api" and hr["hs"] == 20000.0
+    assert inst.current_shares() == (5, 2)
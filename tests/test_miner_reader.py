@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+import pytest
+
+from scash_manager import miner as miner_mod
+from scash_manager.miner import Miner
+
+
+def _wait_for(pred, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return
+        time.sleep(0.01)
+    raise AssertionError("等待超时")
+
+
+@pytest.fixture
+def reader(monkeypatch):
+    """起一个 Miner._reader 读 os.pipe()；返回 (写端 fd, 收到的批次列表, 读线程)。"""
+    monkeypatch.setattr(miner_mod, "FLUSH_PARTIAL", 0.2)
+    batches = []
+    miner = Miner({}, log_cb=lambda text, source="manager": batches.append((text, source)))
+    r, w = os.pipe()
+    thread = threading.Thread(target=miner._reader, args=(os.fdopen(r, "rb", buffering=0),), daemon=True)
+    thread.start()
+    yield w, batches, thread
+    try:
+        os.close(w)
+    except OSError:
+        pass
+    thread.join(timeout=2)
+
+
+def test_complete_lines_are_batched(reader):
+    w, batches, _ = reader
+    os.write(w, b"line 1\nline 2\nline 3\n")
+    _wait_for(lambda: batches)
+    assert batches == [("line 1\nline 2\nline 3\n", "miner")]
+
+
+def test_partial_line_waits_for_the_rest(reader):
+    w, batches, _ = reader
+    os.write(w, b"speed 10s/60s/15m 1234.5")
+    time.sleep(0.05)
+    os.write(w, b" n/a n/a H/s\nnext")
+    _wait_for(lambda: batches)
+    # 完整的行一起输出，没换行的尾巴留着
+    assert batches[0] == ("speed 10s/60s/15m 1234.5 n/a n/a H/s\n", "miner")
+    assert len(batches) == 1
+
+
+def test_partial_line_is_flushed_after_timeout(reader):
+    w, batches, _ = reader
+    t0 = time.monotonic()
+    os.write(w, b"Press any key to continue...")
+    _wait_for(lambda: batches)
+    assert batches == [("Press any key to continue...", "miner")]
+    assert time.monotonic() - t0 >= 0.15
+
+    os.write(w, b"ok\n")
+    _wait_for(lambda: len(batches) == 2)
+    assert batches[1] == ("ok\n", "miner")
+
+
+def test_eof_flushes_tail_and_stops(reader):
+    w, batches, thread = reader
+    os.write(w, b"a\nb\nunterminated")
+    os.close(w)
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert "".join(text for text, _ in batches) == "a\nb\nunterminated"
+
+
+def test_overlong_line_is_emitted_in_chunks(reader, monkeypatch):
+    monkeypatch.setattr(miner_mod, "READ_CHUNK", 16)
+    w, batches, _ = reader
+    os.write(w, b"x" * 40)
+    _wait_for(lambda: "".join(text for text, _ in batches) == "x" * 40)
+    # 超过 READ_CHUNK 的半行不等超时，直接输出
+    assert len(batches) >= 2 and len(batches[0][0]) >= 16
@@ -0,0 +1,61 @@
+from collections import Counter
+
+import pytest
+
+from scash_manager.logring import LogRing
+from scash_manager.parsers import get_parser, load_fixture
+
+# 每个样例输出应该解析出的事件数；矿工输出格式变了（或解析器改坏了）这里会先报错
+EXPECTED_EVENTS = {
+    "cpuminer": {"conn_lost": 3, "hashrate": 15, "job": 5, "share": 4},
+    "xmrig": {"conn_lost": 3, "hashrate": 12, "huge_pages": 2, "job": 5, "share": 7},
+    "srbminer": {"conn_lost": 2, "hashrate": 8, "job": 3, "share": 5},
+}
+
+
+def _ring(impl: str) -> LogRing:
+    ring = LogRing()
+    ring.set_parser(impl)
+    ring.push("\n".join(load_fixture(impl)), "miner")
+    return ring
+
+
+@pytest.mark.parametrize("impl", sorted(EXPECTED_EVENTS))
+def test_fixture_event_counts(impl):
+    parser = get_parser(impl)
+    counts = Counter(ev["type"] for line in load_fixture(impl) for ev in parser.parse(line))
+    assert dict(counts) == EXPECTED_EVENTS[impl]
+
+
+def test_xmrig_fixture():
+    ring = _ring("xmrig")
+    assert ring.hashrate()["hs"] == 16840.0
+    assert ring.shares() == (5, 2)
+    stats = ring.share_stats()
+    assert stats["stale"] == 1
+    assert stats["latency_ms"] == 43
+    assert stats["last_job"]["height"] == 3321460
+    assert stats["hashrate_windows"] == {"10s": 16840.0, "60s": 16830.0, "15m": 16810.0}
+    assert ring.conn_errors() == 3
+    huge = ring.huge_pages()
+    assert (huge["dataset"]["allocated"], huge["dataset"]["total"]) == (1168, 1168)
+    assert (huge["threads"]["allocated"], huge["threads"]["total"]) == (16, 16)
+
+
+def test_cpuminer_fixture():
+    ring = _ring("cpuminer")
+    assert ring.hashrate()["hs"] == pytest.approx(1121.4)
+    assert ring.shares() == (3, 1)
+    assert ring.conn_errors() == 3
+
+
+def test_srbminer_fixture():
+    ring = _ring("srbminer")
+    assert ring.hashrate()["hs"] == 4501.0
+    assert ring.shares() == (3, 2)
+    stats = ring.share_stats()
+    assert stats["stale"] == 1
+    assert stats["latency_ms"] == 44
+    assert (stats["last_job"]["height"], stats["last_job"]["diff"]) == (123458, 12000)
+    assert set(stats["hashrate_windows"]) == {"10s", "60s", "1h"}
+    assert ring.conn_errors() == 2
@@ -0,0 +1,40 @@
+import socket
+import time
+
+from scash_manager.pools import PoolSelector
+
+
+def _dead_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"stratum+tcp://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_start_does_not_probe_synchronously(monkeypatch):
+    calls = []
+
+    def slow_probe(urls, timeout):
+        calls.append(urls)
+        time.sleep(0.5)
+        return []
+
+    monkeypatch.setattr("scash_manager.pools.probe_pools", slow_probe)
+    urls = ["stratum+tcp://a:1", "stratum+tcp://b:2"]
+    selector = PoolSelector(urls)
+    t0 = time.monotonic()
+    selector.start()
+    # 探测在后台线程里跑，start() 立即返回；结果出来之前按配置顺序选
+    assert time.monotonic() - t0 < 0.2
+    assert selector.choose() == urls[0]
+    selector.stop()
+
+
+def test_choose_prefers_reachable_pool_after_probe():
+    dead = _dead_url()
+    with socket.socket() as live:
+        live.bind(("127.0.0.1", 0))
+        live.listen()
+        live_url = f"stratum+tcp://127.0.0.1:{live.getsockname()[1]}"
+        selector = PoolSelector([dead, live_url], timeout=0.3)
+        selector.probe_now()
+        assert selector.choose() == live_url
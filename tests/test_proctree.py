@@ -0,0 +1,89 @@
+import os
+import signal
+import subprocess
+import time
+
+import pytest
+
+from scash_manager import proctree
+from scash_manager.proctree import ProcessTree, descendants
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="需要 Linux /proc")
+
+
+def _wait_for(pred, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return
+        time.sleep(0.02)
+    raise AssertionError("等待超时")
+
+
+@pytest.fixture
+def procs():
+    started = []
+
+    def spawn(cmd, **kw):
+        proc = subprocess.Popen(cmd, **kw)
+        started.append(proc)
+        return proc
+
+    yield spawn
+    for proc in started:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def _sleep_tree(spawn):
+    """sh 下面挂一个后台 sleep（新会话，和 Miner 一样不在测试的进程组里）。"""
+    root = spawn(["sh", "-c", "sleep 30 & sleep 30"], start_new_session=True)
+    _wait_for(lambda: len(descendants(root.pid)) >= 1)
+    return root
+
+
+def test_snapshot_and_kill_only_the_tree(procs):
+    root = _sleep_tree(procs)
+    bystander = procs(["sleep", "30"])
+
+    tree = ProcessTree.snapshot(root.pid)
+    try:
+        pids = tree.pids()
+        assert pids[0] == root.pid and len(pids) >= 2
+        assert bystander.pid not in pids
+        assert sorted(tree.alive()) == sorted(pids)
+
+        sent = tree.signal(signal.SIGKILL)
+        assert sorted(sent) == sorted(pids)
+        root.wait(timeout=5)
+        _wait_for(lambda: tree.alive() == [])
+        # 不在树里的进程不受影响
+        assert bystander.poll() is None
+    finally:
+        tree.close()
+
+
+def test_signal_skips_root_and_exited_members(procs):
+    # 子进程被杀之后 sh 自己还在（一直循环）
+    root = procs(["sh", "-c", "sleep 30 & sleep 30 & while :; do sleep 1; done"],
+                 start_new_session=True)
+    _wait_for(lambda: len(descendants(root.pid)) >= 3)
+    tree = ProcessTree.snapshot(root.pid)
+    try:
+        children = [p for p in tree.pids() if p != root.pid]
+        assert tree.signal(signal.SIGTERM, skip=(root.pid,)) == children
+        _wait_for(lambda: tree.alive() == [root.pid])
+        # 已经退出的成员不会再发信号（PID 被复用也不会误杀）
+        assert tree.signal(signal.SIGTERM, skip=(root.pid,)) == []
+        assert root.poll() is None
+    finally:
+        tree.close()
+
+
+def test_descendants_without_children_file(procs, monkeypatch):
+    root = _sleep_tree(procs)
+    expected = descendants(root.pid)
+    # 模拟没开 CONFIG_PROC_CHILDREN 的内核：按 /proc/<pid>/stat 的父进程建树
+    monkeypatch.setattr(proctree, "_children_supported", lambda pid, proc_root=None: False)
+    assert sorted(descendants(root.pid)) == sorted(expected)
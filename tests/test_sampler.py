@@ -0,0 +1,24 @@
+from scash_manager.sampler import MetricsSampler
+
+
+class FakeStore:
+    def __init__(self):
+        self.records = []
+
+    def record(self, *args):
+        self.records.append(args)
+
+
+def test_unknown_hashrate_is_not_recorded():
+    samples = iter([
+        {"hs": None, "accepted": 0, "rejected": 0, "restarts": 1},
+        {"hs": 0.0, "accepted": 0, "rejected": 0, "restarts": 1},
+        {"hs": 1500.0, "accepted": 2, "rejected": 0, "restarts": 1},
+    ])
+    store, seen = FakeStore(), []
+    sampler = MetricsSampler(lambda: next(samples), store=store, sinks=[lambda ts, m: seen.append(m["hs"])])
+    for ts in (100, 110, 120):
+        sampler.sample_once(ts)
+    # sink 照样拿到每次采样；存储只记有读数的（停机时的 0 是真实读数）
+    assert seen == [None, 0.0, 1500.0]
+    assert store.records == [(110, 0.0, 0, 0, 1), (120, 1500.0, 2, 0, 1)]
@@ -0,0 +1,76 @@
+import math
+import random
+
+import pytest
+
+from scash_manager.stats import RollingHashrate, humanize_hs
+
+
+def _brute(values, alpha):
+    ewma = None
+    for v in values:
+        ewma = v if ewma is None else alpha * v + (1 - alpha) * ewma
+    avg = sum(values) / len(values)
+    return {
+        "count": len(values),
+        "last_hs": values[-1],
+        "avg_hs": avg,
+        "min_hs": min(values),
+        "max_hs": max(values),
+        "stddev_hs": math.sqrt(sum((v - avg) ** 2 for v in values) / len(values)),
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_summary_matches_brute_force(seed):
+    rng = random.Random(seed)
+    maxlen, interval, alpha = 12, 60, 0.3
+    rh = RollingHashrate(maxlen=maxlen, min_interval=interval, alpha=alpha)
+
+    # 每个点：(封口时的值, 封口前被覆盖过的值)；窗口只保留最后 maxlen 个点
+    points = []
+    ewma, now = None, 1_000_000
+    for _ in range(200):
+        if rng.random() < 0.3 and points:
+            # 同一个时间段内再采一次：覆盖当前点
+            now += rng.randint(0, interval - 1 - (now - points[-1][0]))
+            points[-1] = (points[-1][0], rng.uniform(0, 5000))
+        else:
+            now = (points[-1][0] if points else now) + interval + rng.randint(0, 30)
+            if points:
+                ewma = points[-1][1] if ewma is None else alpha * points[-1][1] + (1 - alpha) * ewma
+            # 有时是一段递增 / 递减（单调队列最容易出错的情况）
+            hs = rng.choice([rng.uniform(0, 5000), len(points) * 10.0, 5000.0 - len(points)])
+            points.append((now, hs))
+        rh.add(points[-1][1], now)
+
+        window = [hs for _, hs in points[-maxlen:]]
+        got = rh.summary()
+        want = _brute(window, alpha)
+        assert got["count"] == want["count"]
+        assert got["last_hs"] == want["last_hs"]
+        assert got["min_hs"] == want["min_hs"]
+        assert got["max_hs"] == want["max_hs"]
+        assert got["avg_hs"] == pytest.approx(want["avg_hs"])
+        assert got["stddev_hs"] == pytest.approx(want["stddev_hs"], rel=1e-6, abs=1e-6)
+        # EWMA 从第一个点开始一直累积，不随窗口过期重算
+        expected_ewma = points[-1][1] if ewma is None else alpha * points[-1][1] + (1 - alpha) * ewma
+        assert got["ewma_hs"] == pytest.approx(expected_ewma)
+
+    assert [p["hs"] for p in rh.points()] == [hs for _, hs in points[-maxlen:]]
+    assert len(rh) == maxlen
+
+
+def test_empty_and_single_point():
+    rh = RollingHashrate(maxlen=3, min_interval=60)
+    assert rh.summary() is None and rh.points() == []
+    rh.add(100.0, now=0)
+    rh.add(120.0, now=30)
+    s = rh.summary()
+    assert s["count"] == 1 and s["min_hs"] == s["max_hs"] == s["avg_hs"] == 120.0
+    assert s["stddev_hs"] == 0.0
+
+
+def test_humanize_hs():
+    assert humanize_hs(None) is None
+    assert humanize_hs(1234.567) == "1234.57 H/s"
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from scash_manager.stratum_proxy import StratumProxy
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(pred, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return
+        time.sleep(0.02)
+    raise AssertionError("等待超时")
+
+
+class FakePool:
+    """asyncio 实现的假矿池，跑在自己的线程里；记录收到的 submit。"""
+
+    def __init__(self, extranonce1="aabbccdd", extranonce2_size=4):
+        self.extranonce1 = extranonce1
+        self.extranonce2_size = extranonce2_size
+        self.submits: list[list] = []
+        self.writers: list[asyncio.StreamWriter] = []
+        self.loop = asyncio.new_event_loop()
+        self.port = _free_port()
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait(5)
+
+    @property
+    def url(self) -> str:
+        return f"stratum+tcp://127.0.0.1:{self.port}"
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        )
+        started.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        self.writers.append(writer)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            msg = json.loads(line)
+            method, params = msg["method"], msg.get("params") or []
+            if method == "mining.subscribe":
+                result = [[["mining.notify", "1"]], self.extranonce1, self.extranonce2_size]
+            elif method == "mining.submit":
+                self.submits.append(params)
+                result = True
+            else:
+                result = True
+            writer.write((json.dumps({"id": msg["id"], "result": result, "error": None}) + "\n").encode())
+            await writer.drain()
+
+    def push(self, method: str, params: list):
+        """给所有连着的代理发一条通知。"""
+        data = (json.dumps({"id": None, "method": method, "params": params}) + "\n").encode()
+
+        def _write():
+            for w in self.writers:
+                if not w.is_closing():
+                    w.write(data)
+
+        self.loop.call_soon_threadsafe(_write)
+
+    def close(self):
+        def _close():
+            self.server.close()
+            for w in self.writers:
+                w.close()
+
+        self.loop.call_soon_threadsafe(_close)
+        time.sleep(0.1)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class Worker:
+    """下游矿工：发请求、按 id 等回复，顺带收集通知。"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.notifications: list[dict] = []
+
+    @classmethod
+    async def connect(cls, port: int) -> "Worker":
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        return cls(reader, writer)
+
+    async def call(self, method: str, params: list):
+        req_id = self.next_id
+        self.next_id += 1
+        self.writer.write((json.dumps({"id": req_id, "method": method, "params": params}) + "\n").encode())
+        await self.writer.drain()
+        while True:
+            msg = await self.read()
+            if msg.get("id") == req_id:
+                return msg
+
+    async def read(self, timeout=5.0) -> dict:
+        line = await asyncio.wait_for(self.reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("代理关闭了连接")
+        msg = json.loads(line)
+        if msg.get("method"):
+            self.notifications.append(msg)
+        return msg
+
+    async def wait_notification(self, method: str, timeout=5.0) -> dict:
+        deadline = time.time() + timeout
+        while True:
+            for msg in self.notifications:
+                if msg["method"] == method:
+                    self.notifications.remove(msg)
+                    return msg
+            await self.read(max(0.01, deadline - time.time()))
+
+    async def handshake(self, name: str, extranonce: bool = False) -> list:
+        if extranonce:
+            await self.call("mining.extranonce.subscribe", [])
+        sub = await self.call("mining.subscribe", ["test-miner/1.0"])
+        await self.call("mining.authorize", [name, "x"])
+        return sub["result"]
+
+
+@pytest.fixture
+def pools():
+    created = []
+
+    def make(**kw):
+        pool = FakePool(**kw)
+        created.append(pool)
+        return pool
+
+    yield make
+    for pool in created:
+        pool.close()
+
+
+@pytest.fixture
+def proxy_for():
+    proxies = []
+
+    def make(*pools):
+        proxy = StratumProxy([p.url for p in pools], user="wallet", listen_port=_free_port(),
+                             retry_delay=0.1, timeout=2)
+        proxy.start()
+        proxies.append(proxy)
+        _wait_for(lambda: proxy.stats()["upstream"] is not None)
+        return proxy
+
+    yield make
+    for proxy in proxies:
+        proxy.stop()
+
+
+def test_workers_get_disjoint_extranonce_and_prefixed_submits(pools, proxy_for):
+    pool = pools()
+    proxy = proxy_for(pool)
+
+    async def scenario():
+        a = await Worker.connect(proxy.listen_port)
+        b = await Worker.connect(proxy.listen_port)
+        _, en1_a, size_a = await a.handshake("rig-a")
+        _, en1_b, size_b = await b.handshake("rig-b")
+        assert en1_a != en1_b
+        assert {en1_a, en1_b} == {"aabbccdd00", "aabbccdd01"}
+        assert size_a == size_b == 3
+
+        ok_a = await a.call("mining.submit", ["rig-a", "job1", "000001", "5f5e1000", "deadbeef"])
+        ok_b = await b.call("mining.submit", ["rig-b", "job1", "000001", "5f5e1000", "cafebabe"])
+        assert ok_a["result"] is True and ok_b["result"] is True
+
+        # 连接还在时按矿工统计
+        stats = proxy.stats()
+        assert stats["accepted"] == 2
+        assert sorted((w["name"], w["accepted"]) for w in stats["workers"]) == [("rig-a", 1), ("rig-b", 1)]
+        return en1_a, en1_b
+
+    en1_a, en1_b = asyncio.run(scenario())
+    # 上游看到的 extranonce2 = 该矿工的前缀 + 矿工自己的 extranonce2，账号是代理的
+    by_nonce = {s[4]: s for s in pool.submits}
+    assert by_nonce["deadbeef"] == ["wallet", "job1", en1_a[-2:] + "000001", "5f5e1000", "deadbeef"]
+    assert by_nonce["cafebabe"] == ["wallet", "job1", en1_b[-2:] + "000001", "5f5e1000", "cafebabe"]
+
+
+def test_notify_is_broadcast(pools, proxy_for):
+    pool = pools()
+    proxy = proxy_for(pool)
+
+    async def scenario():
+        a = await Worker.connect(proxy.listen_port)
+        await a.handshake("rig-a")
+        pool.push("mining.notify", ["job2", "00" * 32, "", "", [], "20000000", "1d00ffff", "5f5e1000", True])
+        msg = await a.wait_notification("mining.notify")
+        assert msg["params"][0] == "job2"
+
+    asyncio.run(scenario())
+
+
+def test_set_extranonce(pools, proxy_for):
+    pool = pools()
+    proxy = proxy_for(pool)
+
+    async def scenario():
+        pushed = await Worker.connect(proxy.listen_port)
+        legacy = await Worker.connect(proxy.listen_port)
+        await pushed.handshake("rig-a", extranonce=True)
+        await legacy.handshake("rig-b")
+
+        pool.push("mining.set_extranonce", ["11223344", 4])
+        # 订阅了 extranonce 的矿工收到新的 extranonce1（带自己的前缀）
+        msg = await pushed.wait_notification("mining.set_extranonce")
+        assert msg["params"] == ["1122334400", 3]
+        # 没订阅的矿工被断开，让它重连拿新的
+        with pytest.raises(ConnectionError):
+            while True:
+                await legacy.read()
+
+        ok = await pushed.call("mining.submit", ["rig-a", "job1", "000002", "5f5e1000", "00000001"])
+        assert ok["result"] is True
+
+    asyncio.run(scenario())
+    assert pool.submits[-1][2] == "00000002"
+
+
+def test_failover_to_next_upstream(pools, proxy_for):
+    primary = pools()
+    backup = pools(extranonce1="99887766")
+    proxy = proxy_for(primary, backup)
+    assert proxy.stats()["upstream"] == primary.url
+
+    primary.close()
+    _wait_for(lambda: proxy.stats()["upstream"] == backup.url)
+    assert proxy.stats()["failovers"] == 1
+
+    async def scenario():
+        w = await Worker.connect(proxy.listen_port)
+        _, en1, _ = await w.handshake("rig-a")
+        assert en1.startswith("99887766")
+        ok = await w.call("mining.submit", ["rig-a", "job9", "000003", "5f5e1000", "00000002"])
+        assert ok["result"] is True
+
+    asyncio.run(scenario())
+    assert backup.submits and backup.submits[-1][1] == "job9"
+    assert primary.submits == []
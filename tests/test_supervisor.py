@@ -0,0 +1,69 @@
+from scash_manager.supervisor import Supervisor
+
+BASE = {
+    "wallet": "w1",
+    "coin": "scash",
+    "miner": {"impl": "cpuminer", "url": "stratum+tcp://pool-a:3333", "threads": 4},
+    "watchdog": {"interval": 5},
+    "log_archive": {"enabled": False},
+    "instances": [
+        {"name": "node1", "miner": {"threads": 2}},
+        {"name": "own-wallet", "wallet": "w9", "miner": {"threads": 2}},
+    ],
+}
+
+
+def _supervisor(base):
+    sup = Supervisor()
+    sup.load_instances(base)
+    return sup
+
+
+def test_stale_configs_follow_top_level_changes():
+    base = {**BASE, "miner": dict(BASE["miner"]), "watchdog": dict(BASE["watchdog"])}
+    sup = _supervisor(base)
+    assert sup.stale_configs(base) == []
+
+    base["wallet"] = "w2"
+    base["miner"]["url"] = "stratum+tcp://pool-b:3333"
+    base["watchdog"]["interval"] = 10
+    stale = dict((inst.name, cfg) for inst, cfg in sup.stale_configs(base))
+    assert set(stale) == {"node1", "own-wallet"}
+    assert stale["node1"]["wallet"] == "w2"
+    assert stale["node1"]["miner"]["url"] == "stratum+tcp://pool-b:3333"
+    assert stale["node1"]["miner"]["threads"] == 2
+    assert stale["node1"]["watchdog"]["interval"] == 10
+    # 实例自己配置的字段不被顶层覆盖
+    assert stale["own-wallet"]["wallet"] == "w9"
+
+
+def test_reconfigure_replaces_config():
+    base = {**BASE, "miner": dict(BASE["miner"])}
+    sup = _supervisor(base)
+    node = sup.get("node1")
+    base["wallet"] = ""
+    (inst, cfg), = [(i, c) for i, c in sup.stale_configs(base) if i.name == "node1"]
+    assert inst.reconfigure(cfg) is False
+    assert node.cfg["wallet"] == ""
+    assert node.miner is None          # 配置不完整，不创建 Miner
+    assert [i.name for i, _ in sup.stale_configs(base)] == []
+
+
+def test_instances_inherit_host_tuning():
+    base = {**BASE, "host_tuning": {"hugepages": True, "reserve": True, "mem_margin_mb": 1024},
+            "logging": {"ring_bytes": 4096},
+            "instances": [
+                {"name": "node1"},
+                {"name": "node2", "host_tuning": {"reserve": False}},
+            ]}
+    sup = _supervisor(base)
+    assert sup.get("node1").cfg["host_tuning"] == {"hugepages": True, "reserve": True, "mem_margin_mb": 1024}
+    assert sup.get("node2").cfg["host_tuning"] == {"hugepages": True, "reserve": False, "mem_margin_mb": 1024}
+    # logging 只有顶层一份：实例配置里没有，内存缓冲大小直接用顶层的
+    assert "logging" not in sup.get("node1").cfg
+    assert sup.get("node1").ring.max_bytes == 4096
+
+    base["host_tuning"] = {**base["host_tuning"], "mem_margin_mb": 256}
+    stale = dict((inst.name, cfg) for inst, cfg in sup.stale_configs(base))
+    assert stale["node1"]["host_tuning"]["mem_margin_mb"] == 256
+    assert stale["node2"]["host_tuning"] == {"hugepages": True, "reserve": False, "mem_margin_mb": 256}
@@ -0,0 +1,166 @@
+import pytest
+
+from scash_manager import watchdog as watchdog_mod
+from scash_manager.watchdog import Watchdog
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeStopEvent:
+    """代替 Watchdog._stop_event：wait() 不真等，只推进假时钟并记下等了多久。"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        self.clock.now += timeout or 0
+        return False
+
+    def is_set(self):
+        return False
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+class FakeMiner:
+    def __init__(self):
+        self.running = False
+        self.manual_stop = False
+        self.last_uptime = 5.0
+        self.starts = 0
+        self.stops = []
+
+    def is_running(self):
+        return self.running
+
+    def should_restart(self):
+        return not self.manual_stop
+
+    def start(self):
+        self.starts += 1
+        self.running = True
+
+    def stop(self, release_tuning=True):
+        self.stops.append(release_tuning)
+        self.running = False
+
+    def uptime(self):
+        return 42.0
+
+    def add_exit_listener(self, cb):
+        pass
+
+    def remove_exit_listener(self, cb):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watchdog_mod.time, "time", clock.time)
+    return clock
+
+
+def _watchdog(clock, **wcfg):
+    miner = FakeMiner()
+    wd = Watchdog(miner, {"watchdog": wcfg})
+    wd._stop_event = FakeStopEvent(clock)
+    wd._running = True
+    return wd, miner
+
+
+def _crash(wd, miner, uptime=5.0):
+    miner.running = False
+    miner.last_uptime = uptime
+    wd._handle_exit(1)
+
+
+def test_backoff_delay(monkeypatch, clock):
+    wd, _ = _watchdog(clock, restart_delay=5, backoff_max=60)
+    assert wd._backoff_delay(1) == 0.0
+
+    monkeypatch.setattr(watchdog_mod.random, "uniform", lambda lo, hi: 1.0)
+    assert [wd._backoff_delay(n) for n in range(2, 8)] == [5, 10, 20, 40, 60, 60]
+
+    # 抖动 ±20%，封顶之后也一样
+    for bound in (0.8, 1.2):
+        monkeypatch.setattr(watchdog_mod.random, "uniform", lambda lo, hi, b=bound: b)
+        assert wd._backoff_delay(2) == pytest.approx(5 * bound)
+        assert wd._backoff_delay(20) == pytest.approx(60 * bound)
+
+
+def test_backoff_jitter_stays_in_bounds(clock):
+    wd, _ = _watchdog(clock, restart_delay=5, backoff_max=60)
+    for n in (2, 4, 30):
+        base = min(60, 5 * 2 ** (n - 2))
+        for _ in range(200):
+            assert base * 0.8 <= wd._backoff_delay(n) <= base * 1.2
+
+
+def test_first_crash_restarts_immediately_then_backs_off(monkeypatch, clock):
+    monkeypatch.setattr(watchdog_mod.random, "uniform", lambda lo, hi: 1.0)
+    wd, miner = _watchdog(clock, restart_delay=5, backoff_max=300, crash_loop_max=100)
+
+    _crash(wd, miner)
+    assert miner.starts == 1 and wd._stop_event.waits == []
+
+    _crash(wd, miner)
+    _crash(wd, miner)
+    assert miner.starts == 3
+    assert wd._stop_event.waits == [5, 10]
+    assert wd.consecutive_failures == 3
+
+    # 稳定运行过一段时间再崩溃：退避清零，又是立即重启
+    _crash(wd, miner, uptime=600)
+    assert wd.consecutive_failures == 1
+    assert wd._stop_event.waits == [5, 10]
+
+
+def test_crash_loop_trips_and_cools_down(monkeypatch, clock):
+    monkeypatch.setattr(watchdog_mod.random, "uniform", lambda lo, hi: 1.0)
+    wd, miner = _watchdog(clock, restart_delay=1, backoff_max=1, crash_loop_max=3,
+                          crash_loop_window=300, crash_loop_cooldown=600)
+    for _ in range(3):
+        _crash(wd, miner)
+    assert miner.starts == 3 and wd._crash_loop_tripped()
+
+    # 窗口内第 4 次：熔断，冷却 600 秒后再拉起来，重启记录清空
+    _crash(wd, miner)
+    assert wd._stop_event.waits[-1] == 600
+    assert miner.starts == 4
+    assert len(wd._restart_times) == 1
+    assert wd.tripped_until is None and wd.state == "watching"
+
+
+def test_restarts_outside_window_do_not_trip(clock):
+    wd, miner = _watchdog(clock, crash_loop_max=2, crash_loop_window=60)
+    wd._restart_times.extend([clock.now - 120, clock.now - 90])
+    assert not wd._crash_loop_tripped()
+    assert len(wd._restart_times) == 0
+
+
+def test_manual_stop_is_not_restarted(clock):
+    wd, miner = _watchdog(clock)
+    miner.manual_stop = True
+    _crash(wd, miner)
+    assert miner.starts == 0
+
+
+def test_health_restart_keeps_huge_pages(clock):
+    wd, miner = _watchdog(clock)
+    miner.running = True
+    wd._handle_health("no_hashrate", "restart")
+    assert miner.stops == [False] and miner.starts == 1
+    assert wd.history[-1]["reason"] == "stall:no_hashrate"